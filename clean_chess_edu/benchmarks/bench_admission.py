@@ -0,0 +1,170 @@
+"""Replay a classroom burst against gunicorn with and without admission control.
+
+--students learners, each on its own connection with its own cookies,
+open the app at the same moment (index, lesson catalog, progress), then
+complete an exercise and reload their progress in --waves simultaneous
+waves. Meanwhile --pollers tabs, which have been reloading the catalog
+and progress --poll-rate times a second since --lead seconds before the
+class arrived, keep at it, the way a stuck client or a held-down F5 does.
+
+The server is one gunicorn worker with --threads threads, so the whole
+burst reaches the app at once. The replay runs with admission control
+off, then with the app's settings (CHESSEDU_RATE_LIMIT, CHESSEDU_MAX_ACTIVE
+and the rest, read from the environment), and the table compares the
+latency of every student request, answered or turned away, and how many
+of each group's requests were turned away.
+
+    python benchmarks/bench_admission.py --students 40 --pollers 8
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from common import completion, percentile, print_table
+from load_test import free_port, start_server
+
+COMPLETIONS = [
+    {"exerciseId": "center_control", "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     "moves": ["e2e4", "e7e5", "d2d4", "e5d4", "g1f3", "b8c6", "f1c4", "g8f6"]},
+    completion("piece_development"),
+    {"exerciseId": "board_setup"},
+    {"exerciseId": "fork_practice"},
+]
+ADMISSION_SETTINGS = ("CHESSEDU_RATE_LIMIT", "CHESSEDU_RATE_BURST", "CHESSEDU_NEW_SESSION_RATE",
+                      "CHESSEDU_NEW_SESSION_BURST", "CHESSEDU_MAX_ACTIVE", "CHESSEDU_MAX_QUEUED",
+                      "CHESSEDU_QUEUE_TIMEOUT_MS")
+
+
+class Learner:
+    """One browser: a keep-alive connection and the session cookie it was given"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        """Return (seconds, status); status 0 means the connection failed"""
+        headers = {"Content-Type": "application/json"} if body else {}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            return time.perf_counter() - start, 0
+        # The session cookie (learner id) is set on the first response
+        self.cookie = self.cookie or (response.getheader("Set-Cookie") or "").split(";")[0] or None
+        return time.perf_counter() - start, response.status
+
+
+def student(port, waves, start, wave_barrier, samples):
+    learner = Learner(port)
+    start.wait()
+    for path in ("/", "/lessons", "/progress"):
+        samples.append(learner.request("GET", path))
+    for wave in range(waves):
+        wave_barrier.wait()
+        samples.append(learner.request("POST", "/api/complete-exercise",
+                                       json.dumps(COMPLETIONS[wave % len(COMPLETIONS)])))
+        samples.append(learner.request("GET", "/progress"))
+    learner.conn.close()
+
+
+def poller(port, interval, stop, statuses):
+    learner = Learner(port)
+    while not stop.is_set():
+        for path in ("/progress", "/lessons"):
+            statuses.append(learner.request("GET", path)[1])
+            time.sleep(interval)
+    learner.conn.close()
+
+
+def replay(port, args):
+    start = threading.Barrier(args.students)
+    wave_barrier = threading.Barrier(args.students)
+    stop = threading.Event()
+    students = [[] for _ in range(args.students)]
+    pollers = [[] for _ in range(args.pollers)]
+    poller_threads = [threading.Thread(target=poller, args=(port, 1 / args.poll_rate, stop, statuses))
+                      for statuses in pollers]
+    for thread in poller_threads:
+        thread.start()
+    time.sleep(args.lead)
+    threads = [threading.Thread(target=student, args=(port, args.waves, start, wave_barrier, samples))
+               for samples in students]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    stop.set()
+    for thread in poller_threads:
+        thread.join()
+    return ([sample for samples in students for sample in samples],
+            [status for statuses in pollers for status in statuses], elapsed)
+
+
+def turned_away(statuses):
+    return sum(1 for status in statuses if status in (429, 503))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--poll-rate", type=float, default=50, help="requests a second from each poller")
+    parser.add_argument("--lead", type=float, default=3.0, help="seconds the pollers run before the class arrives")
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3, help="replays per mode")
+    parser.add_argument("--threads", type=int, default=64, help="gunicorn threads")
+    args = parser.parse_args()
+
+    on = {name: os.environ[name] for name in ADMISSION_SETTINGS if name in os.environ}
+    # start_server turns the rate limit off unless told otherwise
+    on.setdefault("CHESSEDU_RATE_LIMIT", "10")
+    # Every browser starts a session from 127.0.0.1, like a class behind one
+    # address, but the replay brings in a new class per run within seconds
+    on.setdefault("CHESSEDU_NEW_SESSION_BURST", str((args.students + args.pollers) * args.runs))
+    off = {"CHESSEDU_RATE_LIMIT": "0", "CHESSEDU_MAX_ACTIVE": "0"}
+    rows = []
+    for mode, settings in (("off", off), ("on", on)):
+        directory = tempfile.mkdtemp(prefix="chessedu-bench-admission-")
+        port = free_port()
+        server = start_server(1, port, os.path.join(directory, "progress.sqlite3"),
+                              CHESSEDU_THREADS=str(args.threads), **settings)
+        try:
+            student_samples, poller_statuses, elapsed = [], [], 0.0
+            for _ in range(args.runs):
+                students, pollers, seconds = replay(port, args)
+                student_samples += students
+                poller_statuses += pollers
+                elapsed += seconds
+        finally:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(directory)
+        latencies = sorted(seconds for seconds, _ in student_samples)
+        statuses = [status for _, status in student_samples]
+        rows.append([mode, f"{len(statuses):,}", f"{percentile(latencies, 50) * 1e3:.1f}",
+                     f"{percentile(latencies, 95) * 1e3:.1f}", f"{percentile(latencies, 99) * 1e3:.1f}",
+                     f"{latencies[-1] * 1e3:.1f}", f"{turned_away(statuses):,}", f"{statuses.count(0):,}",
+                     f"{len(poller_statuses):,}", f"{turned_away(poller_statuses):,}",
+                     f"{elapsed / args.runs:.2f}"])
+
+    print_table(["admission", "student reqs", "p50 ms", "p95 ms", "p99 ms", "max ms", "students turned away",
+                 "failed", "poller reqs", "pollers turned away", "burst s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Micro-benchmark of /api/analyze with a cold and a warm analysis cache.
+
+Times the ``analyze_position`` view function directly (no HTTP/test-client
+overhead) on the lesson positions: first with an empty cache, so every
+call runs the full analysis, then again with every position cached. It
+prints the cache counters at the end.
+
+    python benchmarks/bench_analysis.py --iterations 2000
+"""
+import argparse
+
+from common import load_app, percentile, print_table, timed
+
+# Positions the lesson pages ask about: the start, the center-control steps,
+# an open game and a middlegame with a pin
+POSITIONS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/3PP3/2NB1N2/PPP2PPP/R1BQK2R w KQkq - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 3",
+    "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+    "r2qkb1r/ppp2ppp/2np1n2/4p3/2B1P1b1/2NP1N2/PPP2PPP/R1BQK2R w KQkq - 1 6",
+]
+
+
+def time_view(chess_app, fens):
+    samples = []
+    for fen in fens:
+        with chess_app.app.test_request_context("/api/analyze", query_string={"fen": fen}):
+            samples.append(timed(chess_app.analyze_position)[1])
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="cached lookups to time")
+    args = parser.parse_args()
+
+    chess_app = load_app()
+    cold = time_view(chess_app, POSITIONS)
+    warm = time_view(chess_app, [POSITIONS[i % len(POSITIONS)] for i in range(args.iterations)])
+
+    rows = []
+    for name, samples in (("miss (analyze)", cold), ("hit (cached)", warm)):
+        rows.append([name, len(samples), f"{percentile(samples, 50) * 1e6:,.0f}",
+                     f"{percentile(samples, 99) * 1e6:,.0f}"])
+    print_table(["lookup", "requests", "p50 us", "p99 us"], rows)
+    print(f"\nCache: {chess_app.analysis_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Event log write cost and analytics speed on a large synthetic log.
+
+Times ``EventLogWriter.append`` as the app calls it (one learner's new
+completions per saved edit), then writes a synthetic log of --events
+completion events straight into segments. Its learners work through the
+lessons in order and give up along the way. Then it times reading the log
+and each report of event_analytics.py.
+
+    python benchmarks/bench_event_log.py --events 20000000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from common import load_app, print_table, timed
+
+from catalog import LessonCatalog
+from event_analytics import drop_off, funnel, lesson_groups, LESSONS_DIR, time_to_complete
+from event_log import (create_segment, EventLogWriter, EXERCISE_COMPLETED, LESSON_COMPLETED,
+                       OBJECTIVE_COMPLETED, read_events)
+
+# Rows per synthetic segment, like a compacted log
+SEGMENT_ROWS = 1 << 22
+# Chance that a learner moves on to the next exercise, objective or lesson
+CONTINUE_RATE = 0.9
+
+
+def time_appends(directory, count):
+    writer = EventLogWriter(directory)
+    events = [(EXERCISE_COMPLETED, 2, 0), (OBJECTIVE_COMPLETED, 2, 0)]
+    start = time.perf_counter()
+    for number in range(count):
+        writer.append(f"learner-{number % 1000}", events)
+    return (time.perf_counter() - start) / count
+
+
+def synthetic_events(lessons, count, rng):
+    """Return columns of about count events from learners working through the lessons"""
+    script = []  # (kind, lesson, item) in the order a learner completes them
+    for lesson in lessons:
+        script += [(EXERCISE_COMPLETED, lesson["id"], step)
+                   for step in range(len(lesson.get("interactive_exercises", [])))]
+        script += [(OBJECTIVE_COMPLETED, lesson["id"], index)
+                   for index in range(len(lesson.get("objectives", [])))]
+        script.append((LESSON_COMPLETED, lesson["id"], -1))
+    script = np.array(script, dtype=np.int64)
+
+    # Each learner gets through a geometric number of the scripted events
+    mean_length = sum(CONTINUE_RATE ** i for i in range(len(script)))
+    learners = int(count / mean_length) + 1
+    lengths = np.minimum(rng.geometric(1 - CONTINUE_RATE, learners), len(script))
+    total = int(lengths.sum())
+    owner = np.repeat(np.arange(learners), lengths)
+    position = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # Learners start over two months and spend 10 s to 20 min on each step
+    started = 1_725_000_000_000 + rng.integers(0, 60 * 86400 * 1000, learners)
+    gaps = rng.integers(10_000, 1_200_000, total)
+    gaps[position == 0] = 0
+    elapsed = np.cumsum(gaps)
+    elapsed -= np.repeat(elapsed[np.cumsum(lengths) - lengths], lengths)
+    return {
+        "time": started[owner] + elapsed,
+        "learner": rng.integers(0, np.iinfo(np.uint64).max, learners, dtype=np.uint64)[owner],
+        "kind": script[position, 0].astype(np.uint8),
+        "lesson": script[position, 1].astype(np.uint16),
+        "item": script[position, 2].astype(np.int16),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20_000_000)
+    parser.add_argument("--appends", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    load_app()
+    lessons = LessonCatalog(LESSONS_DIR).load()
+    directory = tempfile.mkdtemp(prefix="chessedu-bench-events-")
+    try:
+        append_seconds = time_appends(os.path.join(directory, "appends"), args.appends)
+
+        log = os.path.join(directory, "log")
+        os.makedirs(log)
+        events, generate = timed(synthetic_events, lessons, args.events, np.random.default_rng(args.seed))
+        total = len(events["time"])
+        for number, start in enumerate(range(0, total, SEGMENT_ROWS)):
+            chunk = {column: values[start:start + SEGMENT_ROWS] for column, values in events.items()}
+            create_segment(log, f"{number:013d}-0-0", len(chunk["time"]), chunk)
+        del events, chunk
+
+        rows = []
+        events, seconds = timed(read_events, log)
+        rows.append(["read log", f"{seconds:.2f}"])
+        groups, seconds = timed(lesson_groups, events)
+        rows.append(["group by learner and lesson", f"{seconds:.2f}"])
+        for name, report in (("funnel", funnel), ("time to complete", time_to_complete),
+                             ("drop-off", drop_off)):
+            rows.append([name, f"{timed(report, groups, lessons)[1]:.2f}"])
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"append: {append_seconds * 1e6:.1f} us per saved edit (2 events)")
+    print(f"{total:,} synthetic events from {len(groups['lesson']):,} learner-lessons "
+          f"(generated in {generate:.1f}s)\n")
+    print_table(["step", "seconds"], rows)
+
+
+if __name__ == "__main__":
+    main()
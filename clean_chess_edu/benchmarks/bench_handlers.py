@@ -0,0 +1,107 @@
+"""Micro-benchmark of the completion handlers as the curriculum grows.
+
+Builds synthetic curricula with many lessons, exercises and objectives,
+gives a learner a fixed amount of completed work spread across it, then
+times the view functions for ``complete_lesson``, ``complete_exercise`` and
+``complete_objective`` directly (no HTTP/test-client overhead). The
+learner's document stays the same size, so any growth in latency comes
+from curriculum lookups.
+
+    python benchmarks/bench_handlers.py --lessons 3 300 3000
+"""
+import argparse
+import time
+
+from common import load_app, percentile, print_table
+
+
+def build_curriculum(chess_app, lesson_count, exercises_per_lesson, objectives_per_lesson):
+    """Replace the app's curriculum with a synthetic one of the given size"""
+    chess_app.LESSONS = []
+    chess_app.EXERCISE_TO_LESSON = {}
+    chess_app.EXERCISE_TO_OBJECTIVE = {}
+    chess_app.OBJECTIVE_ACHIEVEMENTS = {}
+    for lesson_id in range(1, lesson_count + 1):
+        exercises = [f"ex_{lesson_id}_{i}" for i in range(exercises_per_lesson)]
+        chess_app.LESSONS.append({
+            "id": lesson_id,
+            "title": f"Lesson {lesson_id}",
+            "objectives": [f"Objective {i}" for i in range(objectives_per_lesson)],
+            "interactive_exercises": exercises,
+            "achievement": {"id": f"lesson_{lesson_id}", "title": "t", "description": "d"}
+        })
+        for index, exercise_id in enumerate(exercises):
+            chess_app.EXERCISE_TO_LESSON[exercise_id] = lesson_id
+            chess_app.EXERCISE_TO_OBJECTIVE[exercise_id] = {"lesson_id": lesson_id,
+                                                            "objective_index": index % objectives_per_lesson}
+        for index in range(objectives_per_lesson):
+            chess_app.OBJECTIVE_ACHIEVEMENTS[f"{lesson_id}_{index}"] = {
+                "id": f"objective_{lesson_id}_{index}", "title": "t", "description": "d"}
+    chess_app.index_curriculum()
+
+
+def fill_progress(chess_app, learner_id, completed):
+    """Complete `completed` lessons spread evenly over the curriculum"""
+    from progress_model import LearnerProgress
+    progress = LearnerProgress()
+    step = max(1, (len(chess_app.LESSONS) - 1) // completed)
+    for lesson in chess_app.LESSONS[:-1][::step][:completed]:
+        completion = progress.ensure_lesson(lesson["id"], with_exercises=True)
+        for exercise_id in lesson["interactive_exercises"]:
+            completion.complete_exercise(exercise_id)
+        completion.completed = True
+        progress.mark_lesson_completed(lesson["id"])
+        progress.award(lesson["achievement"])
+        for index in range(len(lesson["objectives"])):
+            chess_app.record_objective(progress, f"{lesson['id']}_{index}")
+    chess_app.progress_store.put_many([(learner_id, progress)])
+
+
+def time_handler(chess_app, view, payload, iterations):
+    """Call a view function repeatedly inside a request context"""
+    samples = []
+    for i in range(iterations):
+        body = payload(i)
+        with chess_app.app.test_request_context(method="POST", json=body):
+            chess_app.session["learner_id"] = "bench-learner"
+            start = time.perf_counter()
+            view()
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lessons", type=int, nargs="+", default=[3, 300, 3000])
+    parser.add_argument("--exercises", type=int, default=4, help="exercises per lesson")
+    parser.add_argument("--objectives", type=int, default=4, help="objectives per lesson")
+    parser.add_argument("--completed", type=int, default=2, help="lessons the learner already completed")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    chess_app = load_app()
+    rows = []
+    for lesson_count in args.lessons:
+        build_curriculum(chess_app, lesson_count, args.exercises, args.objectives)
+        fill_progress(chess_app, "bench-learner", args.completed)
+        last = chess_app.LESSONS[-1]
+        cases = [
+            ("complete_exercise", chess_app.complete_exercise,
+             lambda i: {"exerciseId": last["interactive_exercises"][i % args.exercises]}),
+            ("complete_objective", chess_app.complete_objective,
+             lambda i: {"lessonId": last["id"], "objectiveIndex": i % args.objectives}),
+            ("complete_lesson", chess_app.complete_lesson,
+             lambda i: {"lesson_id": last["id"]}),
+        ]
+        for name, view, payload in cases:
+            samples = time_handler(chess_app, view, payload, args.iterations)
+            rows.append([lesson_count, lesson_count * args.objectives, name,
+                         f"{percentile(samples, 50) * 1e6:.1f}",
+                         f"{percentile(samples, 99) * 1e6:.1f}"])
+
+    print_table(["lessons", "objectives", "handler", "p50 us", "p99 us"], rows)
+
+
+if __name__ == "__main__":
+    main()
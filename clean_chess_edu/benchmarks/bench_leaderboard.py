@@ -0,0 +1,93 @@
+"""Leaderboard queries as the number of learners grows.
+
+Fills leaderboards with N learners with random standings, then times
+recording a changed standing, asking for the top 10 of a board together
+with one learner's rank, and, for comparison, answering the same question
+by scanning every learner's score the way a query over all progress records
+would. With a database, the second set of leaderboards catches up on one
+changed standing per query, as workers do.
+
+    python benchmarks/bench_leaderboard.py --sizes 10000,100000,1000000
+"""
+import argparse
+import heapq
+import os
+import random
+import shutil
+import tempfile
+
+from common import percentile, print_table, timed
+
+from leaderboard import Leaderboards
+
+TODAY = "2026-03-02"
+DAYS = ["2026-02-27", "2026-02-28", "2026-03-01", "2026-03-02"]
+
+
+def random_standing(rng):
+    return (rng.randint(1, 60), rng.choice(DAYS), rng.randint(0, 12), rng.randint(0, 20))
+
+
+def scan(scores, learner_id, count):
+    top = heapq.nlargest(count, scores.items(), key=lambda item: item[1])
+    score = scores[learner_id]
+    return top, 1 + sum(1 for other in scores.values() if other > score)
+
+
+def fill_sqlite(leaderboards, standings):
+    conn = leaderboards._connection()
+    with conn:
+        conn.executemany("INSERT INTO standings VALUES (?, ?, ?, ?, ?, 1, ?)",
+                         ((learner_id, *standing, sequence)
+                          for sequence, (learner_id, standing) in enumerate(standings.items(), 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated learner counts")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="chessedu-bench-leaderboard-")
+    rows = []
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            standings = {f"learner-{number}": random_standing(rng) for number in range(size)}
+            learners = list(standings)
+            memory = Leaderboards()
+            _, fill = timed(lambda: [memory.record(learner_id, 1, standing)
+                                     for learner_id, standing in standings.items()])
+            record = sorted(timed(memory.record, rng.choice(learners), 2, random_standing(rng))[1]
+                            for _ in range(args.iterations))
+            query = sorted(timed(memory.standings, "lessons", rng.choice(learners), TODAY, 10)[1]
+                           for _ in range(args.iterations))
+            scores = {learner_id: standing[2] for learner_id, standing in standings.items()}
+            full_scan = sorted(timed(scan, scores, rng.choice(learners), 10)[1]
+                               for _ in range(max(args.iterations // 100, 5)))
+
+            path = os.path.join(directory, f"leaderboard-{size}.sqlite3")
+            writer, reader = Leaderboards(path), Leaderboards(path)
+            fill_sqlite(writer, standings)
+            _, catch_up = timed(reader.standings, "lessons", learners[0], TODAY, 10)
+            shared = []
+            for version in range(2, args.iterations // 10 + 2):
+                writer.record(rng.choice(learners), version, random_standing(rng))
+                shared.append(timed(reader.standings, "lessons", rng.choice(learners), TODAY, 10)[1])
+            shared.sort()
+
+            for operation, samples in (("record", record), ("top 10 + rank", query),
+                                       ("full scan", full_scan), ("shared top 10 + rank", shared)):
+                rows.append([f"{size:,}", f"{fill:.1f}", operation, f"{percentile(samples, 50) * 1e6:,.1f}",
+                             f"{percentile(samples, 99) * 1e6:,.1f}"])
+            print(f"{size:,} learners: first shared query catches up on every standing in {catch_up:.1f}s")
+            del standings, learners, memory, scores, writer, reader
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(["learners", "fill s", "operation", "p50 us", "p99 us"], rows)
+
+
+if __name__ == "__main__":
+    main()
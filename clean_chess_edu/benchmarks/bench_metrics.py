@@ -0,0 +1,70 @@
+"""Overhead of the request metrics hooks.
+
+Times the before/after/teardown hooks that feed /metrics on their own, in a
+request context, and then whole GET /lessons requests through the test
+client with the hooks registered and removed. /lessons is the cheapest
+route, so the difference is the largest share of a request the metrics
+can take.
+
+    python benchmarks/bench_metrics.py --iterations 20000
+"""
+import argparse
+import gc
+
+from common import load_app, percentile, print_table, timed
+
+
+def time_hooks(chess_app, iterations):
+    response = chess_app.app.response_class("{}", mimetype="application/json")
+    samples = []
+    for _ in range(iterations):
+        with chess_app.app.test_request_context("/lessons"):
+            _, elapsed = timed(lambda: (chess_app.start_request_metrics(),
+                                        chess_app.record_request_metrics(response),
+                                        chess_app.finish_request_metrics()))
+            samples.append(elapsed)
+    samples.sort()
+    return samples
+
+
+def time_requests(client, iterations):
+    samples = []
+    for _ in range(iterations):
+        samples.append(timed(client.get, "/lessons")[1])
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    chess_app = load_app()
+    app = chess_app.app
+    client = app.test_client()
+    time_requests(client, 1000)
+    gc.collect()
+
+    hooks = time_hooks(chess_app, args.iterations)
+    with_metrics = time_requests(client, args.iterations)
+    registered = (app.before_request_funcs[None], app.after_request_funcs[None],
+                  app.teardown_request_funcs[None])
+    app.before_request_funcs[None] = [f for f in registered[0] if f is not chess_app.start_request_metrics]
+    app.after_request_funcs[None] = [f for f in registered[1] if f is not chess_app.record_request_metrics]
+    app.teardown_request_funcs[None] = [f for f in registered[2] if f is not chess_app.finish_request_metrics]
+    without_metrics = time_requests(client, args.iterations)
+
+    rows = []
+    for name, samples in (("metrics hooks only", hooks), ("GET /lessons with metrics", with_metrics),
+                          ("GET /lessons without metrics", without_metrics)):
+        rows.append([name, len(samples), f"{percentile(samples, 50) * 1e6:,.1f}",
+                     f"{percentile(samples, 99) * 1e6:,.1f}"])
+    print_table(["timing", "runs", "p50 us", "p99 us"], rows)
+    overhead = percentile(with_metrics, 50) - percentile(without_metrics, 50)
+    print(f"\nMetrics add {overhead * 1e6:,.1f} us to the median request "
+          f"({overhead / percentile(without_metrics, 50):.1%} of GET /lessons)")
+
+
+if __name__ == "__main__":
+    main()
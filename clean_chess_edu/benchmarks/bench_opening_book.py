@@ -0,0 +1,79 @@
+"""Opening book lookup time as the book grows.
+
+Writes synthetic books of random position hashes (one to three book moves
+each) at several sizes and times looking up positions that are in the book
+and positions that are not, then times GET /api/openings/classify through
+the test client with the book built from content/openings/eco.tsv. Lookups
+should cost the same however many positions the book holds.
+
+    python benchmarks/bench_opening_book.py --sizes 1000,100000,1000000
+"""
+import argparse
+import collections
+import os
+import random
+import shutil
+import tempfile
+import urllib.parse
+
+from common import load_app, percentile, print_table, ROOT_DIR, timed
+
+from build_opening_book import read_eco
+from opening_book import OpeningBook, write_book
+
+ECO_FILE = os.path.join(ROOT_DIR, "content", "openings", "eco.tsv")
+ITALIAN = "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3"
+
+
+def time_lookups(book, keys):
+    samples = [timed(book.lookup, key)[1] for key in keys]
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated book sizes")
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="chessedu-bench-book-")
+    rows = []
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            positions = {rng.getrandbits(64) | 1: {rng.getrandbits(15): rng.randint(1, 1000)
+                                                   for _ in range(rng.randint(1, 3))}
+                         for _ in range(size)}
+            path = os.path.join(directory, f"book-{size}.bin")
+            _, build = timed(write_book, path, positions, {})
+            book = OpeningBook(path)
+            keys = list(positions)
+            hits = time_lookups(book, [rng.choice(keys) for _ in range(args.lookups)])
+            misses = time_lookups(book, [rng.getrandbits(64) & ~1 for _ in range(args.lookups)])
+            book.close()
+            for name, samples in (("hit", hits), ("miss", misses)):
+                rows.append([f"{size:,}", name, f"{os.path.getsize(path) / 1e6:.1f}", f"{build:.1f}",
+                             f"{percentile(samples, 50) * 1e6:.2f}", f"{percentile(samples, 99) * 1e6:.2f}"])
+            del positions, keys
+
+        eco_book = os.path.join(directory, "eco.bin")
+        eco_positions, names = collections.defaultdict(collections.Counter), {}
+        read_eco(ECO_FILE, eco_positions, names)
+        write_book(eco_book, eco_positions, names)
+        os.environ["CHESSEDU_OPENING_BOOK"] = eco_book
+        client = load_app().app.test_client()
+        url = "/api/openings/classify?" + urllib.parse.urlencode({"fen": ITALIAN, "move": "f8c5"})
+        client.get(url)
+        requests = sorted(timed(client.get, url)[1] for _ in range(args.lookups // 10))
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(["positions", "lookup", "MB", "build s", "p50 us", "p99 us"], rows)
+    print(f"\nGET /api/openings/classify: p50 {percentile(requests, 50) * 1e6:,.0f} us, "
+          f"p99 {percentile(requests, 99) * 1e6:,.0f} us")
+
+
+if __name__ == "__main__":
+    main()
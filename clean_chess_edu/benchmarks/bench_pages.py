@@ -0,0 +1,65 @@
+"""Cost of serving the pre-rendered pages.
+
+Times rendering the index, board and an exercise template with Flask's
+render_template (what every request used to do) against answering from
+the page cache, then whole requests through the test client: a cached page
+(identity and gzip), a revalidation answered with 304, an unknown exercise
+(404) and a static file for comparison.
+
+    python benchmarks/bench_pages.py --iterations 5000
+"""
+import argparse
+import gc
+
+from flask import render_template
+
+from common import load_app, percentile, print_table, timed
+
+
+def time_calls(function, iterations):
+    samples = [timed(function)[1] for _ in range(iterations)]
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--exercise", default="center_control")
+    args = parser.parse_args()
+
+    chess_app = load_app()
+    app = chess_app.app
+    client = app.test_client()
+    exercise = f"exercises/{args.exercise}"
+
+    timings = []
+    with app.test_request_context("/"):
+        for page, template in (("index", "index.html"), ("board", "board.html"),
+                               (exercise, f"{exercise}.html")):
+            payload = chess_app.page_cache.payload(page)
+            timings.append((f"render_template {template}",
+                            time_calls(lambda: render_template(template), args.iterations)))
+            timings.append((f"cached {page}", time_calls(payload.respond, args.iterations)))
+
+    etag = client.get("/").headers["ETag"]
+    requests = (
+        ("GET / (identity)", lambda: client.get("/")),
+        ("GET / (gzip)", lambda: client.get("/", headers={"Accept-Encoding": "gzip"})),
+        ("GET / (304)", lambda: client.get("/", headers={"If-None-Match": etag})),
+        (f"GET /{exercise}", lambda: client.get(f"/{exercise}")),
+        ("GET /exercises/unknown (404)", lambda: client.get("/exercises/unknown")),
+        ("GET /static/css/style.css", lambda: client.get("/static/css/style.css")),
+    )
+    for name, request in requests:
+        request()
+        gc.collect()
+        timings.append((name, time_calls(request, args.iterations)))
+
+    rows = [[name, len(samples), f"{percentile(samples, 50) * 1e6:,.1f}",
+             f"{percentile(samples, 99) * 1e6:,.1f}"] for name, samples in timings]
+    print_table(["timing", "runs", "p50 us", "p99 us"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Completion-endpoint throughput against progress stores of different sizes.
+
+Seeds a SQLite progress store with N synthetic learners, then replays
+``/api/complete-exercise`` requests for randomly chosen stored learners
+through the Flask test client.
+
+    python benchmarks/bench_progress_store.py --sizes 1000 100000 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from common import completion, load_app, print_table
+
+EXERCISES = ["piece_movement", "board_setup", "center_control",
+             "piece_development", "fork_practice", "pin_practice"]
+
+
+def seed_documents(count, rng):
+    """Yield (learner_id, progress) pairs for count synthetic learners"""
+    for i in range(count):
+        lesson_id = rng.randint(1, 3)
+        yield f"learner-{i:08d}", {
+            "completedLessons": [{
+                "lessonId": lesson_id,
+                "completed": False,
+                "exercises": [{"id": EXERCISES[(lesson_id - 1) * 2], "completed": True, "timestamp": ""}],
+                "timestamp": ""
+            }],
+            "completed_lessons": [],
+            "achievements": [],
+            "completedObjectives": [],
+            "current_streak": 0
+        }
+
+
+def make_clients(chess_app, learner_ids):
+    """Create one test client per learner with its session already set"""
+    clients = []
+    for learner_id in learner_ids:
+        client = chess_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["learner_id"] = learner_id
+        clients.append(client)
+    return clients
+
+
+def run_requests(clients, requests_per_thread, threads, rng_seed):
+    """Post exercise completions from several threads and return total seconds"""
+    def worker(offset):
+        rng = random.Random(rng_seed + offset)
+        for _ in range(requests_per_thread):
+            client = rng.choice(clients)
+            response = client.post("/api/complete-exercise",
+                                   json=completion(rng.choice(EXERCISES)))
+            assert response.status_code == 200, response.status_code
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per thread")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=1000, help="distinct learners exercised")
+    parser.add_argument("--seed", type=int, default=6460)
+    args = parser.parse_args()
+
+    chess_app = load_app()
+    from progress_model import LearnerProgress
+    from progress_store import SQLiteProgressStore
+
+    rows = []
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="chessedu-bench-")
+        try:
+            store = SQLiteProgressStore(os.path.join(workdir, "progress.sqlite3"))
+            rng = random.Random(args.seed)
+            seed_start = time.perf_counter()
+            store.put_many((learner_id, LearnerProgress.from_dict(document))
+                           for learner_id, document in seed_documents(size, rng))
+            seed_seconds = time.perf_counter() - seed_start
+
+            chess_app.progress_store = store
+            learner_ids = [f"learner-{rng.randrange(size):08d}"
+                           for _ in range(min(args.clients, size))]
+            clients = make_clients(chess_app, learner_ids)
+
+            elapsed = run_requests(clients, args.requests, args.threads, args.seed)
+            total = args.requests * args.threads
+            rows.append([f"{size:,}", f"{seed_seconds:.1f}s", total,
+                         f"{total / elapsed:,.0f}", f"{elapsed / total * 1e6:,.0f}"])
+            store.close()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(["stored learners", "seed time", "requests", "req/s", "us/req"], rows)
+
+
+if __name__ == "__main__":
+    main()
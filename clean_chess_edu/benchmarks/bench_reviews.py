@@ -0,0 +1,89 @@
+"""Review schedule operations as the number of scheduled learners grows.
+
+Fills the memory and SQLite review stores with --items reviews for each of
+N learners, due at random over the next two weeks, then times recording a
+completion, listing one learner's due reviews and listing the 100 most
+overdue learners a week in. The SQLite store is filled with bulk inserts,
+since the per-completion transactions would dominate the run.
+
+    python benchmarks/bench_reviews.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+from common import percentile, print_table, timed
+
+from reviews import DAY_MS, MemoryReviewStore, now_ms, SQLiteReviewStore
+
+EXERCISES = ["board_setup", "piece_movement", "center_control", "piece_development",
+             "fork_practice", "pin_practice"]
+
+
+def fill_memory(store, learners, items, start, rng):
+    for number in range(learners):
+        for exercise_id in EXERCISES[:items]:
+            store.record(f"learner-{number}", exercise_id, rng.randint(3, 5),
+                         start - DAY_MS + rng.randrange(14 * DAY_MS))
+
+
+def fill_sqlite(store, learners, items, start, rng):
+    conn = store._connection()
+    batch = []
+    for number in range(learners):
+        dues = [start + rng.randrange(14 * DAY_MS) for _ in range(items)]
+        batch.extend((f"learner-{number}", exercise_id, 2.5, 1.0, 1, due)
+                     for exercise_id, due in zip(EXERCISES, dues))
+        if len(batch) >= 50000:
+            with conn:
+                conn.executemany("INSERT INTO review_items VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    with conn:
+        conn.executemany("INSERT INTO review_items VALUES (?, ?, ?, ?, ?, ?)", batch)
+        conn.execute("INSERT INTO review_queue SELECT learner_id, MIN(due) FROM review_items GROUP BY learner_id")
+
+
+def time_operations(store, learners, start, iterations, rng):
+    later = start + 7 * DAY_MS
+    record = sorted(timed(store.record, f"learner-{rng.randrange(learners)}", rng.choice(EXERCISES),
+                          4, later)[1] for _ in range(iterations))
+    due = sorted(timed(store.due, f"learner-{rng.randrange(learners)}", later)[1]
+                 for _ in range(iterations))
+    learners_due = sorted(timed(store.due_learners, later, 100)[1] for _ in range(iterations // 10))
+    return {"record": record, "due (one learner)": due, "due_learners (100)": learners_due}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated learner counts")
+    parser.add_argument("--items", type=int, default=3, help=f"reviews per learner (at most {len(EXERCISES)})")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = now_ms()
+    directory = tempfile.mkdtemp(prefix="chessedu-bench-reviews-")
+    rows = []
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            memory = MemoryReviewStore()
+            _, fill = timed(fill_memory, memory, size, args.items, start, rng)
+            sqlite = SQLiteReviewStore(os.path.join(directory, f"reviews-{size}.sqlite3"))
+            _, sqlite_fill = timed(fill_sqlite, sqlite, size, args.items, start, rng)
+            for name, store, seconds in (("memory", memory, fill), ("sqlite", sqlite, sqlite_fill)):
+                for operation, samples in time_operations(store, size, start, args.iterations, rng).items():
+                    rows.append([f"{size:,}", name, f"{seconds:.1f}", operation,
+                                 f"{percentile(samples, 50) * 1e6:,.1f}", f"{percentile(samples, 99) * 1e6:,.1f}"])
+            sqlite.close()
+            del memory
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(["learners", "store", "fill s", "operation", "p50 us", "p99 us"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Bulk progress import and export throughput and memory.
+
+Writes an NDJSON file of --learners learners with random progress, imports
+it into an empty SQLite progress store, then exports the store as NDJSON
+and as CSV. Each phase is timed, then run again under tracemalloc to find
+its peak Python memory, which should stay flat as --learners grows.
+
+    python benchmarks/bench_transfer.py --learners 100000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import tracemalloc
+
+from common import load_app, print_table, timed
+
+from progress_store import SQLiteProgressStore
+from progress_transfer import export_csv, export_ndjson, import_records
+
+
+def random_progress(rng, lessons, exercise_to_lesson):
+    completed = [lesson["id"] for lesson in lessons if rng.random() < 0.4]
+    records = []
+    for lesson in lessons:
+        exercises = [{"id": exercise_id, "completed": True, "timestamp": "2026-03-01T10:00:00.000Z"}
+                     for exercise_id, lesson_id in exercise_to_lesson.items()
+                     if lesson_id == lesson["id"] and rng.random() < 0.6]
+        if exercises or lesson["id"] in completed:
+            records.append({"lessonId": lesson["id"], "completed": lesson["id"] in completed,
+                            "exercises": exercises, "timestamp": "2026-03-01T10:00:00.000Z"})
+    return {"completedLessons": records, "completed_lessons": completed,
+            "completedObjectives": [f"{lesson_id}_0" for lesson_id in completed],
+            "current_streak": rng.randint(0, 30), "last_active_day": "2026-03-01"}
+
+
+def drain(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+
+def import_file(store, path, validate):
+    with open(path, encoding="utf-8") as f:
+        return import_records(store, f, validate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--learners", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix="chessedu-bench-transfer-")
+    try:
+        source = os.path.join(directory, "class.ndjson")
+        with open(source, "w", encoding="utf-8") as f:
+            for number in range(args.learners):
+                document = random_progress(rng, app_module.LESSONS, app_module.EXERCISE_TO_LESSON)
+                f.write(json.dumps({"learnerId": f"learner-{number}", "progress": document}) + "\n")
+
+        store = SQLiteProgressStore(os.path.join(directory, "progress.sqlite3"))
+        phases = [
+            ("import ndjson", lambda: import_file(store, source, app_module.validate_progress)["imported"]),
+            ("export ndjson", lambda: drain(export_ndjson(store))),
+            ("export csv", lambda: drain(export_csv(store, app_module.LESSONS))),
+        ]
+        rows = []
+        for name, run in phases:
+            result, seconds = timed(run)
+            tracemalloc.start()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size = f"{result / 1e6:.1f}" if name.startswith("export") else ""
+            rows.append([name, f"{args.learners:,}", f"{seconds:.1f}", f"{args.learners / seconds:,.0f}",
+                         size, f"{peak / 1e6:.1f}"])
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(["phase", "learners", "seconds", "learners/s", "MB out", "peak MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
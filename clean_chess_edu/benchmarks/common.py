@@ -0,0 +1,71 @@
+"""Shared helpers for the ChessEdu benchmark scripts.
+
+Benchmarks are plain scripts run from the ``clean_chess_edu`` directory, e.g.
+``python benchmarks/bench_progress_store.py``. They import the Flask app the
+same way ``python src/app.py`` does, so ``src`` is put on ``sys.path`` here.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Moves that solve the exercises the server replays (EXERCISE_GOALS in app.py)
+SOLUTIONS = {
+    "piece_development": {"steps": [{"moves": ["g1f3"]}, {"moves": ["e7e5"]}, {"moves": ["f1c4"]},
+                                    {"moves": ["e1g1"]}, {"moves": ["e8g8"]}]},
+}
+
+# Objectives those exercises complete, which /api/complete-objective refuses to take on their own
+SOLVED_OBJECTIVES = {"2_1"}
+
+
+def completion(exercise_id, **fields):
+    """Return an /api/complete-exercise body for exercise_id, with the moves
+    that solve it if the server checks them"""
+    return {"exerciseId": exercise_id, **SOLUTIONS.get(exercise_id, {}), **fields}
+
+
+def load_app(progress_db=":memory:"):
+    """Import the Flask app with the given progress store location, a
+    throwaway event log and no rate limit"""
+    os.environ.setdefault("CHESSEDU_PROGRESS_DB", progress_db)
+    # Scripted sessions send requests far faster than a learner's rate limit
+    os.environ.setdefault("CHESSEDU_RATE_LIMIT", "0")
+    if "CHESSEDU_EVENT_LOG" not in os.environ:
+        event_log = tempfile.mkdtemp(prefix="chessedu-events-")
+        atexit.register(shutil.rmtree, event_log, ignore_errors=True)
+        os.environ["CHESSEDU_EVENT_LOG"] = event_log
+    import app as chess_app
+    return chess_app
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def print_table(headers, rows):
+    """Print rows as a simple fixed-width table"""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h))
+              for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,162 @@
+"""HTTP load test of the production server at different worker counts.
+
+For each worker count, starts gunicorn with gunicorn.conf.py against a
+fresh SQLite progress database, then runs client processes that each act
+as one learner, cycling through a mix of reads (lesson catalog, progress,
+position analysis) and writes (exercise completions with moves to
+validate). Each cycle runs on a new keep-alive connection, so a learner's
+requests land on different workers like a browser's would. Reports
+requests per second and latency percentiles per worker count.
+
+Afterwards every client reads its progress back and checks that the version
+equals the number of writes it made. A version that comes up short means a
+write was lost between workers.
+
+    python benchmarks/load_test.py                      # 1, 4 and 8 workers
+    python benchmarks/load_test.py --workers 2 --clients 64 --duration 30
+
+Requests per second can only grow with workers while there are idle cores
+for them (and for the clients), so run it on a machine with at least as
+many cores as the largest worker count.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import percentile, print_table, ROOT_DIR
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 3",
+]
+COMPLETION = json.dumps({
+    "exerciseId": "center_control",
+    "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "moves": ["e2e4", "e7e5", "d2d4", "e5d4", "g1f3", "b8c6", "f1c4", "g8f6"],
+})
+# (method, path, body) cycled by every client: reads outnumber writes 4 to 1
+REQUESTS = [
+    ("GET", "/lessons", None),
+    ("GET", "/progress", None),
+    ("GET", "/api/analyze?fen=" + FENS[0].replace(" ", "%20"), None),
+    ("GET", "/api/analyze?fen=" + FENS[1].replace(" ", "%20"), None),
+    ("POST", "/api/complete-exercise", COMPLETION),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port, database, **settings):
+    """Start gunicorn with the given CHESSEDU_* settings on top of the environment"""
+    # Clients send requests as fast as they can, far over a learner's rate limit
+    env = dict(os.environ, CHESSEDU_PROGRESS_DB=database,
+               CHESSEDU_EVENT_LOG=os.path.join(os.path.dirname(database), "events"),
+               CHESSEDU_RATE_LIMIT="0")
+    env.setdefault("CHESSEDU_SECRET_KEY", secrets.token_hex(16))
+    env.update(settings)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+         "-w", str(workers), "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/lessons")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start within 30 seconds")
+
+
+def run_client(port, duration):
+    """Act as one learner for duration seconds; return (latencies, errors, writes, final version)"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    cookie = None
+    latencies, errors, writes = [], 0, 0
+    deadline = time.perf_counter() + duration
+    index = 0
+    while time.perf_counter() < deadline:
+        method, path, body = REQUESTS[index % len(REQUESTS)]
+        index += 1
+        if index % len(REQUESTS) == 0:
+            conn.close()
+        headers = {"Content-Type": "application/json"} if body else {}
+        if cookie:
+            headers["Cookie"] = cookie
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+        # The session cookie (learner id) is set on the first response
+        cookie = cookie or (response.getheader("Set-Cookie") or "").split(";")[0] or None
+        if response.status >= 400:
+            errors += 1
+        elif method == "POST":
+            writes += 1
+
+    conn.request("GET", "/progress", headers={"Cookie": cookie} if cookie else {})
+    version = json.loads(conn.getresponse().read()).get("version", 0)
+    conn.close()
+    return latencies, errors, writes, version
+
+
+def load(workers, clients, duration):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        server = start_server(workers, port, os.path.join(directory, "progress.sqlite3"))
+        try:
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.starmap(run_client, [(port, duration)] * clients)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    latencies = sorted(sample for result in results for sample in result[0])
+    errors = sum(result[1] for result in results)
+    lost = sum(max(0, result[2] - result[3]) for result in results)
+    return [workers, len(latencies), f"{len(latencies) / duration:,.0f}",
+            f"{percentile(latencies, 50) * 1e3:.1f}", f"{percentile(latencies, 99) * 1e3:.1f}",
+            errors, lost]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent learners")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    args = parser.parse_args()
+
+    rows = [load(workers, args.clients, args.duration) for workers in args.workers]
+    print(f"{os.cpu_count()} cores, {args.clients} clients, {args.duration:g}s per run\n")
+    print_table(["workers", "requests", "req/s", "p50 ms", "p99 ms", "errors", "lost writes"], rows)
+    return 1 if any(row[-1] or row[-2] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
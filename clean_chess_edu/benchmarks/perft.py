@@ -0,0 +1,66 @@
+"""Perft correctness and speed suite for the server-side move generator.
+
+Runs perft (a count of every legal move sequence to a fixed depth) on the
+standard test positions, checks the node counts against the published
+values and reports nodes per second. It then times ``play`` replaying the
+opening of a game, which is what validating one exercise completion costs.
+
+    python benchmarks/perft.py               # depths that finish in seconds
+    python benchmarks/perft.py --depth 5     # deeper, slower runs
+
+Exits with status 1 if any node count is wrong.
+"""
+import argparse
+import sys
+
+from common import percentile, print_table, timed
+
+from chess_core import perft, play, Position, START_FEN
+
+# (name, FEN, node counts for depth 1, 2, ...) from the Chess Programming Wiki
+POSITIONS = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+# Opening moves of a Ruy Lopez, Closed, used to time a typical validation
+SAMPLE_GAME = ("e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7 f1e1 b7b5 a4b3 d7d6 "
+               "c2c3 e8g8 h2h3 c6a5 b3c2 c7c5 d2d4 d8c7 b1d2 c5d4 c3d4 a5c6 d2b3 a6a5 "
+               "c1e3 a5a4 b3d2 c8d7 a1c1 c7b7 d2f1 f8c8 f1g3 h7h6").split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=3, help="perft depth (capped per position)")
+    parser.add_argument("--iterations", type=int, default=200, help="replays of the sample game")
+    args = parser.parse_args()
+
+    rows = []
+    failed = False
+    for name, fen, expected in POSITIONS:
+        depth = min(args.depth, len(expected))
+        nodes, elapsed = timed(perft, Position.from_fen(fen), depth)
+        ok = nodes == expected[depth - 1]
+        failed = failed or not ok
+        rows.append([name, depth, nodes, "ok" if ok else f"expected {expected[depth - 1]}",
+                     f"{elapsed:.2f}", f"{nodes / elapsed:,.0f}"])
+    print_table(["position", "depth", "nodes", "check", "seconds", "nodes/s"], rows)
+
+    samples = sorted(timed(play, START_FEN, SAMPLE_GAME)[1] for _ in range(args.iterations))
+    print(f"\nValidating a {len(SAMPLE_GAME)}-ply game: p50 {percentile(samples, 50) * 1e3:.2f} ms, "
+          f"p99 {percentile(samples, 99) * 1e3:.2f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
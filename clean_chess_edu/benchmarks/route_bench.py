@@ -0,0 +1,320 @@
+"""Latency, throughput and allocation benchmark for every Flask route.
+
+Replays scripted learner sessions: open the home page, browse the lesson
+catalog and lessons, open each exercise and ask for position analysis,
+complete exercises (with the moves that solve them where the server
+replays them), objectives and lessons, and sync progress. Per route it
+reports p50/p95/p99 latency and throughput, and, when run in-process, how
+much memory a request allocates at its peak (measured with tracemalloc in
+a separate pass, so tracing doesn't skew the timings).
+
+    python benchmarks/route_bench.py                      # Flask test client
+    python benchmarks/route_bench.py --mode http          # gunicorn over HTTP
+    python benchmarks/route_bench.py --mode http --url http://127.0.0.1:5001 --concurrency 8
+    python benchmarks/route_bench.py --save-baseline baseline.json
+    python benchmarks/route_bench.py --baseline baseline.json
+
+Sessions come from a fixed seed, so every run sends the same requests in
+the same order. With --baseline the run fails (exit status 1) if a route's
+p95 latency or allocations grew by more than --tolerance over the saved
+run, ignoring differences below --noise-floor, or if any request failed.
+Baselines only compare like with like: save one per machine and mode.
+"""
+import argparse
+import collections
+import concurrent.futures
+import gc
+import glob
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from common import completion, load_app, percentile, print_table, ROOT_DIR, SOLVED_OBJECTIVES
+from load_test import free_port, start_server
+
+ANALYSIS_FENS = [
+    "rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 3",
+    "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+]
+
+
+def load_lessons():
+    lessons = []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "content", "lessons", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            lessons.append(json.load(f))
+    return lessons
+
+
+def learner_session(lessons, rng):
+    """Return the (route, method, path, JSON body) requests of one learner's visit"""
+    requests = [
+        ("GET /", "GET", "/", None),
+        ("GET /lessons", "GET", "/lessons", None),
+        ("GET /progress", "GET", "/progress", None),
+    ]
+    for lesson in lessons:
+        lesson_id = lesson["id"]
+        requests.append(("GET /lesson/<id>", "GET", f"/lesson/{lesson_id}", None))
+        exercises = list(lesson.get("interactive_exercises", []))
+        rng.shuffle(exercises)
+        for exercise_id in exercises:
+            requests.append(("GET /exercises/<name>", "GET", f"/exercises/{exercise_id}", None))
+            fen = rng.choice(ANALYSIS_FENS)
+            requests.append(("GET /api/analyze", "GET", "/api/analyze?fen=" + fen.replace(" ", "%20"),
+                             None))
+            requests.append(("POST /api/complete-exercise", "POST", "/api/complete-exercise",
+                             completion(exercise_id)))
+        for index in range(len(lesson.get("objectives", []))):
+            if f"{lesson_id}_{index}" in SOLVED_OBJECTIVES:
+                continue
+            requests.append(("POST /api/complete-objective", "POST", "/api/complete-objective",
+                             {"lessonId": lesson_id, "objectiveIndex": index}))
+        requests.append(("POST /progress/complete-lesson", "POST", "/progress/complete-lesson",
+                         {"lesson_id": lesson_id, "timestamp": "2024-01-01T12:00:00Z"}))
+        requests.append(("POST /save-progress", "POST", "/save-progress",
+                         {"patch": {"completed_lessons": [lesson_id]}, "baseVersion": 0}))
+        requests.append(("GET /progress", "GET", "/progress", None))
+    return requests
+
+
+class ClientLearner:
+    """One learner (cookie jar) talking to the app through the Flask test client"""
+
+    def __init__(self, chess_app):
+        self.client = chess_app.app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpLearner:
+    """One learner with a keep-alive connection to a running server"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, body):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        self.conn.request(method, path, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";")[0]
+        return response.status
+
+    def close(self):
+        self.conn.close()
+
+
+def replay(new_learner, session, track_allocations=False):
+    """Run one session; return [(route, seconds, status, peak bytes or None)]"""
+    learner = new_learner()
+    results = []
+    try:
+        for route, method, path, body in session:
+            peak = None
+            if track_allocations:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            status = learner.request(method, path, body)
+            elapsed = time.perf_counter() - start
+            if track_allocations:
+                peak = tracemalloc.get_traced_memory()[1] - before
+            results.append((route, elapsed, status, peak))
+    finally:
+        learner.close()
+    return results
+
+
+def measure(new_learner, sessions, concurrency):
+    """Replay sessions (concurrently over HTTP); return (results, wall seconds)"""
+    gc.collect()
+    start = time.perf_counter()
+    if concurrency <= 1:
+        results = [result for session in sessions for result in replay(new_learner, session)]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            results = [result for session_results in pool.map(lambda s: replay(new_learner, s), sessions)
+                       for result in session_results]
+    return results, time.perf_counter() - start
+
+
+def measure_allocations(new_learner, sessions):
+    tracemalloc.start()
+    try:
+        return [result for session in sessions
+                for result in replay(new_learner, session, track_allocations=True)]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(results, allocations, wall):
+    """Return per-route statistics and the overall totals"""
+    latencies = collections.defaultdict(list)
+    failures = collections.Counter()
+    for route, elapsed, status, _ in results:
+        latencies[route].append(elapsed)
+        if status >= 400:
+            failures[route] += 1
+    peaks = collections.defaultdict(list)
+    for route, _, _, peak in allocations:
+        peaks[route].append(peak)
+
+    routes = {}
+    for route, samples in latencies.items():
+        samples.sort()
+        route_peaks = sorted(peaks.get(route, []))
+        routes[route] = {
+            "requests": len(samples),
+            "p50_ms": percentile(samples, 50) * 1e3,
+            "p95_ms": percentile(samples, 95) * 1e3,
+            "p99_ms": percentile(samples, 99) * 1e3,
+            # Requests per second one worker thread sustains on this route alone
+            "throughput": len(samples) / sum(samples),
+            "alloc_kb": percentile(route_peaks, 50) / 1024 if route_peaks else None,
+            "failures": failures[route],
+        }
+    totals = {"requests": len(results), "seconds": wall, "throughput": len(results) / wall,
+              "failures": sum(failures.values())}
+    return routes, totals
+
+
+def compare(routes, baseline, tolerance, noise_floor_ms):
+    """Return a description of every regression against the baseline"""
+    regressions = []
+    for route, stats in sorted(routes.items()):
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+        limit = base["p95_ms"] * (1 + tolerance)
+        if stats["p95_ms"] > limit and stats["p95_ms"] - base["p95_ms"] > noise_floor_ms:
+            regressions.append(f"{route}: p95 {stats['p95_ms']:.2f} ms, baseline {base['p95_ms']:.2f} ms")
+        if stats["alloc_kb"] is not None and base.get("alloc_kb") is not None:
+            limit = base["alloc_kb"] * (1 + tolerance)
+            # A kilobyte either way is noise from caches warming up
+            if stats["alloc_kb"] > limit and stats["alloc_kb"] - base["alloc_kb"] > 1:
+                regressions.append(f"{route}: allocates {stats['alloc_kb']:.1f} KB, "
+                                   f"baseline {base['alloc_kb']:.1f} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("client", "http"), default="client")
+    parser.add_argument("--url", help="server to test in http mode (default: start gunicorn)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers when started here")
+    parser.add_argument("--sessions", type=int, default=200, help="learner sessions to replay")
+    parser.add_argument("--warmup", type=int, default=20, help="sessions replayed before measuring")
+    parser.add_argument("--alloc-sessions", type=int, default=20,
+                        help="sessions replayed under tracemalloc (client mode)")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent learners (http mode)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="fail if this run regresses against the saved run")
+    parser.add_argument("--save-baseline", help="save this run as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth")
+    parser.add_argument("--noise-floor", type=float, default=1.0,
+                        help="ms of p95 growth ignored whatever the tolerance")
+    args = parser.parse_args()
+
+    lessons = load_lessons()
+    rng = random.Random(args.seed)
+    warmup = [learner_session(lessons, rng) for _ in range(args.warmup)]
+    sessions = [learner_session(lessons, rng) for _ in range(args.sessions)]
+
+    server = directory = None
+    if args.mode == "client":
+        chess_app = load_app()
+        new_learner = lambda: ClientLearner(chess_app)  # noqa: E731
+        concurrency = 1
+    else:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            directory = tempfile.mkdtemp()
+            server = start_server(args.workers, port, os.path.join(directory, "progress.sqlite3"))
+        new_learner = lambda: HttpLearner(host, port)  # noqa: E731
+        concurrency = args.concurrency
+
+    try:
+        measure(new_learner, warmup, concurrency)
+        results, wall = measure(new_learner, sessions, concurrency)
+        allocations = []
+        if args.mode == "client" and args.alloc_sessions:
+            allocations = measure_allocations(new_learner, sessions[:args.alloc_sessions])
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=60)
+        if directory is not None:
+            shutil.rmtree(directory)
+
+    routes, totals = summarize(results, allocations, wall)
+    rows = [[route, stats["requests"], f"{stats['p50_ms']:.2f}", f"{stats['p95_ms']:.2f}",
+             f"{stats['p99_ms']:.2f}", f"{stats['throughput']:,.0f}",
+             "-" if stats["alloc_kb"] is None else f"{stats['alloc_kb']:.1f}", stats["failures"]]
+            for route, stats in sorted(routes.items())]
+    print_table(["route", "requests", "p50 ms", "p95 ms", "p99 ms", "req/s", "alloc KB", "failed"], rows)
+    print(f"\n{totals['requests']:,} requests from {args.sessions} sessions in {totals['seconds']:.2f}s: "
+          f"{totals['throughput']:,.0f} req/s ({args.mode} mode, concurrency {concurrency})")
+
+    run = {
+        "meta": {"mode": args.mode, "concurrency": concurrency, "sessions": args.sessions,
+                 "seed": args.seed, "python": platform.python_version(),
+                 "machine": platform.node()},
+        "routes": routes,
+        "totals": totals,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    failed = totals["failures"] > 0
+    if failed:
+        print(f"\n{totals['failures']} requests failed", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"]["mode"] != args.mode:
+            print(f"Baseline was recorded in {baseline['meta']['mode']} mode, not {args.mode}",
+                  file=sys.stderr)
+            return 2
+        regressions = compare(routes, baseline, args.tolerance, args.noise_floor)
+        if regressions:
+            print("\nRegressions against " + args.baseline + ":", file=sys.stderr)
+            for regression in regressions:
+                print("  " + regression, file=sys.stderr)
+            failed = True
+        else:
+            print(f"No regressions against {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""gunicorn settings for serving ChessEdu in production.
+
+    gunicorn -c gunicorn.conf.py
+    gunicorn -c gunicorn.conf.py -w 8 -b 0.0.0.0:8000
+
+Run from the clean_chess_edu directory. Send SIGHUP to the master process
+for a graceful reload: it re-reads this file, starts workers running the
+current code and lets the old ones finish their in-flight requests.
+"""
+import multiprocessing
+import os
+import sys
+
+wsgi_app = "wsgi:app"
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+bind = os.environ.get("CHESSEDU_BIND", "127.0.0.1:5001")
+
+# A process per core for the CPU-bound work (move validation, analysis), and a
+# few threads in each so requests waiting on SQLite don't leave a core idle
+workers = int(os.environ.get("CHESSEDU_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("CHESSEDU_THREADS", "4"))
+
+# Each worker imports the app itself, so a reload picks up new code and no
+# SQLite connection or memory-mapped file is inherited across fork
+preload_app = False
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Replace workers now and then so slow memory growth can't accumulate
+max_requests = 20000
+max_requests_jitter = 2000
+
+accesslog = os.environ.get("CHESSEDU_ACCESS_LOG")  # "-" logs to stdout
+
+
+def metrics_dir():
+    from metrics import DEFAULT_METRICS_DIR
+    return os.environ.get("CHESSEDU_METRICS_DIR", DEFAULT_METRICS_DIR)
+
+
+def on_starting(server):
+    # Workers refuse the development key too (see wsgi.py); failing here
+    # reports it once instead of from every worker
+    if not os.environ.get("CHESSEDU_SECRET_KEY"):
+        sys.exit("Set CHESSEDU_SECRET_KEY to a long random string before starting gunicorn")
+    # Counts left by a previous run would be reported as this run's
+    from metrics import clear_directory
+    clear_directory(metrics_dir())
+
+
+def worker_exit(server, worker):
+    # Save the worker's last counts before child_exit archives them
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        app_module.request_metrics.flush()
+
+
+def child_exit(server, worker):
+    from metrics import archive_worker
+    archive_worker(metrics_dir(), worker.pid)
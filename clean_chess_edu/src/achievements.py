@@ -0,0 +1,127 @@
+"""Declarative achievement rules for the ChessEdu app.
+
+Achievements are plain data: each one names the event that can unlock it and
+either the specific lesson/objective/exercise it is tied to or a threshold
+(lessons completed, streak length). ``compile_rules`` turns that data into an
+``AchievementEngine`` that indexes rules by (event, key) once at startup, so
+each completion event only evaluates the handful of rules it can affect.
+"""
+
+# Events emitted by the completion handlers
+LESSON_COMPLETED = "lesson_completed"
+OBJECTIVE_COMPLETED = "objective_completed"
+EXERCISE_COMPLETED = "exercise_completed"
+STREAK_CHANGED = "streak_changed"
+
+
+class AchievementRule:
+    """An achievement and the condition under which it is awarded"""
+    __slots__ = ("achievement", "event", "key", "min_lessons", "all_lessons", "min_streak")
+
+    def __init__(self, achievement, event, key=None, min_lessons=None, all_lessons=False,
+                 min_streak=None):
+        self.achievement = achievement
+        self.event = event
+        # Keyed rules fire for one lesson id / objective key / exercise id only
+        self.key = key
+        self.min_lessons = min_lessons
+        self.all_lessons = all_lessons
+        self.min_streak = min_streak
+
+    def is_satisfied(self, progress, lesson_ids):
+        """Check the rule against a learner's current progress
+
+        Lesson thresholds only count the lessons in ``lesson_ids`` (the
+        curriculum), so ids outside it never unlock them.
+        """
+        if self.key is not None:
+            if self.event == LESSON_COMPLETED:
+                return self.key in progress.completed_lessons
+            if self.event == OBJECTIVE_COMPLETED:
+                return self.key in progress.completed_objectives
+            if self.event == EXERCISE_COMPLETED:
+                return any(completion.has_completed_exercise(self.key)
+                           for completion in progress.lessons.values())
+            return False
+
+        if (self.min_lessons is not None and
+                sum(1 for lesson_id in progress.completed_lessons if lesson_id in lesson_ids) < self.min_lessons):
+            return False
+        if self.all_lessons and not lesson_ids <= progress.completed_lessons.keys():
+            return False
+        if self.min_streak is not None and progress.current_streak < self.min_streak:
+            return False
+        return True
+
+
+class AchievementEngine:
+    """Evaluates only the rules indexed under each incoming event"""
+
+    def __init__(self, rules, lesson_ids):
+        self.lesson_ids = frozenset(lesson_ids)
+        self.rules_by_id = {}
+        self._index = {}
+        for rule in rules:
+            self.rules_by_id[rule.achievement["id"]] = rule
+            self._index.setdefault((rule.event, rule.key), []).append(rule)
+
+    def emit(self, progress, event, key=None):
+        """Award every achievement unlocked by an event; return the new ones"""
+        awarded = []
+        candidates = self._index.get((event, key), ())
+        if key is not None:
+            candidates = list(candidates) + self._index.get((event, None), [])
+        for rule in candidates:
+            if progress.has_achievement(rule.achievement["id"]):
+                continue
+            if rule.is_satisfied(progress, self.lesson_ids) and progress.award(rule.achievement):
+                awarded.append(rule.achievement)
+        return awarded
+
+    def award_by_id(self, progress, achievement_id):
+        """Award a named achievement if its rule is satisfied
+
+        Returns True when the achievement was awarded or already held, False
+        when its requirements are not met, and None when it does not exist.
+        """
+        rule = self.rules_by_id.get(achievement_id)
+        if rule is None:
+            return None
+        if progress.has_achievement(achievement_id):
+            return True
+        if not rule.is_satisfied(progress, self.lesson_ids):
+            return False
+        progress.award(rule.achievement)
+        return True
+
+
+def compile_rules(lessons, objective_achievements, milestone_achievements):
+    """Build an AchievementEngine from the curriculum and achievement data
+
+    ``lessons`` contribute their ``achievement`` for LESSON_COMPLETED,
+    ``objective_achievements`` maps "lessonId_objectiveIndex" keys to
+    achievements, and each milestone achievement carries a ``trigger`` dict
+    with an ``event`` plus ``key``, ``min_lessons``, ``all_lessons`` or
+    ``min_streak``.
+    """
+    rules = []
+    for lesson in lessons:
+        if "achievement" in lesson:
+            rules.append(AchievementRule(lesson["achievement"], LESSON_COMPLETED, key=lesson["id"]))
+
+    for obj_key, achievement in objective_achievements.items():
+        rules.append(AchievementRule(achievement, OBJECTIVE_COMPLETED, key=obj_key))
+
+    for achievement in milestone_achievements:
+        trigger = achievement["trigger"]
+        rules.append(AchievementRule(
+            {"id": achievement["id"], "title": achievement["title"],
+             "description": achievement["description"]},
+            trigger["event"],
+            key=trigger.get("key"),
+            min_lessons=trigger.get("min_lessons"),
+            all_lessons=trigger.get("all_lessons", False),
+            min_streak=trigger.get("min_streak")
+        ))
+
+    return AchievementEngine(rules, [lesson["id"] for lesson in lessons])
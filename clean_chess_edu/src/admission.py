@@ -0,0 +1,149 @@
+"""Admission control and request coalescing for bursts of traffic.
+
+A class opening the app at once sends every tab's page, catalog and progress
+requests in the same second, then completions in waves. Three pieces keep
+latency bounded for the requests that are served rather than letting every
+request slow down together:
+
+``RateLimiter`` gives each client a token bucket (a steady rate plus a
+burst allowance); a client that runs out is told how long to wait, which
+the app returns as 429 with Retry-After. Buckets are kept for the most
+recently seen clients only, so memory stays bounded.
+
+``AdmissionGate`` lets a fixed number of requests run at once and up to a
+fixed number more wait for a slot, each for at most a timeout. Requests
+beyond the queue, or that time out in it, are turned away straight away
+(503 with Retry-After) instead of queueing without bound, and the ones
+that run compete with a few others for the interpreter rather than with
+the whole class.
+
+``SingleFlight`` runs a function once for all callers that ask for the same
+key at the same time: followers wait for the leader's result instead of
+repeating the work.
+
+All three are per process; under gunicorn every worker admits and limits
+on its own.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Token buckets per client: rate requests a second, bursts of up to burst"""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> (tokens, time they were counted), least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client, now=None):
+        """Take a token for client; return 0 if it had one, else the seconds until it will"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, counted = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                # Forgetting a client hands it a full bucket, which is what it
+                # would have after being idle for that long anyway
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class AdmissionGate:
+    """At most max_active requests at once, and at most max_queued waiting up to timeout for a slot"""
+
+    def __init__(self, max_active, max_queued, timeout):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self._condition = threading.Condition()
+
+    def enter(self):
+        """Take a slot, waiting if needed; return False if the request should be turned away"""
+        with self._condition:
+            if self.active < self.max_active and not self.queued:
+                self.active += 1
+                return True
+            if self.queued >= self.max_queued:
+                return False
+            self.queued += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # Pass on a wakeup this waiter may have taken
+                        self._condition.notify()
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.active += 1
+            return True
+
+    def leave(self):
+        """Give back a slot taken by a successful enter()"""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def retry_after(self):
+        """Return the whole seconds a turned-away client should wait before retrying"""
+        return max(1, math.ceil(self.timeout))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs fn once for every caller that asks for the same key while it runs"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        # Callers that got another caller's result instead of running fn
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the call already running for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,122 @@
+"""Position analysis for hints and square highlighting, with a shared cache.
+
+``analyze(position)`` describes a position the way the lesson pages need
+it: the legal moves (UCI and SAN), which squares each side attacks, which
+pieces are defended or hanging, who controls the four center squares, and
+the forks and pins on the board or one move away.
+
+Analysis costs a few milliseconds, and learners keep returning to the same
+handful of lesson positions, so ``AnalysisCache`` keeps the serialized
+results in an LRU keyed by the position's Zobrist hash. A repeated position
+is then a hash and a dict lookup.
+"""
+import collections
+import threading
+
+from chess_core import (attacks_from, BLACK, KING, move_to_uci, square_name, squares,
+                        WHITE)
+from tactics import find_motifs, pinned_pieces, PIECE_NAMES, SLIDER_DIRECTIONS
+
+COLOR_NAMES = ("white", "black")
+CENTER_SQUARES = (27, 28, 35, 36)  # d4, e4, d5, e5
+
+
+def attack_counts(position, color):
+    """Return a list of how many of color's pieces attack each square"""
+    occupied = position.occupied[0] | position.occupied[1]
+    counts = [0] * 64
+    for piece_type in range(6):
+        for square in squares(position.pieces[color * 6 + piece_type]):
+            for target in squares(attacks_from(piece_type, square, color, occupied)):
+                counts[target] += 1
+    return counts
+
+
+def _square_names(bitboard):
+    return [square_name(square) for square in squares(bitboard)]
+
+
+def analyze(position):
+    """Return a JSON-ready description of position"""
+    counts = (attack_counts(position, WHITE), attack_counts(position, BLACK))
+    legal = position.legal_moves()
+    in_check = position.in_check()
+
+    attacked, defended, hanging = {}, {}, {}
+    for color, name in enumerate(COLOR_NAMES):
+        own = position.occupied[color] & ~position.pieces[color * 6 + KING]
+        attacked[name] = [square_name(square) for square in range(64) if counts[color][square]]
+        defended[name] = [square_name(square) for square in squares(own) if counts[color][square]]
+        hanging[name] = [square_name(square) for square in squares(own)
+                         if counts[color ^ 1][square] and not counts[color][square]]
+
+    pins = []
+    for color, name in enumerate(COLOR_NAMES):
+        for piece_type in SLIDER_DIRECTIONS:
+            for square in squares(position.pieces[color * 6 + piece_type]):
+                for pinned, behind in pinned_pieces(position, square, piece_type, color):
+                    pins.append({"by": square_name(square), "pinned": square_name(pinned),
+                                 "behind": square_name(behind), "color": name})
+
+    moves, tactics = [], []
+    for move in legal:
+        uci, san = move_to_uci(move), position.san(move)
+        moves.append({"uci": uci, "san": san})
+        for theme, piece, level in find_motifs(position, move):
+            tactics.append({"uci": uci, "san": san, "theme": theme, "piece": piece,
+                            "difficulty": level})
+
+    return {
+        "position": " ".join(position.fen().split()[:4]),
+        "sideToMove": COLOR_NAMES[position.side],
+        "inCheck": in_check,
+        "checkmate": in_check and not legal,
+        "stalemate": not in_check and not legal,
+        "legalMoves": moves,
+        "attacked": attacked,
+        "defended": defended,
+        "hanging": hanging,
+        "centerControl": {square_name(square): {"white": counts[WHITE][square],
+                                                "black": counts[BLACK][square]}
+                          for square in CENTER_SQUARES},
+        "pins": pins,
+        "tactics": tactics,
+    }
+
+
+class AnalysisCache:
+    """A thread-safe LRU of serialized analyses keyed by Zobrist hash"""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+            }
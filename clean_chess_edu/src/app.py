@@ -1,64 +1,156 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, g, jsonify, request, session, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import hmac
+import math
 import os
 import json
+import queue
+import time
+import uuid
+from datetime import datetime, timezone
+
+from admission import AdmissionGate, RateLimiter, SingleFlight
+from assets import AssetManifest
+from analysis import analyze, AnalysisCache
+from achievements import (compile_rules, EXERCISE_COMPLETED, LESSON_COMPLETED,
+                          OBJECTIVE_COMPLETED, STREAK_CHANGED)
+from catalog import LessonCatalog
+from chess_core import IllegalMoveError, move_to_uci, play, Position, START_FEN
+from event_log import completion_events, DEFAULT_EVENT_LOG, EventLogWriter
+from leaderboard import BOARDS, create_leaderboards, public_name, standing
+from metrics import RequestMetrics
+from opening_book import MOVE_BITS, open_opening_book, PRINCIPLED
+from pages import PageCache
+from precompressed import PrecompressedPayload
+from progress_events import (DatagramPublisher, HEARTBEAT_INTERVAL, ProgressBroker,
+                             snapshot_event)
+from progress_model import MERGEABLE_PATCH_KEYS
+from progress_store import create_progress_store, ProgressConflict
+from progress_transfer import export_csv, export_ndjson, import_records, ProgressValidator
+from puzzles import filter_error, open_puzzle_index
+from reviews import create_review_store, DEFAULT_QUALITY
 
 app = Flask(__name__, 
             static_folder="../static",
             template_folder="../templates")
-app.secret_key = 'chess_education_app_secret_key'
+# Signs the session cookie that identifies each learner (here and in
+# sse_server.py), so anyone who knows the key can act as any learner. Set
+# CHESSEDU_SECRET_KEY to a long random string; wsgi.py and sse_server.py refuse
+# to start with the development key.
+DEVELOPMENT_SECRET_KEY = 'chess_education_app_secret_key'
+app.secret_key = os.environ.get("CHESSEDU_SECRET_KEY") or DEVELOPMENT_SECRET_KEY
 
-# Lesson data structure
-LESSONS = [
-    {
-        "id": 1,
-        "title": "Chess Pieces & Board Setup",
-        "description": "Learn about each chess piece, how it moves, and how to set up the board correctly.",
-        "content": "In this lesson, you will learn about all six chess pieces: Pawn, Knight, Bishop, Rook, Queen, and King. You'll also learn how to properly set up a chess board.",
-        "objectives": ["Identify all chess pieces", "Understand how each piece moves", "Set up a chess board correctly"],
-        "interactive_exercises": ["piece_movement", "board_setup"],
-        "achievement": {
-            "id": "chess_pieces",
-            "title": "Chess Pieces Master",
-            "description": "Completed the lesson on Chess Pieces & Board Setup"
-        }
-    },
-    {
-        "id": 2,
-        "title": "Basic Opening Principles",
-        "description": "Learn fundamental principles to start your chess games effectively.",
-        "content": "Opening principles include controlling the center, developing your pieces, and castling for king safety.",
-        "objectives": ["Control the center", "Develop your pieces", "Castle for king safety"],
-        "interactive_exercises": ["center_control", "piece_development"],
-        "achievement": {
-            "id": "opening_principles", 
-            "title": "Opening Expert",
-            "description": "Mastered the Basic Opening Principles"
-        }
-    },
-    {
-        "id": 3,
-        "title": "Simple Tactics: Forks & Pins",
-        "description": "Learn about forks, pins, and how they can give you an advantage.",
-        "content": "Tactics are short sequences of moves that result in a tangible gain. Forks attack two pieces simultaneously, while pins restrict piece movement.",
-        "objectives": ["Identify and execute forks", "Recognize pin opportunities", "Defend against common tactics"],
-        "interactive_exercises": ["fork_practice", "pin_practice"],
-        "achievement": {
-            "id": "tactics_master",
-            "title": "Tactics Master",
-            "description": "Learned about Forks & Pins tactics"
-        }
-    }
-]
+# Lessons are loaded from one JSON file per lesson in content/lessons. Besides
+# the fields the frontend shows, a lesson may set "achievement" (awarded when it
+# is completed) and "completes_objectives" (completing it completes every objective).
+LESSONS_DIR = os.environ.get(
+    "CHESSEDU_LESSONS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "content", "lessons"))
+lesson_catalog = LessonCatalog(
+    LESSONS_DIR, dumps=lambda obj: app.json.dumps(obj, separators=(",", ":")))
+LESSONS = lesson_catalog.load()
 
-# Enhanced user progress tracking structure
-USER_PROGRESS = {
-    # Change from simple array to object structure to match frontend expectations
-    "completedLessons": [],  # Will contain objects with lessonId, completed status
-    "completed_lessons": [], # Keep the old format for backward compatibility
-    "achievements": [],
-    "completedObjectives": [], # Track completed objectives as "lessonId_objectiveIndex"
-    "current_streak": 0
-}
+# Per-learner progress storage (see progress_store.py for the document layout).
+# Set CHESSEDU_PROGRESS_DB to a file path, or to ":memory:" for a throwaway store.
+# CHESSEDU_SHARED_STORE=1 (the default under wsgi.py) keeps the store consistent
+# when several worker processes serve the app.
+PROGRESS_DB = os.environ.get("CHESSEDU_PROGRESS_DB",
+                             os.path.join(app.instance_path, "progress.sqlite3"))
+SHARED_STORE = os.environ.get("CHESSEDU_SHARED_STORE", "0") not in ("", "0")
+progress_store = create_progress_store(PROGRESS_DB, shared=SHARED_STORE)
+
+# Spaced-repetition reviews of completed exercises (see reviews.py), kept in
+# the same database as progress, or in memory alongside an in-memory store.
+review_store = create_review_store(PROGRESS_DB)
+
+# Leaderboards by streak, lessons completed and achievements (see leaderboard.py),
+# updated as progress changes and shared between workers through the same database.
+leaderboards = create_leaderboards(PROGRESS_DB)
+MAX_LEADERBOARD_ENTRIES = 100
+
+# Live progress updates (see progress_events.py). With CHESSEDU_EVENTS_SOCKET set
+# (the default under wsgi.py) edits are forwarded to sse_server.py, which serves
+# /progress/stream; otherwise this process serves the streams itself.
+EVENTS_SOCKET = os.environ.get("CHESSEDU_EVENTS_SOCKET")
+if EVENTS_SOCKET:
+    progress_events = DatagramPublisher(EVENTS_SOCKET)
+else:
+    progress_events = ProgressBroker()
+
+# Append-only log of first completions, analysed by event_analytics.py.
+# CHESSEDU_EVENT_LOG names its directory; set it to "" to turn the log off.
+EVENT_LOG = os.environ.get("CHESSEDU_EVENT_LOG", DEFAULT_EVENT_LOG)
+event_log = EventLogWriter(EVENT_LOG) if EVENT_LOG else None
+
+# Bundled, fingerprinted assets built by build_assets.py. Without a build the
+# templates link the source files from static/ directly.
+asset_manifest = AssetManifest(os.path.join(app.static_folder, "dist"))
+app.jinja_env.globals["asset_tags"] = asset_manifest.tags
+
+# Fork/pin puzzles mined from PGN files by mine_tactics.py, memory-mapped.
+# Without an index /api/puzzles answers 503 and the exercises keep their
+# built-in positions.
+PUZZLE_INDEX = os.environ.get(
+    "CHESSEDU_PUZZLE_INDEX",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "content", "puzzles", "puzzles.bin"))
+puzzle_index = open_puzzle_index(PUZZLE_INDEX)
+
+# Principled opening lines built by build_opening_book.py, memory-mapped and
+# keyed by Zobrist hash. Without a book /api/openings/classify answers 503
+# and the exercises fall back to their own move lists.
+OPENING_BOOK = os.environ.get(
+    "CHESSEDU_OPENING_BOOK",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "content", "openings", "book.bin"))
+opening_book = open_opening_book(OPENING_BOOK)
+
+# /api/analyze results, shared by all requests and keyed by Zobrist hash.
+# CHESSEDU_ANALYSIS_CACHE sets how many positions are kept.
+analysis_cache = AnalysisCache(int(os.environ.get("CHESSEDU_ANALYSIS_CACHE", "4096")))
+
+# Per-endpoint request metrics served from /metrics (see metrics.py). Worker
+# processes pool their counts in CHESSEDU_METRICS_DIR (set by wsgi.py).
+# Requests slower than CHESSEDU_SLOW_REQUEST_MS are logged.
+request_metrics = RequestMetrics(os.environ.get("CHESSEDU_METRICS_DIR"))
+SLOW_REQUEST_SECONDS = float(os.environ.get("CHESSEDU_SLOW_REQUEST_MS", "500")) / 1000
+slow_request_log = app.logger.getChild("slow_requests")
+
+# Bearer token for the operator endpoints (/metrics/profile). They are
+# refused while it is unset.
+ADMIN_TOKEN = os.environ.get("CHESSEDU_ADMIN_TOKEN")
+
+# Admission control for classroom bursts (see admission.py). Each learner gets
+# CHESSEDU_RATE_LIMIT requests a second with bursts of CHESSEDU_RATE_BURST, then
+# 429. Requests without a learner session yet (each of which starts a new one)
+# share a bucket per client address instead, generous enough for a class behind
+# one address: CHESSEDU_NEW_SESSION_RATE a second with bursts of
+# CHESSEDU_NEW_SESSION_BURST. Behind a reverse proxy set CHESSEDU_PROXY_COUNT to
+# the number of proxies, so the address is read from X-Forwarded-For. At most
+# CHESSEDU_MAX_ACTIVE requests run at once per process and up to
+# CHESSEDU_MAX_QUEUED more wait CHESSEDU_QUEUE_TIMEOUT_MS for a slot; the rest get
+# 503. Set CHESSEDU_RATE_LIMIT or CHESSEDU_MAX_ACTIVE to 0 to turn either off.
+# Static files, metrics and long-lived streams are exempt.
+RATE_LIMIT = float(os.environ.get("CHESSEDU_RATE_LIMIT", "10"))
+RATE_BURST = float(os.environ.get("CHESSEDU_RATE_BURST", "40"))
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST) if RATE_LIMIT > 0 else None
+new_session_limiter = RateLimiter(
+    float(os.environ.get("CHESSEDU_NEW_SESSION_RATE", "5")),
+    float(os.environ.get("CHESSEDU_NEW_SESSION_BURST", "60"))) if RATE_LIMIT > 0 else None
+PROXY_COUNT = int(os.environ.get("CHESSEDU_PROXY_COUNT", "0"))
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+MAX_ACTIVE = int(os.environ.get("CHESSEDU_MAX_ACTIVE", "4"))
+admission_gate = AdmissionGate(
+    MAX_ACTIVE, int(os.environ.get("CHESSEDU_MAX_QUEUED", "64")),
+    float(os.environ.get("CHESSEDU_QUEUE_TIMEOUT_MS", "2000")) / 1000) if MAX_ACTIVE > 0 else None
+ADMISSION_EXEMPT = frozenset(["static", "built_asset", "metrics", "route_profile", "progress_stream",
+                              "export_progress"])
+
+# Work on shared resources done once for every request that needs it at the
+# same time: a class opening the same exercise analyses the same positions and
+# reads the same leaderboards, and content reloads while debugging
+analysis_builds = SingleFlight()
+leaderboard_queries = SingleFlight()
+content_reloads = SingleFlight()
 
 # Map of exercise IDs to their parent lesson IDs
 EXERCISE_TO_LESSON = {
@@ -70,6 +162,20 @@ EXERCISE_TO_LESSON = {
     "pin_practice": 3
 }
 
+# Exercise pages served at /exercises/<name> that are not part of a lesson
+STANDALONE_EXERCISE_PAGES = ["basic_tactics"]
+
+# Pages rendered once at startup and served from memory (see pages.py): the
+# index, the board and the page of every exercise above. Other exercise
+# names get a 404.
+page_cache = PageCache(app, {
+    "index": "index.html",
+    "board": "board.html",
+    **{f"exercises/{name}": f"exercises/{name}.html"
+       for name in [*EXERCISE_TO_LESSON, *STANDALONE_EXERCISE_PAGES]}
+})
+page_cache.render()
+
 # Map of exercise IDs to specific lesson objectives
 EXERCISE_TO_OBJECTIVE = {
     "center_control": {"lesson_id": 2, "objective_index": 0},
@@ -77,6 +183,27 @@ EXERCISE_TO_OBJECTIVE = {
     # For the third objective (Castle for king safety), we'll add a specific exercise later
 }
 
+# Exercises whose completions must carry the moves that solve them, step by
+# step: the position each step starts from, the piece the learner has to move
+# ("pnbrqk") and the moves (SAN) that complete the step. As on the exercise
+# page, a move of that piece the opening book calls principled completes a step
+# too. Completions are replayed from these positions, whatever the client says
+# they started from (see verify_exercise_moves).
+EXERCISE_GOALS = {
+    "piece_development": [
+        {"fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+         "piece": "n", "moves": ["Nf3", "Nc3"]},
+        {"fen": "rnbqkb1r/pppppppp/5n2/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 2 2",
+         "piece": "p", "moves": ["e5", "d5"]},
+        {"fen": "rnbqk2r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1",
+         "piece": "b", "moves": ["Bc4", "Bb5"]},
+        {"fen": "rnbqk2r/pppp1ppp/5n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+         "piece": "k", "moves": ["O-O"]},
+        {"fen": "rnbqk2r/pppp1ppp/5n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 5 4",
+         "piece": "k", "moves": ["O-O"]},
+    ],
+}
+
 # Additional objective achievements to award
 OBJECTIVE_ACHIEVEMENTS = {
     "2_0": {  # Center control
@@ -96,333 +223,928 @@ OBJECTIVE_ACHIEVEMENTS = {
     }
 }
 
+# Progress the server derives itself (streaks count the days a learner
+# completes something), which /save-progress refuses to take from clients
+SERVER_OWNED_PROGRESS_KEYS = frozenset(["current_streak", "last_active_day"])
+
+# Largest number of completion events accepted by one /api/events request
+# (static/js/event-queue.js sends batches of at most this many)
+MAX_EVENT_BATCH = 500
+
+# Largest number of moves an exercise completion may ask the server to replay
+MAX_EXERCISE_MOVES = 300
+
+# Largest number of learners returned by one /api/reviews/learners request
+MAX_DUE_LEARNERS = 1000
+
+# Largest number of puzzles returned by one /api/puzzles request
+MAX_PUZZLES = 20
+
+# Most requests a worker profiles in one /metrics/profile session
+MAX_PROFILED_REQUESTS = 10000
+
+# Achievements that are not tied to a single lesson or objective. Each trigger
+# names the event that can unlock it and the threshold it has to reach.
+MILESTONE_ACHIEVEMENTS = [
+    {
+        "id": "first_lesson",
+        "title": "First Step",
+        "description": "Completed your first chess lesson!",
+        "trigger": {"event": LESSON_COMPLETED, "min_lessons": 1}
+    },
+    {
+        "id": "all_lessons",
+        "title": "Chess Fundamentals Graduate",
+        "description": "Completed all basic chess lessons!",
+        "trigger": {"event": LESSON_COMPLETED, "all_lessons": True}
+    },
+    {
+        "id": "three_day_streak",
+        "title": "Consistent Learner",
+        "description": "You've maintained a 3-day learning streak!",
+        "trigger": {"event": STREAK_CHANGED, "min_streak": 3}
+    }
+]
+
+def index_curriculum():
+    """Build the lookup tables and achievement rules derived from LESSONS"""
+    global LESSONS_BY_ID, EXERCISES_BY_ID, EXERCISE_STEPS, GOAL_EXERCISES_BY_LESSON, GOAL_OBJECTIVES
+    global ACHIEVEMENT_ENGINE, validate_progress
+    LESSONS_BY_ID = {lesson["id"]: lesson for lesson in LESSONS}
+    # Position of each exercise in its lesson, as the event log records it
+    EXERCISE_STEPS = {exercise_id: step for lesson in LESSONS
+                      for step, exercise_id in enumerate(lesson.get("interactive_exercises", []))}
+    EXERCISES_BY_ID = {}
+    for exercise_id, lesson_id in EXERCISE_TO_LESSON.items():
+        objective_info = EXERCISE_TO_OBJECTIVE.get(exercise_id)
+        EXERCISES_BY_ID[exercise_id] = {
+            "lesson_id": lesson_id,
+            "objective_key": (f"{objective_info['lesson_id']}_{objective_info['objective_index']}"
+                              if objective_info else None)
+        }
+    # Completions of these are only taken from verify_exercise_moves, never from the client's word
+    GOAL_EXERCISES_BY_LESSON = {
+        lesson["id"]: [exercise_id for exercise_id in lesson.get("interactive_exercises", [])
+                       if exercise_id in EXERCISE_GOALS]
+        for lesson in LESSONS
+    }
+    GOAL_OBJECTIVES = {info["objective_key"]: exercise_id for exercise_id, info in EXERCISES_BY_ID.items()
+                       if exercise_id in EXERCISE_GOALS and info["objective_key"]}
+    ACHIEVEMENT_ENGINE = compile_rules(LESSONS, OBJECTIVE_ACHIEVEMENTS, MILESTONE_ACHIEVEMENTS)
+    validate_progress = ProgressValidator(LESSONS, EXERCISE_TO_LESSON, EXERCISE_TO_OBJECTIVE)
+
+index_curriculum()
+
+def load_curriculum():
+    """Reload lessons from their content files and rebuild everything derived from them"""
+    global LESSONS
+    LESSONS = lesson_catalog.load()
+    index_curriculum()
+
+def on_progress_change(learner_id, previous, progress):
+    """ProgressStore.on_change hook: log new completions, update the leaderboards and publish the edit"""
+    if event_log is not None:
+        event_log.append(learner_id, completion_events(previous, progress, EXERCISE_STEPS))
+    current = standing(progress, LESSONS_BY_ID)
+    if previous is None or standing(previous, LESSONS_BY_ID) != current:
+        leaderboards.record(learner_id, progress.version, current)
+    progress_events.on_change(learner_id, previous, progress)
+
+progress_store.on_change = on_progress_change
+
+def record_imported_progress(items):
+    """import_records hook: put a batch of imported learners on the leaderboards"""
+    leaderboards.record_many([(learner_id, progress.version, standing(progress, LESSONS_BY_ID))
+                              for learner_id, progress in items])
+
+def utc_timestamp():
+    """Return the current time in the ISO 8601 form the frontend stores"""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def utc_day():
+    """Return today's UTC date, the calendar day streaks are counted in"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+def iso_timestamp(milliseconds):
+    """Return milliseconds since the epoch in the same ISO 8601 form"""
+    moment = datetime.fromtimestamp(milliseconds / 1000, timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def current_learner_id():
+    """Return the learner id stored in the session, assigning one if needed"""
+    learner_id = session.get("learner_id")
+    if not learner_id:
+        learner_id = uuid.uuid4().hex
+        session["learner_id"] = learner_id
+        session.permanent = True
+    return learner_id
+
+def progress_etag(learner_id, version):
+    """Return the entity tag for one version of a learner's progress"""
+    return f"{learner_id[:12]}-{version}"
+
+def serialize_progress(document):
+    """Return document (a progress document or a response embedding one) as
+    compact JSON, recording the serialization time and size"""
+    start = time.perf_counter()
+    body = app.json.dumps(document, separators=(",", ":"))
+    request_metrics.record_progress(request.endpoint, time.perf_counter() - start, len(body))
+    return body
+
+def progress_json_response(document, body=None):
+    """Return document as JSON (body, if it is serialized already)"""
+    if body is None:
+        body = serialize_progress(document)
+    g.progress_bytes = len(body)
+    return app.response_class(body + "\n", mimetype="application/json")
+
+def progress_response(progress, learner_id=None):
+    """Serialize a LearnerProgress into the JSON document the frontend expects"""
+    learner_id = learner_id or current_learner_id()
+    response = progress_json_response(progress.to_dict())
+    response.set_etag(progress_etag(learner_id, progress.version))
+    response.headers["X-Progress-Version"] = str(progress.version)
+    # Progress is per learner: browsers may keep it but must revalidate every time
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def record_objective(progress, obj_key):
+    """Mark an objective as completed and award what it unlocks"""
+    if progress.complete_objective(obj_key):
+        ACHIEVEMENT_ENGINE.emit(progress, OBJECTIVE_COMPLETED, obj_key)
+
+def record_lesson(progress, lesson_id):
+    """Mark a lesson as completed and award what it unlocks; return True if new"""
+    if not progress.mark_lesson_completed(lesson_id):
+        return False
+    ACHIEVEMENT_ENGINE.emit(progress, LESSON_COMPLETED, lesson_id)
+
+    lesson = LESSONS_BY_ID.get(lesson_id)
+    if lesson and lesson.get("completes_objectives"):
+        for obj_index, _ in enumerate(lesson.get("objectives", [])):
+            record_objective(progress, f"{lesson_id}_{obj_index}")
+    return True
+
+def record_activity(progress):
+    """Count today towards the learner's streak of active days and award streak achievements"""
+    if progress.record_activity(utc_day()):
+        ACHIEVEMENT_ENGINE.emit(progress, STREAK_CHANGED)
+
+class CompletionError(Exception):
+    """A completion that refers to missing or unknown lessons/exercises"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def is_scalar_id(value):
+    """Check that a client-supplied id is a string or integer (ids key dicts and sets)"""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+def curriculum_lesson(lesson_id):
+    """Return the lesson a client-supplied id names, or raise CompletionError"""
+    if lesson_id is None:
+        raise CompletionError("Lesson ID is required")
+    if not is_scalar_id(lesson_id):
+        raise CompletionError("Lesson ID must be a string or integer")
+    lesson = LESSONS_BY_ID.get(lesson_id)
+    if lesson is None:
+        raise CompletionError(f"Lesson '{lesson_id}' not found", 404)
+    return lesson
+
+def goals_solved(progress, lesson_id):
+    """Check that the learner has solved every exercise with goals in a lesson"""
+    completion = progress.lesson(lesson_id)
+    return all(completion is not None and completion.has_completed_exercise(exercise_id)
+               for exercise_id in GOAL_EXERCISES_BY_LESSON.get(lesson_id, ()))
+
+def complete_lesson_record(progress, lesson_id, timestamp, with_exercises=False):
+    """Mark the lesson's completion record completed, stamping when it first was"""
+    completion = progress.ensure_lesson(lesson_id, timestamp, with_exercises)
+    if not completion.completed:
+        completion.completed = True
+        completion.timestamp = timestamp
+    return completion
+
+def apply_lesson_completion(progress, lesson_id, timestamp=""):
+    """Mark a lesson as completed"""
+    curriculum_lesson(lesson_id)
+    if not goals_solved(progress, lesson_id):
+        raise CompletionError(f"Lesson '{lesson_id}' is completed by solving its exercises")
+    # Update both progress formats for backward compatibility
+    complete_lesson_record(progress, lesson_id, timestamp or utc_timestamp())
+    record_lesson(progress, lesson_id)
+    record_activity(progress)
+
+def step_goal_reached(goal, position, move):
+    """Return True if move, the last of a step, is a move that completes the step's goal"""
+    piece = position.piece_at(move & 63)
+    if piece is None or "pnbrqk"[piece[1]] != goal["piece"]:
+        return False
+    if position.san(move).rstrip("+#") in goal["moves"]:
+        return True
+    return opening_book is not None and opening_book.classify(position, move)[0] == PRINCIPLED
+
+def verify_exercise_moves(exercise_id, completion):
+    """Replay the moves of a completion of an exercise with goals and reject
+    it unless they solve every step
+
+    Moves are UCI strings, sent as {"steps": [{"moves"}, ...]} with one entry
+    per step of EXERCISE_GOALS[exercise_id], or as {"moves"} for a single-step
+    exercise. Each step is replayed from the position the server has for it,
+    the side to move there must make the step's last move, and that move has
+    to complete the step. Exercises without goals have nothing to replay.
+    """
+    goals = EXERCISE_GOALS.get(exercise_id)
+    if not goals:
+        return
+    completion = completion or {}
+    steps = completion.get("steps")
+    if steps is None and "moves" in completion and len(goals) == 1:
+        steps = [{"moves": completion["moves"]}]
+    if steps is None:
+        raise CompletionError("This exercise is completed by sending the moves that solve it")
+
+    if not isinstance(steps, list) or not all(
+            isinstance(step, dict) and isinstance(step.get("moves"), list) for step in steps):
+        raise CompletionError("Steps must be objects with a list of moves")
+    if len(steps) != len(goals):
+        raise CompletionError(f"This exercise has {len(goals)} steps, not {len(steps)}")
+    if sum(len(step["moves"]) for step in steps) > MAX_EXERCISE_MOVES:
+        raise CompletionError(f"At most {MAX_EXERCISE_MOVES} moves can be verified at once", 413)
+
+    for number, (step, goal) in enumerate(zip(steps, goals), 1):
+        moves = step["moves"]
+        if not moves:
+            raise CompletionError(f"Step {number}: no moves")
+        try:
+            # The learner may have tried other moves before the one that solved the step
+            position = play(goal["fen"], moves[:-1])
+            last = position.parse_uci(moves[-1])
+        except IllegalMoveError as error:
+            index = len(moves) - 1 if error.index is None else error.index
+            raise CompletionError(f"Step {number}, move {index + 1}: {error}")
+        # Moves alternate sides, so the side to move at the start makes the last move of an odd count
+        if len(moves) % 2 == 0 or not step_goal_reached(goal, position, last):
+            raise CompletionError(f"Step {number}: the moves do not complete this step")
+
+def review_quality(completion):
+    """Return the SM-2 grade (0-5) of an exercise completion, 4 if it has none"""
+    quality = (completion or {}).get("quality", DEFAULT_QUALITY)
+    if not isinstance(quality, int) or isinstance(quality, bool) or not 0 <= quality <= 5:
+        raise CompletionError("quality must be an integer from 0 to 5")
+    return quality
+
+def apply_exercise_completion(progress, exercise_id, completion=None):
+    """Mark an exercise as completed and update associated lesson progress"""
+    if not exercise_id:
+        raise CompletionError("Exercise ID is required")
+    if not isinstance(exercise_id, str):
+        raise CompletionError("Exercise ID must be a string")
+
+    # Find which lesson this exercise belongs to
+    exercise_info = EXERCISES_BY_ID.get(exercise_id)
+    if not exercise_info:
+        raise CompletionError(f"Exercise '{exercise_id}' not found", 404)
+    lesson_id = exercise_info["lesson_id"]
+
+    # Exercises with goals are only completed by moves that reach them
+    if completion:
+        review_quality(completion)
+    verify_exercise_moves(exercise_id, completion)
+
+    # Track objective completion if this exercise maps to a specific objective
+    if exercise_info["objective_key"]:
+        record_objective(progress, exercise_info["objective_key"])
+
+    timestamp = utc_timestamp()
+    lesson_completion = progress.ensure_lesson(lesson_id, timestamp, with_exercises=True)
+    if lesson_completion.complete_exercise(exercise_id, timestamp):
+        ACHIEVEMENT_ENGINE.emit(progress, EXERCISE_COMPLETED, exercise_id)
+
+    # If all exercises for this lesson are completed, mark lesson as completed
+    lesson = LESSONS_BY_ID.get(lesson_id)
+    if lesson and all(lesson_completion.has_completed_exercise(ex)
+                      for ex in lesson.get("interactive_exercises", [])):
+        complete_lesson_record(progress, lesson_id, timestamp)
+        record_lesson(progress, lesson_id)
+    record_activity(progress)
+
+def apply_objective_completion(progress, lesson_id, objective_index):
+    """Mark a specific objective as completed"""
+    if objective_index is None:
+        raise CompletionError("Lesson ID and objective index are required")
+    lesson = curriculum_lesson(lesson_id)
+    if (not isinstance(objective_index, int) or isinstance(objective_index, bool)
+            or not 0 <= objective_index < len(lesson.get("objectives", []))):
+        raise CompletionError(f"Lesson '{lesson_id}' has no objective {objective_index!r}", 404)
+    obj_key = f"{lesson_id}_{objective_index}"
+    if obj_key in GOAL_OBJECTIVES:
+        raise CompletionError(f"Objective '{obj_key}' is completed by solving '{GOAL_OBJECTIVES[obj_key]}'")
+
+    record_objective(progress, obj_key)
+
+    # If all objectives for this lesson are completed, mark the lesson as completed
+    if (lesson_id not in progress.completed_lessons and goals_solved(progress, lesson_id)
+            and all(f"{lesson_id}_{i}" in progress.completed_objectives
+                    for i in range(len(lesson.get("objectives", []))))):
+        complete_lesson_record(progress, lesson_id, utc_timestamp())
+        record_lesson(progress, lesson_id)
+    record_activity(progress)
+
+def apply_event(progress, event):
+    """Apply one completion event from an /api/events batch"""
+    if not isinstance(event, dict):
+        raise CompletionError("Events must be objects")
+    event_type = event.get("type")
+    if event_type == "exercise":
+        apply_exercise_completion(progress, event.get("exerciseId"), event)
+    elif event_type == "objective":
+        apply_objective_completion(progress, event.get("lessonId"), event.get("objectiveIndex"))
+    elif event_type == "lesson":
+        apply_lesson_completion(progress, event.get("lessonId"), event.get("timestamp", ""))
+    else:
+        raise CompletionError(f"Unknown event type '{event_type}'")
+
+def admin_error():
+    """Return an error response unless the request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Set CHESSEDU_ADMIN_TOKEN to use this endpoint"}), 403
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        return jsonify({"error": "A valid admin token is required"}), 401
+    return None
+
+@app.before_request
+def start_request_metrics():
+    """Time the request, count it as in flight and profile it if it is sampled"""
+    endpoint = request.endpoint or "unmatched"
+    request_metrics.request_started(endpoint)
+    # One attribute on g: every access through the proxy costs about a microsecond
+    g.request_timing = (time.perf_counter(), endpoint, request_metrics.profiler.begin(endpoint))
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request's latency, status and response size; log it if it was slow"""
+    started, endpoint, _ = g.request_timing
+    elapsed = time.perf_counter() - started
+    slow = elapsed >= SLOW_REQUEST_SECONDS
+    request_metrics.record_response(endpoint, request.method, response.status_code, elapsed,
+                                    response.content_length, slow)
+    if slow:
+        progress_bytes = g.get("progress_bytes")
+        progress_size = (f", progress document {progress_bytes} bytes"
+                         if progress_bytes is not None else "")
+        slow_request_log.warning("Slow request: %s %s (%s) answered %d in %.1f ms%s",
+                                 request.method, request.path, endpoint, response.status_code,
+                                 elapsed * 1e3, progress_size)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    """Stop profiling the request and count it as no longer in flight"""
+    # Streamed responses (/progress/stream) end here, after their last chunk
+    timing = g.pop("request_timing", None)
+    if timing is None:
+        return
+    _, endpoint, profile = timing
+    if profile is not None:
+        request_metrics.profiler.end(profile)
+    request_metrics.request_finished(endpoint)
+
+def overloaded_response(status, message, retry_after):
+    """Return a 429 or 503 response telling the client when to retry"""
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+@app.before_request
+def admit_request():
+    """Turn the request away if its learner is over their rate or too many requests are waiting"""
+    if request.endpoint in ADMISSION_EXEMPT:
+        return None
+    learner_id = session.get("learner_id")
+    if rate_limiter is not None:
+        if learner_id:
+            wait = rate_limiter.acquire(learner_id)
+        else:
+            # Without a session the request starts a new learner; bound those per address
+            wait = new_session_limiter.acquire(request.remote_addr)
+            if not wait:
+                # Start it now, so the client is known by its session even if the gate turns it away
+                current_learner_id()
+        if wait:
+            return overloaded_response(429, "Too many requests, slow down", math.ceil(wait))
+    if admission_gate is not None:
+        if not admission_gate.enter():
+            return overloaded_response(503, "The server is busy, try again shortly",
+                                       admission_gate.retry_after())
+        g.admitted = True
+    return None
+
+@app.teardown_request
+def release_admission(error=None):
+    """Give the request's slot to the next one waiting"""
+    if g.pop("admitted", False):
+        admission_gate.leave()
+
+def reload_content():
+    """Reload the lessons, assets and pages whose files changed"""
+    if lesson_catalog.changed():
+        load_curriculum()
+    assets_changed = asset_manifest.changed()
+    if assets_changed:
+        asset_manifest.reload()
+    # Pages link the asset bundles, so a rebuild re-renders them too
+    if assets_changed or page_cache.changed():
+        page_cache.render()
+
+@app.before_request
+def reload_changed_content():
+    """Pick up edited lesson files, templates and rebuilt assets without a restart while debugging"""
+    if not app.debug:
+        return
+    # Requests arriving together after an edit wait for one reload rather than each doing it
+    content_reloads.do("content", reload_content)
+
 @app.route('/')
 def index():
-    """Render the main page of the application"""
-    return render_template('index.html')
+    """Serve the main page of the application"""
+    return page_cache.payload("index").respond()
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Serve a fingerprinted bundle from static/dist, precompressed"""
+    payload = asset_manifest.payload(filename)
+    if payload:
+        return payload.respond()
+    return jsonify({"error": "Asset not found"}), 404
 
 @app.route('/lessons')
 def get_lessons():
     """Return all available lessons"""
-    return jsonify(LESSONS)
+    return lesson_catalog.list_payload.respond()
 
 @app.route('/lesson/<int:lesson_id>')
 def get_lesson(lesson_id):
     """Return a specific lesson by ID"""
-    lesson = next((l for l in LESSONS if l["id"] == lesson_id), None)
-    if lesson:
-        return jsonify(lesson)
+    payload = lesson_catalog.lesson_payloads.get(lesson_id)
+    if payload:
+        return payload.respond()
     return jsonify({"error": "Lesson not found"}), 404
 
+@app.route('/api/puzzles')
+def get_puzzles():
+    """Return random puzzles, optionally filtered by theme, piece and difficulty"""
+    if puzzle_index is None:
+        return jsonify({"error": "No puzzle index has been built"}), 503
+
+    theme = request.args.get('theme')
+    piece = request.args.get('piece')
+    difficulty = request.args.get('difficulty', type=int)
+    count = request.args.get('count', 1, type=int)
+    error = filter_error(theme, piece, difficulty)
+    if error:
+        return jsonify({"error": error}), 400
+    if not 1 <= count <= MAX_PUZZLES:
+        return jsonify({"error": f"count must be between 1 and {MAX_PUZZLES}"}), 400
+
+    response = jsonify({"puzzles": puzzle_index.sample(theme, piece, difficulty, count)})
+    # Every request draws new puzzles
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def build_analysis(key, position):
+    """Analyse position, cache the result under key and return its payload"""
+    payload = PrecompressedPayload(app.json.dumps(analyze(position), separators=(",", ":")),
+                                   "application/json", cache_control="public, max-age=86400",
+                                   dynamic=True)
+    analysis_cache.put(key, payload)
+    return payload
+
+@app.route('/api/analyze')
+def analyze_position():
+    """Return legal moves, attacked squares, center control, forks and pins for a FEN"""
+    try:
+        position = Position.from_fen(request.args.get('fen', START_FEN))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    key = position.zobrist()
+    payload = analysis_cache.get(key)
+    status = "HIT"
+    if payload is None:
+        status = "MISS"
+        # Learners on the same exercise ask for the same positions at once; one analyses for all
+        payload = analysis_builds.do(key, lambda: build_analysis(key, position))
+    response = payload.respond()
+    response.headers["X-Analysis-Cache"] = status
+    return response
+
+@app.route('/api/openings/classify')
+def classify_opening_move():
+    """Classify a move as principled, dubious or off-book by the opening book"""
+    if opening_book is None:
+        return jsonify({"error": "No opening book has been built"}), 503
+    try:
+        position = Position.from_fen(request.args.get('fen', START_FEN))
+        move = position.parse_uci(request.args.get('move', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    classification, book_moves = opening_book.classify(position, move)
+    legal = {move & MOVE_BITS: move for move in position.legal_moves()}
+    opening = opening_book.opening(position.make_move(move).zobrist()) or opening_book.opening(position.zobrist())
+    response = jsonify({
+        "classification": classification,
+        "move": {"uci": move_to_uci(move), "san": position.san(move)},
+        "bookMoves": [{"uci": move_to_uci(legal[book_move]), "san": position.san(legal[book_move]),
+                       "weight": weight}
+                      for book_move, weight in book_moves if book_move in legal],
+        "opening": {"eco": opening[0], "name": opening[1]} if opening else None
+    })
+    # The answer only changes when the book is rebuilt
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
+
+@app.route('/api/analyze/stats')
+def analysis_stats():
+    """Return the analysis cache hit and miss counters"""
+    return jsonify(dict(analysis_cache.stats(), coalesced=analysis_builds.coalesced))
+
+@app.route('/metrics')
+def metrics():
+    """Export request metrics in the Prometheus text format"""
+    return app.response_class(request_metrics.render(),
+                              content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/metrics/profile', methods=['GET', 'POST', 'DELETE'])
+def route_profile():
+    """Start (POST), report (GET) or stop (DELETE) sampling profiles of one endpoint
+
+    POST takes {"endpoint": view function name as in /metrics, "sampleRate":
+    share of its requests to profile (default 0.1), "limit": most requests
+    each worker profiles (default 100)}. GET and DELETE return the profile
+    as text, sorted by ?sort= (default cumulative) with ?lines= rows.
+    """
+    error = admin_error()
+    if error:
+        return error
+
+    if request.method == 'POST':
+        data = request.json or {}
+        endpoint = data.get('endpoint')
+        sample_rate = data.get('sampleRate', 0.1)
+        limit = data.get('limit', 100)
+        if endpoint not in app.view_functions:
+            return jsonify({"error": f"Unknown endpoint '{endpoint}'"}), 400
+        if not isinstance(sample_rate, (int, float)) or not 0 < sample_rate <= 1:
+            return jsonify({"error": "sampleRate must be above 0 and at most 1"}), 400
+        if not isinstance(limit, int) or not 1 <= limit <= MAX_PROFILED_REQUESTS:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PROFILED_REQUESTS}"}), 400
+        return jsonify(request_metrics.profiler.start(endpoint, sample_rate, limit))
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls', 'pcalls'):
+        return jsonify({"error": "sort must be cumulative, tottime, ncalls or pcalls"}), 400
+    settings = request_metrics.profiler.settings
+    header = (f"Profiling {settings['endpoint']}: {request_metrics.profile_samples()} requests "
+              f"profiled\n\n" if settings else "Profiling is off\n\n")
+    if request.method == 'DELETE':
+        request_metrics.profiler.stop()
+    report = request_metrics.profiler.report(sort, request.args.get('lines', 40, type=int))
+    return app.response_class(header + report, mimetype="text/plain")
+
 @app.route('/progress', methods=['GET'])
 def get_progress():
-    """Get the user's current progress"""
-    return jsonify(USER_PROGRESS)
+    """Get the user's current progress, answering If-None-Match with 304"""
+    learner_id = current_learner_id()
+    progress = progress_store.get(learner_id)
+    if request.if_none_match.contains(progress_etag(learner_id, progress.version)):
+        response = app.response_class(status=304)
+        response.set_etag(progress_etag(learner_id, progress.version))
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return progress_response(progress, learner_id)
+
+@app.route('/progress/stream')
+def progress_stream():
+    """Stream the user's progress, then each change to it, as Server-Sent Events"""
+    if EVENTS_SOCKET:
+        return jsonify({"error": "Progress streams are served by sse_server.py"}), 503
+
+    learner_id = current_learner_id()
+    subscription = progress_events.subscribe(learner_id, queue.Queue())
+    # Subscribe before reading, so no edit falls between the snapshot and the stream
+    progress = progress_store.get(learner_id)
+    resume = request.headers.get("Last-Event-ID") == str(progress.version)
+
+    def events():
+        try:
+            if not resume:
+                yield snapshot_event(progress)
+            while not subscription.overflowed:
+                try:
+                    yield subscription.queue.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            progress_events.unsubscribe(learner_id, subscription)
+
+    return app.response_class(stream_with_context(events()), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route('/progress/complete-lesson', methods=['POST'])
 def complete_lesson():
     """Mark a lesson as completed"""
-    data = request.json
-    lesson_id = data.get('lesson_id')
-    
-    # Update both progress formats for backward compatibility
-    if lesson_id not in USER_PROGRESS["completed_lessons"]:
-        USER_PROGRESS["completed_lessons"].append(lesson_id)
-        
-    # Add to the new format if not already present
-    lesson_completion = next((completion for completion in USER_PROGRESS["completedLessons"] 
-                              if completion.get("lessonId") == lesson_id), None)
-    
-    if not lesson_completion:
-        USER_PROGRESS["completedLessons"].append({
-            "lessonId": lesson_id,
-            "completed": True,
-            "timestamp": data.get('timestamp', "")
-        })
-    else:
-        lesson_completion["completed"] = True
-    
-    USER_PROGRESS["current_streak"] += 1
-    
-    # Add achievement for the completed lesson
-    lesson = next((l for l in LESSONS if l["id"] == lesson_id), None)
-    if lesson and "achievement" in lesson:
-        # Check if achievement already exists
-        achievement_exists = any(a.get("id") == lesson["achievement"]["id"] for a in USER_PROGRESS["achievements"])
-        
-        if not achievement_exists:
-            USER_PROGRESS["achievements"].append({
-                "id": lesson["achievement"]["id"],
-                "title": lesson["achievement"]["title"],
-                "description": lesson["achievement"]["description"]
-            })
-    
-    # For lesson 2, mark all objectives as completed since the entire lesson is done
-    if lesson_id == 2:
-        for obj_index, objective in enumerate(lesson.get("objectives", [])):
-            obj_key = f"{lesson_id}_{obj_index}"
-            if obj_key not in USER_PROGRESS["completedObjectives"]:
-                USER_PROGRESS["completedObjectives"].append(obj_key)
-                
-                # Add achievement for each objective
-                if obj_key in OBJECTIVE_ACHIEVEMENTS:
-                    achievement = OBJECTIVE_ACHIEVEMENTS[obj_key]
-                    achievement_exists = any(a.get("id") == achievement["id"] for a in USER_PROGRESS["achievements"])
-                    
-                    if not achievement_exists:
-                        USER_PROGRESS["achievements"].append({
-                            "id": achievement["id"],
-                            "title": achievement["title"],
-                            "description": achievement["description"]
-                        })
-    
-    # Award achievement for first lesson
-    if len(USER_PROGRESS["completed_lessons"]) == 1:
-        first_lesson_achievement = next((a for a in USER_PROGRESS["achievements"] if a.get("id") == "first_lesson"), None)
-        if not first_lesson_achievement:
-            USER_PROGRESS["achievements"].append({
-                "id": "first_lesson",
-                "title": "First Step",
-                "description": "Completed your first chess lesson!"
-            })
-    
-    # Award achievement for completing all lessons
-    if len(USER_PROGRESS["completed_lessons"]) == len(LESSONS):
-        all_lessons_achievement = next((a for a in USER_PROGRESS["achievements"] if a.get("id") == "all_lessons"), None)
-        if not all_lessons_achievement:
-            USER_PROGRESS["achievements"].append({
-                "id": "all_lessons",
-                "title": "Chess Fundamentals Graduate",
-                "description": "Completed all basic chess lessons!"
-            })
-            
-    return jsonify(USER_PROGRESS)
+    data = request.json or {}
+    try:
+        with progress_store.edit(current_learner_id()) as progress:
+            apply_lesson_completion(progress, data.get('lesson_id'), data.get('timestamp', ""))
+    except CompletionError as error:
+        return jsonify({"error": str(error)}), error.status
+    return progress_response(progress)
 
 @app.route('/api/complete-exercise', methods=['POST'])
 def complete_exercise():
     """Mark an exercise as completed and update associated lesson progress"""
     data = request.json
-    exercise_id = data.get('exerciseId')
-    
-    if not exercise_id:
-        return jsonify({"error": "Exercise ID is required"}), 400
-    
-    # Find which lesson this exercise belongs to
-    lesson_id = EXERCISE_TO_LESSON.get(exercise_id)
-    if not lesson_id:
-        return jsonify({"error": f"Exercise '{exercise_id}' not found"}), 404
-    
-    # Track objective completion if this exercise maps to a specific objective
-    if exercise_id in EXERCISE_TO_OBJECTIVE:
-        objective_info = EXERCISE_TO_OBJECTIVE[exercise_id]
-        obj_key = f"{objective_info['lesson_id']}_{objective_info['objective_index']}"
-        
-        if obj_key not in USER_PROGRESS["completedObjectives"]:
-            USER_PROGRESS["completedObjectives"].append(obj_key)
-            
-            # Add achievement for this specific objective
-            if obj_key in OBJECTIVE_ACHIEVEMENTS:
-                achievement = OBJECTIVE_ACHIEVEMENTS[obj_key]
-                achievement_exists = any(a.get("id") == achievement["id"] for a in USER_PROGRESS["achievements"])
-                
-                if not achievement_exists:
-                    USER_PROGRESS["achievements"].append({
-                        "id": achievement["id"],
-                        "title": achievement["title"],
-                        "description": achievement["description"]
-                    })
-    
-    # Find the lesson in our progress
-    lesson_completion = next((completion for completion in USER_PROGRESS["completedLessons"] 
-                              if completion.get("lessonId") == lesson_id), None)
-    
-    # If lesson doesn't exist in our progress, create it
-    if not lesson_completion:
-        lesson_completion = {
-            "lessonId": lesson_id,
-            "completed": False,
-            "exercises": [],
-            "timestamp": ""
-        }
-        USER_PROGRESS["completedLessons"].append(lesson_completion)
-    
-    # If exercises array doesn't exist, create it
-    if "exercises" not in lesson_completion:
-        lesson_completion["exercises"] = []
-    
-    # Check if exercise is already completed
-    exercise_completion = next((ex for ex in lesson_completion["exercises"] 
-                               if ex.get("id") == exercise_id), None)
-    
-    if not exercise_completion:
-        lesson_completion["exercises"].append({
-            "id": exercise_id,
-            "completed": True,
-            "timestamp": ""
-        })
-    else:
-        exercise_completion["completed"] = True
-    
-    # Check if all exercises for this lesson are completed
-    lesson = next((l for l in LESSONS if l["id"] == lesson_id), None)
-    if lesson:
-        all_exercises = lesson.get("interactive_exercises", [])
-        completed_exercises = [ex.get("id") for ex in lesson_completion["exercises"] 
-                              if ex.get("completed")]
-        
-        all_completed = all(ex in completed_exercises for ex in all_exercises)
-        
-        # If all exercises are completed, mark lesson as completed
-        if all_completed:
-            lesson_completion["completed"] = True
-            
-            # Also update the simple array format
-            if lesson_id not in USER_PROGRESS["completed_lessons"]:
-                USER_PROGRESS["completed_lessons"].append(lesson_id)
-                USER_PROGRESS["current_streak"] += 1
-                
-                # Add achievement for the completed lesson
-                if "achievement" in lesson:
-                    # Check if achievement already exists
-                    achievement_exists = any(a.get("id") == lesson["achievement"]["id"] for a in USER_PROGRESS["achievements"])
-                    
-                    if not achievement_exists:
-                        USER_PROGRESS["achievements"].append({
-                            "id": lesson["achievement"]["id"],
-                            "title": lesson["achievement"]["title"],
-                            "description": lesson["achievement"]["description"]
-                        })
-                
-                # If lesson 2 is completed, mark all its objectives as completed
-                if lesson_id == 2:
-                    for obj_index, objective in enumerate(lesson.get("objectives", [])):
-                        obj_key = f"{lesson_id}_{obj_index}"
-                        if obj_key not in USER_PROGRESS["completedObjectives"]:
-                            USER_PROGRESS["completedObjectives"].append(obj_key)
-                            
-                            # Add achievement for each objective
-                            if obj_key in OBJECTIVE_ACHIEVEMENTS:
-                                achievement = OBJECTIVE_ACHIEVEMENTS[obj_key]
-                                achievement_exists = any(a.get("id") == achievement["id"] for a in USER_PROGRESS["achievements"])
-                                
-                                if not achievement_exists:
-                                    USER_PROGRESS["achievements"].append({
-                                        "id": achievement["id"],
-                                        "title": achievement["title"],
-                                        "description": achievement["description"]
-                                    })
-                
-                # Award achievement for first lesson
-                if len(USER_PROGRESS["completed_lessons"]) == 1:
-                    first_lesson_achievement = next((a for a in USER_PROGRESS["achievements"] if a.get("id") == "first_lesson"), None)
-                    if not first_lesson_achievement:
-                        USER_PROGRESS["achievements"].append({
-                            "id": "first_lesson",
-                            "title": "First Step",
-                            "description": "Completed your first chess lesson!"
-                        })
-                
-                # Award achievement for completing all lessons
-                if len(USER_PROGRESS["completed_lessons"]) == len(LESSONS):
-                    all_lessons_achievement = next((a for a in USER_PROGRESS["achievements"] if a.get("id") == "all_lessons"), None)
-                    if not all_lessons_achievement:
-                        USER_PROGRESS["achievements"].append({
-                            "id": "all_lessons",
-                            "title": "Chess Fundamentals Graduate",
-                            "description": "Completed all basic chess lessons!"
-                        })
-    
-    # Return the updated progress
-    return jsonify(USER_PROGRESS)
+    learner_id = current_learner_id()
+    try:
+        with progress_store.edit(learner_id) as progress:
+            apply_exercise_completion(progress, data.get('exerciseId'), data)
+    except CompletionError as error:
+        return jsonify({"error": str(error)}), error.status
+    review_store.record(learner_id, data['exerciseId'], review_quality(data))
+    return progress_response(progress, learner_id)
 
 @app.route('/board')
 def chess_board():
-    """Render the interactive chess board page"""
-    return render_template('board.html')
+    """Serve the interactive chess board page"""
+    return page_cache.payload("board").respond()
 
 @app.route('/exercises/<exercise_name>')
 def exercise(exercise_name):
-    """Render specific interactive exercises"""
-    return render_template(f'exercises/{exercise_name}.html')
+    """Serve the page of an interactive exercise"""
+    payload = page_cache.payload(f"exercises/{exercise_name}")
+    if payload:
+        return payload.respond()
+    return jsonify({"error": "Exercise not found"}), 404
 
 @app.route('/api/complete-objective', methods=['POST'])
 def complete_objective():
     """Mark a specific objective as completed"""
     data = request.json
-    lesson_id = data.get('lessonId')
-    objective_index = data.get('objectiveIndex')
-    
-    if not lesson_id or objective_index is None:
-        return jsonify({"error": "Lesson ID and objective index are required"}), 400
-    
-    # Create the objective key
-    obj_key = f"{lesson_id}_{objective_index}"
-    
-    # Add to completed objectives if not already there
-    if obj_key not in USER_PROGRESS["completedObjectives"]:
-        USER_PROGRESS["completedObjectives"].append(obj_key)
-        
-        # Add achievement for this specific objective
-        if obj_key in OBJECTIVE_ACHIEVEMENTS:
-            achievement = OBJECTIVE_ACHIEVEMENTS[obj_key]
-            achievement_exists = any(a.get("id") == achievement["id"] for a in USER_PROGRESS["achievements"])
-            
-            if not achievement_exists:
-                USER_PROGRESS["achievements"].append({
-                    "id": achievement["id"],
-                    "title": achievement["title"],
-                    "description": achievement["description"]
-                })
-    
-    # Check if all objectives for this lesson are completed
-    lesson = next((l for l in LESSONS if l["id"] == lesson_id), None)
-    if lesson:
-        all_objectives_completed = True
-        for i, _ in enumerate(lesson.get("objectives", [])):
-            if f"{lesson_id}_{i}" not in USER_PROGRESS["completedObjectives"]:
-                all_objectives_completed = False
-                break
-        
-        # If all objectives are completed, mark the lesson as completed
-        if all_objectives_completed and lesson_id not in USER_PROGRESS["completed_lessons"]:
-            USER_PROGRESS["completed_lessons"].append(lesson_id)
-            
-            # Update the completedLessons array too
-            lesson_completion = next((completion for completion in USER_PROGRESS["completedLessons"] 
-                                  if completion.get("lessonId") == lesson_id), None)
-            
-            if not lesson_completion:
-                USER_PROGRESS["completedLessons"].append({
-                    "lessonId": lesson_id,
-                    "completed": True,
-                    "timestamp": ""
-                })
-            else:
-                lesson_completion["completed"] = True
-            
-            # Add achievement for the completed lesson
-            if "achievement" in lesson:
-                # Check if achievement already exists
-                achievement_exists = any(a.get("id") == lesson["achievement"]["id"] for a in USER_PROGRESS["achievements"])
-                
-                if not achievement_exists:
-                    USER_PROGRESS["achievements"].append({
-                        "id": lesson["achievement"]["id"],
-                        "title": lesson["achievement"]["title"],
-                        "description": lesson["achievement"]["description"]
-                    })
-    
-    return jsonify(USER_PROGRESS)
+    try:
+        with progress_store.edit(current_learner_id()) as progress:
+            apply_objective_completion(progress, data.get('lessonId'), data.get('objectiveIndex'))
+    except CompletionError as error:
+        return jsonify({"error": str(error)}), error.status
+    return progress_response(progress)
+
+@app.route('/api/events', methods=['POST'])
+def ingest_events():
+    """Apply an ordered batch of completion events in a single progress update
+
+    Accepts {"events": [...]} where each event is one of
+    {"type": "exercise", "exerciseId"} (with the solving moves for
+    exercises that have goals, see verify_exercise_moves), {"type": "objective", "lessonId",
+    "objectiveIndex"} or {"type": "lesson", "lessonId", "timestamp"}. Invalid
+    events are reported in "results" without affecting the rest of the batch.
+    """
+    data = request.json or {}
+    events = data.get('events')
+    if not isinstance(events, list):
+        return jsonify({"error": "A list of events is required"}), 400
+    if len(events) > MAX_EVENT_BATCH:
+        return jsonify({"error": f"At most {MAX_EVENT_BATCH} events can be sent at once"}), 413
+
+    results = []
+    learner_id = current_learner_id()
+    with progress_store.edit(learner_id) as progress:
+        for event in events:
+            try:
+                apply_event(progress, event)
+                results.append({"ok": True})
+            except CompletionError as error:
+                results.append({"ok": False, "error": str(error)})
+    for event, result in zip(events, results):
+        if result["ok"] and event.get("type") == "exercise":
+            review_store.record(learner_id, event["exerciseId"], review_quality(event))
+
+    return progress_json_response({"progress": progress.to_dict(), "results": results})
+
+@app.route('/api/reviews/due')
+def reviews_due():
+    """Return the learner's exercises that are due for review and when the next review is"""
+    learner_id = current_learner_id()
+    due = []
+    for item in review_store.due(learner_id):
+        exercise_info = EXERCISES_BY_ID.get(item.exercise_id)
+        # Exercises dropped from the curriculum are not reviewed
+        if exercise_info:
+            due.append({
+                "exerciseId": item.exercise_id,
+                "lessonId": exercise_info["lesson_id"],
+                "due": iso_timestamp(item.due),
+                "interval": item.interval,
+                "repetitions": item.repetitions
+            })
+    next_due = review_store.next_due(learner_id)
+    response = jsonify({"due": due, "nextDue": iso_timestamp(next_due) if next_due is not None else None})
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route('/api/reviews/learners')
+def review_learners():
+    """Return the learners with reviews due, most overdue first (admin only)"""
+    error = admin_error()
+    if error:
+        return error
+    limit = request.args.get('limit', 100, type=int)
+    if not 1 <= limit <= MAX_DUE_LEARNERS:
+        return jsonify({"error": f"limit must be between 1 and {MAX_DUE_LEARNERS}"}), 400
+    return jsonify({"learners": [{"learnerId": learner_id, "due": iso_timestamp(due)}
+                                 for learner_id, due in review_store.due_learners(limit=limit)]})
+
+@app.route('/api/leaderboards/<board>')
+def get_leaderboard(board):
+    """Return the top learners on a leaderboard (streak, lessons or achievements) and the learner's place"""
+    if board not in BOARDS:
+        return jsonify({"error": f"Leaderboard '{board}' not found"}), 404
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= MAX_LEADERBOARD_ENTRIES:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LEADERBOARD_ENTRIES}"}), 400
+    learner_id = current_learner_id()
+    today = utc_day()
+    # The listing is the same for everyone; requests arriving together share one
+    top, listed = leaderboard_queries.do((board, limit, today),
+                                         lambda: leaderboards.top(board, today, limit))
+    own = leaderboards.place(board, learner_id)
+    response = jsonify({
+        "board": board,
+        "learners": listed,
+        "top": [{"rank": rank, "name": public_name(other_id), "score": score, "you": other_id == learner_id}
+                for other_id, score, rank in top],
+        "you": {"rank": own[0], "name": public_name(learner_id), "score": own[1]} if own else None
+    })
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route('/api/progress/export')
+def export_progress():
+    """Stream every learner's progress as NDJSON, or as a CSV gradebook with ?format=csv (admin only)"""
+    error = admin_error()
+    if error:
+        return error
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == "ndjson":
+        chunks, mimetype = export_ndjson(progress_store), "application/x-ndjson"
+    elif export_format == "csv":
+        chunks, mimetype = export_csv(progress_store, LESSONS), "text/csv"
+    else:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    return app.response_class(stream_with_context(chunks), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="progress.{export_format}"',
+        "Cache-Control": "no-store"
+    })
+
+@app.route('/api/progress/import', methods=['POST'])
+def import_progress():
+    """Replace learners' progress with the records of an NDJSON body, in batches (admin only)"""
+    error = admin_error()
+    if error:
+        return error
+    return jsonify(import_records(progress_store, request.stream, validate_progress,
+                                  on_batch=record_imported_progress))
+
+@app.route('/progress/add-achievement', methods=['POST'])
+def add_achievement():
+    """Award a named achievement once the learner's progress qualifies for it"""
+    data = request.json or {}
+    achievement_id = data.get('achievement_id')
+
+    if not achievement_id:
+        return jsonify({"error": "Achievement ID is required"}), 400
+    if not isinstance(achievement_id, str):
+        return jsonify({"error": "Achievement ID must be a string"}), 400
+
+    with progress_store.edit(current_learner_id()) as progress:
+        awarded = ACHIEVEMENT_ENGINE.award_by_id(progress, achievement_id)
+
+    if awarded is None:
+        return jsonify({"error": f"Achievement '{achievement_id}' not found"}), 404
+    if not awarded:
+        return jsonify({"error": f"Requirements for '{achievement_id}' are not met yet"}), 400
+    return progress_response(progress)
+
+def patch_error(patch):
+    """Return why a progress patch is malformed, or None if apply_patch can take it"""
+    if not isinstance(patch, dict):
+        return "The patch must be an object"
+    owned = SERVER_OWNED_PROGRESS_KEYS.intersection(patch)
+    if owned:
+        return f"{sorted(owned)[0]} is kept by the server and cannot be saved"
+    for key in ("completedLessons", "completed_lessons", "completedObjectives"):
+        if not isinstance(patch.get(key) or [], list):
+            return f"{key} must be a list"
+    for record in patch.get("completedLessons") or []:
+        if not isinstance(record, dict) or not is_scalar_id(record.get("lessonId")):
+            return "completedLessons records must be objects with a lessonId"
+        if record["lessonId"] not in LESSONS_BY_ID:
+            return f"Lesson '{record['lessonId']}' not found"
+        exercises = record.get("exercises")
+        if exercises is not None and not (isinstance(exercises, list) and
+                                          all(isinstance(exercise, dict) and is_scalar_id(exercise.get("id"))
+                                              for exercise in exercises)):
+            return "Lesson exercises must be a list of objects with an id"
+    for key in ("completed_lessons", "completedObjectives"):
+        if not all(is_scalar_id(item) for item in patch.get(key) or []):
+            return f"{key} must only contain string or integer ids"
+    for lesson_id in patch.get("completed_lessons") or []:
+        if lesson_id not in LESSONS_BY_ID:
+            return f"Lesson '{lesson_id}' not found"
+    return None
+
+def unverified_claim_error(progress, patch):
+    """Return why a patch claims completions that only solving an exercise with goals can make, or None
+
+    Exercises with goals, the objectives they complete and the lessons that
+    contain them are completed by the server once verify_exercise_moves has
+    replayed a solution; a patch may repeat such completions but not add them.
+    """
+    for record in patch.get("completedLessons") or []:
+        completion = progress.lesson(record["lessonId"])
+        for exercise in record.get("exercises") or []:
+            if (exercise["id"] in EXERCISE_GOALS and exercise.get("completed")
+                    and not (completion and completion.has_completed_exercise(exercise["id"]))):
+                return f"'{exercise['id']}' is completed by sending the moves that solve it"
+    claimed_lessons = [record["lessonId"] for record in patch.get("completedLessons") or []
+                       if record.get("completed")]
+    for lesson_id in claimed_lessons + list(patch.get("completed_lessons") or []):
+        if lesson_id not in progress.completed_lessons and not goals_solved(progress, lesson_id):
+            return f"Lesson '{lesson_id}' is completed by solving its exercises"
+    for obj_key in patch.get("completedObjectives") or []:
+        if obj_key in GOAL_OBJECTIVES and obj_key not in progress.completed_objectives:
+            return f"Objective '{obj_key}' is completed by solving '{GOAL_OBJECTIVES[obj_key]}'"
+    return None
 
 @app.route('/save-progress', methods=['POST'])
 def save_progress():
-    """Save user progress data from the client"""
+    """Apply a progress patch from the client
+
+    Expects {"baseVersion": n, "patch": {...}} (see LearnerProgress.apply_patch).
+    Additions to lessons, exercises and objectives always merge; a stale patch
+    that also overwrites other fields is rejected with 409 and the current
+    progress so the client can rebase. Bodies without "patch" are treated as
+    a patch made against the current version, for older clients. Streaks
+    are kept by the server: patches that set them are rejected with 400, as
+    are patches that claim completions only a verified exercise solution
+    makes (see unverified_claim_error).
+    """
     data = request.json
-    if data:
-        # Update our progress with the client data
-        USER_PROGRESS.update(data)
-        return jsonify({"success": True})
-    return jsonify({"error": "No data provided"}), 400
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"error": "The body must be an object"}), 400
+
+    if "patch" in data:
+        patch = data.get("patch") or {}
+        base_version = data.get("baseVersion")
+    else:
+        # Whole documents from older pages carry the streak they last saw; the server keeps its own
+        patch = {key: value for key, value in data.items() if key not in SERVER_OWNED_PROGRESS_KEYS}
+        base_version = None
+    error = patch_error(patch)
+    if error:
+        return jsonify({"error": error}), 400
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({"error": "baseVersion must be an integer"}), 400
+
+    learner_id = current_learner_id()
+    try:
+        with progress_store.edit(learner_id) as progress:
+            stale = base_version is not None and base_version != progress.version
+            if stale and any(key not in MERGEABLE_PATCH_KEYS for key in patch):
+                # Leaving the block by raising discards the edit
+                raise ProgressConflict(progress)
+            error = unverified_claim_error(progress, patch)
+            if error:
+                raise CompletionError(error)
+            progress.apply_patch(patch)
+    except CompletionError as error:
+        return jsonify({"error": str(error)}), error.status
+    except ProgressConflict as conflict:
+        return jsonify({
+            "error": f"Progress has changed since version {base_version}",
+            "version": conflict.progress.version,
+            "progress": conflict.progress.to_dict()
+        }), 409
+
+    response = jsonify({"success": True, "version": progress.version})
+    response.set_etag(progress_etag(learner_id, progress.version))
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001) 
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Per-page asset bundles and the template helper that links them.
+
+``PAGE_ASSETS`` lists the local stylesheets and scripts each page loads, in
+order. ``build_assets.py`` bundles every list into one minified,
+content-hashed file under ``static/dist`` (with ``.gz``/``.br`` siblings)
+and records them in ``static/dist/manifest.json``. Templates call
+``asset_tags(page, kind)``: with a manifest it links the hashed bundle
+served from ``/assets/`` with immutable caching, and without one it falls
+back to linking the source files individually, so development needs no
+build step.
+"""
+import json
+import os
+
+from flask import url_for
+from markupsafe import Markup, escape
+
+from precompressed import PrecompressedPayload
+
+_EXERCISE_CSS = ["css/style.css", "css/chessboard-1.0.0.min.css", "css/exercises.css"]
+_EXERCISE_VENDOR_JS = ["js/vendor/jquery-3.6.0.min.js", "js/vendor/chess.min.js",
+                       "js/vendor/chessboard-1.0.0.min.js", "js/vendor/animejs/lib/anime.min.js"]
+
+PAGE_ASSETS = {
+    "index": {
+        "css": ["css/style.css"],
+        "js": ["js/vendor/three.min.js", "js/vendor/chess.min.js", "js/vendor/chessboard-1.0.0.min.js",
+               "js/event-queue.js", "js/progress-stream.js", "js/main.js", "js/lessons.js",
+               "js/chessboard.js", "js/achievements.js", "js/animations.js"]
+    },
+    "board": {
+        "css": ["css/style.css", "css/chessboard-1.0.0.min.css"],
+        "js": ["js/vendor/jquery-3.6.0.min.js", "js/vendor/chess.min.js",
+               "js/vendor/chessboard-1.0.0.min.js", "js/animations.js", "js/position-analysis.js",
+               "js/board.js"]
+    },
+    "exercises/basic_tactics": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/animations.js"]
+    },
+    "exercises/board_setup": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/animations.js", "js/event-queue.js", "js/exercises/board-setup.js"]
+    },
+    "exercises/center_control": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/event-queue.js", "js/position-analysis.js",
+                                     "js/exercises/center-control.js"]
+    },
+    "exercises/fork_practice": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/event-queue.js", "js/exercises/fork-practice.js"]
+    },
+    "exercises/piece_development": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/event-queue.js", "js/opening-book.js",
+                                     "js/exercises/piece-development.js"]
+    },
+    "exercises/piece_movement": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/event-queue.js", "js/exercises/piece-movement.js"]
+    },
+    "exercises/pin_practice": {
+        "css": _EXERCISE_CSS,
+        "js": _EXERCISE_VENDOR_JS + ["js/event-queue.js", "js/exercises/pin-practice.js"]
+    }
+}
+
+CONTENT_TYPES = {
+    "js": "text/javascript; charset=utf-8",
+    "css": "text/css; charset=utf-8"
+}
+
+# Hashed bundle names never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def bundle_name(page, kind):
+    """Return the (unhashed) bundle file name for a page, e.g. exercises-board_setup.js"""
+    return f"{page.replace('/', '-')}.{kind}"
+
+
+class AssetManifest:
+    """The build manifest plus the bundles it lists, loaded lazily"""
+
+    def __init__(self, dist_dir):
+        self.dist_dir = dist_dir
+        self.manifest_path = os.path.join(dist_dir, "manifest.json")
+        self.bundles = {}
+        self._files = {}
+        self._payloads = {}
+        self._mtime = None
+        self.reload()
+
+    def reload(self):
+        """Re-read manifest.json (an absent manifest means unbundled mode)"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            mtime, manifest = None, {}
+        self.bundles = manifest.get("bundles", {})
+        self._files = {bundle["file"]: bundle for bundle in self.bundles.values()}
+        self._payloads = {}
+        self._mtime = mtime
+
+    def changed(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        return mtime != self._mtime
+
+    def tags(self, page, kind):
+        """Return the <link>/<script> tags for one page's stylesheets or scripts"""
+        bundle = self.bundles.get(bundle_name(page, kind))
+        if bundle is not None:
+            urls = [url_for("built_asset", filename=bundle["file"])]
+        else:
+            urls = [url_for("static", filename=path) for path in PAGE_ASSETS[page][kind]]
+
+        if kind == "css":
+            html = "\n".join(f'<link rel="stylesheet" href="{escape(url)}">' for url in urls)
+        else:
+            html = "\n".join(f'<script src="{escape(url)}"></script>' for url in urls)
+        return Markup(html)
+
+    def payload(self, filename):
+        """Return the PrecompressedPayload for a built file, or None if unknown"""
+        payload = self._payloads.get(filename)
+        if payload is not None or filename not in self._files:
+            return payload
+
+        path = os.path.join(self.dist_dir, filename)
+        with open(path, "rb") as f:
+            body = f.read()
+        gzip_body = _read_optional(path + ".gz")
+        br_body = _read_optional(path + ".br")
+        kind = filename.rsplit(".", 1)[-1]
+        payload = PrecompressedPayload(body, CONTENT_TYPES[kind], IMMUTABLE_CACHE_CONTROL,
+                                       gzip_body=gzip_body, br_body=br_body)
+        self._payloads[filename] = payload
+        return payload
+
+
+def _read_optional(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,171 @@
+"""Bundle, minify, fingerprint and precompress the static assets of every page.
+
+    python src/build_assets.py            # build static/dist and print a size report
+    python src/build_assets.py --clean    # remove static/dist (back to unbundled mode)
+
+Uses rjsmin/rcssmin for minification when they are installed and a
+conservative whitespace/comment stripper otherwise. Already minified
+``*.min.*`` files are copied as-is.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from assets import bundle_name, PAGE_ASSETS
+from precompressed import compress_brotli, compress_gzip
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+
+
+def minify_js(source):
+    """Minify JavaScript without changing what it does"""
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    # Fallback: drop indentation, blank lines and whole-line // comments only,
+    # which is safe without a real tokenizer. Lines inside multi-line template
+    # literals are kept verbatim since their whitespace is part of the string.
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_template:
+            lines.append(line)
+        elif not stripped or stripped.startswith("//"):
+            continue
+        else:
+            lines.append(stripped)
+        if (line.count("`") - line.count("\\`")) % 2:
+            in_template = not in_template
+    return "\n".join(lines)
+
+
+def minify_css(source):
+    """Minify CSS (comments and redundant whitespace)"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", source).strip()
+
+
+def read_source(path, kind):
+    with open(os.path.join(STATIC_DIR, path), encoding="utf-8") as f:
+        source = f.read()
+    if ".min." in os.path.basename(path):
+        return source.strip()
+    return minify_js(source) if kind == "js" else minify_css(source)
+
+
+def write_bundle(filename, body):
+    """Write a bundle and its .gz/.br siblings into DIST_DIR"""
+    path = os.path.join(DIST_DIR, filename)
+    with open(path, "wb") as f:
+        f.write(body)
+    with open(path + ".gz", "wb") as f:
+        f.write(compress_gzip(body))
+    br_body = compress_brotli(body)
+    if br_body is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(br_body)
+
+
+def build():
+    """Build every page bundle and return the manifest"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    bundles = {}
+    files_by_digest = {}
+    for page, kinds in PAGE_ASSETS.items():
+        for kind, paths in kinds.items():
+            # A leading ';' keeps a file without a trailing semicolon from merging into the next
+            separator = "\n;\n" if kind == "js" else "\n"
+            body = separator.join(read_source(path, kind) for path in paths).encode("utf-8")
+            digest = hashlib.blake2b(body, digest_size=5).hexdigest()
+
+            # Pages with identical bundles share one file (and one browser cache entry)
+            filename = files_by_digest.get(digest)
+            if filename is None:
+                name = bundle_name(page, kind)
+                filename = f"{name.rsplit('.', 1)[0]}.{digest}.{kind}"
+                write_bundle(filename, body)
+                files_by_digest[digest] = filename
+
+            bundles[bundle_name(page, kind)] = {"file": filename, "sources": paths}
+
+    # Remove bundles left over from earlier builds
+    current = set(files_by_digest.values())
+    for entry in os.scandir(DIST_DIR):
+        if entry.name != "manifest.json" and entry.name.split(".gz")[0].split(".br")[0] not in current:
+            os.remove(entry.path)
+
+    manifest = {"bundles": bundles}
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def size_report(manifest):
+    """Return report rows of requests and bytes per page before and after bundling"""
+    rows = []
+    for page, kinds in PAGE_ASSETS.items():
+        before_requests = before_bytes = 0
+        after_requests = after_bytes = after_gzip = after_br = 0
+        for kind, paths in kinds.items():
+            before_requests += len(paths)
+            before_bytes += sum(os.path.getsize(os.path.join(STATIC_DIR, p)) for p in paths)
+
+            path = os.path.join(DIST_DIR, manifest["bundles"][bundle_name(page, kind)]["file"])
+            after_requests += 1
+            after_bytes += os.path.getsize(path)
+            after_gzip += os.path.getsize(path + ".gz")
+            after_br += os.path.getsize(path + ".br") if os.path.exists(path + ".br") else 0
+        rows.append((page, before_requests, before_bytes, after_requests, after_bytes,
+                     after_gzip, after_br or None))
+    return rows
+
+
+def print_report(rows):
+    print(f"{'page':<28} {'before':>18}   {'after':>18} {'gzip':>10} {'br':>10}")
+    for page, b_req, b_bytes, a_req, a_bytes, a_gzip, a_br in rows:
+        br = f"{a_br:,}" if a_br else "-"
+        print(f"{page:<28} {b_req:>3} req {b_bytes:>10,} B   {a_req:>3} req {a_bytes:>10,} B "
+              f"{a_gzip:>10,} {br:>10}")
+    print("\nBefore: local files as served by Flask's static handler (uncompressed, no long-lived caching).")
+    print("After: one hashed bundle per page and kind, served from /assets with immutable caching.")
+    print("CDN scripts and fonts are not included in either column.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed asset bundles")
+    parser.add_argument("--clean", action="store_true", help="remove static/dist and exit")
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(DIST_DIR, ignore_errors=True)
+        print(f"Removed {DIST_DIR}")
+        return 0
+
+    if rjsmin is None or rcssmin is None:
+        print("Note: rjsmin/rcssmin not installed, using the basic minifier", file=sys.stderr)
+    manifest = build()
+    print_report(size_report(manifest))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
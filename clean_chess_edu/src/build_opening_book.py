@@ -0,0 +1,106 @@
+"""Build the opening book used to classify learners' opening moves.
+
+    python src/build_opening_book.py content/openings/eco.tsv
+    python src/build_opening_book.py content/openings/eco.tsv lichess_db.pgn.bz2 --min-games 50
+
+ECO files are tab-separated ``eco``, ``name`` and ``pgn`` columns (the
+format of the lichess.org chess-openings tables): every move of every line
+goes into the book, and the position a line ends in gets its name. PGN
+files (plain, .gz or .bz2) add the moves of the first --max-ply plies of
+their games that were played in at least --min-games games. The book is
+written to content/openings/book.bin, which the app memory-maps at startup.
+"""
+import argparse
+import collections
+import csv
+import os
+import sys
+import time
+
+from chess_core import IllegalMoveError, Position, START_FEN
+from mine_tactics import read_games, san_tokens
+from opening_book import write_book
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, "content", "openings", "book.bin")
+
+
+def read_eco(path, positions, names):
+    """Add the lines of an ECO file; return (lines read, lines skipped)"""
+    lines = skipped = 0
+    start = Position.from_fen(START_FEN)
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            lines += 1
+            position = start
+            try:
+                for san in san_tokens(row["pgn"]):
+                    move = position.parse_san(san)
+                    positions[position.zobrist()][move] += 1
+                    position = position.make_move(move)
+            except (IllegalMoveError, ValueError) as error:
+                print(f"{path}: skipped {row['eco']} {row['name']}: {error}", file=sys.stderr)
+                skipped += 1
+                continue
+            # The first line to reach a position names it
+            names.setdefault(position.zobrist(), (row["eco"], row["name"]))
+    return lines, skipped
+
+
+def count_game_moves(paths, max_ply):
+    """Return {position hash: Counter(move: games)} over the games' opening plies"""
+    counts = collections.defaultdict(collections.Counter)
+    stats = {"bytes": 0}
+    games = skipped = 0
+    for fen, movetext in read_games(paths, stats):
+        games += 1
+        # Only the standard starting position leads into the book
+        if fen != START_FEN:
+            continue
+        position = Position.from_fen(fen)
+        try:
+            for san in san_tokens(movetext)[:max_ply]:
+                move = position.parse_san(san)
+                counts[position.zobrist()][move] += 1
+                position = position.make_move(move)
+        except (IllegalMoveError, ValueError):
+            skipped += 1
+    return counts, games, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the opening book from ECO and PGN files")
+    parser.add_argument("inputs", nargs="+", help="ECO files (.tsv) and PGN files (.pgn, .pgn.gz or .pgn.bz2)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="book file to write")
+    parser.add_argument("--max-ply", type=int, default=16, help="plies of each game that can enter the book")
+    parser.add_argument("--min-games", type=int, default=5, help="games a move needs to enter the book")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    positions = collections.defaultdict(collections.Counter)
+    names = {}
+    for path in args.inputs:
+        if path.endswith(".tsv"):
+            lines, skipped = read_eco(path, positions, names)
+            print(f"{path}: {lines - skipped:,} lines", file=sys.stderr)
+
+    pgn_paths = [path for path in args.inputs if not path.endswith(".tsv")]
+    if pgn_paths:
+        counts, games, skipped = count_game_moves(pgn_paths, args.max_ply)
+        added = 0
+        for key, moves in counts.items():
+            for move, played in moves.items():
+                if played >= args.min_games:
+                    added += move not in positions[key]
+                    positions[key][move] += played
+        print(f"{games:,} games ({skipped:,} with unreadable moves): {added:,} moves played in at least "
+              f"{args.min_games} games added", file=sys.stderr)
+
+    count, moves = write_book(args.output, positions, names)
+    print(f"Wrote {count:,} positions, {moves:,} book moves and {len(set(names.values())):,} opening names "
+          f"to {args.output} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Lesson catalog loaded from content files.
+
+Each lesson lives in its own JSON file under ``content/lessons`` (files are
+read in name order, lessons are sorted by id). The catalog serializes the
+``/lessons`` list and every ``/lesson/<id>`` document once per load and keeps
+them as precompressed payloads, so those routes do no JSON work per request.
+"""
+import json
+import os
+
+from precompressed import PrecompressedPayload
+
+
+class LessonCatalog:
+    """Lessons from a content directory plus their ready-to-serve payloads"""
+
+    def __init__(self, directory, dumps=json.dumps):
+        self.directory = directory
+        self.dumps = dumps
+        self.lessons = []
+        self.list_payload = None
+        self.lesson_payloads = {}
+        self._signature = None
+
+    def _files(self):
+        return sorted(entry.path for entry in os.scandir(self.directory)
+                      if entry.is_file() and entry.name.endswith(".json"))
+
+    def _current_signature(self):
+        # Names, sizes and mtimes are enough to notice edited, added or removed files
+        return tuple((path, stat.st_size, stat.st_mtime_ns)
+                     for path, stat in ((path, os.stat(path)) for path in self._files()))
+
+    def load(self):
+        """(Re)read every lesson file and rebuild the payloads; return the lessons"""
+        signature = self._current_signature()
+        lessons = []
+        for path, _, _ in signature:
+            with open(path, encoding="utf-8") as f:
+                lesson = json.load(f)
+            if "id" not in lesson:
+                raise ValueError(f"Lesson file {path} has no 'id'")
+            lessons.append(lesson)
+        lessons.sort(key=lambda lesson: lesson["id"])
+
+        ids = [lesson["id"] for lesson in lessons]
+        if len(ids) != len(set(ids)):
+            raise ValueError(f"Duplicate lesson ids in {self.directory}")
+
+        self.list_payload = PrecompressedPayload(self.dumps(lessons), "application/json")
+        self.lesson_payloads = {
+            lesson["id"]: PrecompressedPayload(self.dumps(lesson), "application/json")
+            for lesson in lessons
+        }
+        self.lessons = lessons
+        self._signature = signature
+        return lessons
+
+    def changed(self):
+        """Return True if the content files differ from what was last loaded"""
+        return self._current_signature() != self._signature
@@ -0,0 +1,616 @@
+"""Bitboard chess move generation for validating moves on the server.
+
+Squares are numbered 0 (a1) to 63 (h8) and every piece set is a 64-bit
+integer. Knight, king and pawn attacks come from precomputed tables. Rook and
+bishop attacks use magic-bitboard style lookups: for each square the
+occupancy is masked to the squares that can block the slider, and that
+masked occupancy indexes a per-square table (a dict stands in for the magic
+multiply-and-shift hash, which has no speed advantage in Python).
+
+Moves are plain ints (see ``encode_move``), positions are immutable
+``Position`` objects, and ``play`` replays UCI moves from a FEN, raising
+``IllegalMoveError`` for the first move that is not legal.
+``Position.zobrist()`` hashes a position (ignoring the move clocks) for use
+as a cache key.
+"""
+import random
+import re
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+PIECE_SYMBOLS = "pnbrqk"
+FILE_NAMES = "abcdefgh"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Castling right bits, in FEN order
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_SYMBOLS = ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"),
+                    (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q"))
+
+# Move flags
+NORMAL, DOUBLE_PUSH, EN_PASSANT, CASTLE = range(4)
+
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+
+
+def square_name(square):
+    return FILE_NAMES[square & 7] + str((square >> 3) + 1)
+
+
+def parse_square(name):
+    """Return the index of a square name like 'e4'"""
+    if len(name) != 2 or name[0] not in FILE_NAMES or name[1] not in "12345678":
+        raise ValueError(f"Invalid square '{name}'")
+    return FILE_NAMES.index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for square in range(64):
+        file, rank = square & 7, square >> 3
+        attacks = 0
+        for df, dr in offsets:
+            if 0 <= file + df < 8 and 0 <= rank + dr < 8:
+                attacks |= 1 << (square + df + 8 * dr)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _leaper_attacks(((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)))
+# PAWN_ATTACKS[color][square]: squares a pawn of that color on that square attacks
+PAWN_ATTACKS = (_leaper_attacks(((-1, 1), (1, 1))), _leaper_attacks(((-1, -1), (1, -1))))
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _slide(square, occupied, directions, edges=True):
+    """Walk rays from square until a blocker (inclusive); without edges, stop short of the board edge"""
+    attacks = 0
+    for df, dr in directions:
+        file, rank = (square & 7) + df, (square >> 3) + dr
+        while 0 <= file < 8 and 0 <= rank < 8:
+            if not edges and not (0 <= file + df < 8 and 0 <= rank + dr < 8):
+                break
+            bit = 1 << (file + 8 * rank)
+            attacks |= bit
+            if occupied & bit:
+                break
+            file, rank = file + df, rank + dr
+    return attacks
+
+
+def _slider_tables(directions):
+    masks, tables = [], []
+    for square in range(64):
+        # Edge squares never block anything further along the ray, so leave them out
+        mask = _slide(square, 0, directions, edges=False)
+        table = {}
+        subset = 0
+        while True:
+            table[subset] = _slide(square, subset, directions)
+            # Carry-rippler trick: enumerate every subset of mask
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+ROOK_MASKS, ROOK_TABLES = _slider_tables(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_TABLES = _slider_tables(BISHOP_DIRECTIONS)
+
+
+def rook_attacks(square, occupied):
+    return ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+
+def bishop_attacks(square, occupied):
+    return BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+
+
+def attacks_from(piece_type, square, color, occupied):
+    """Return the squares a piece of the given type and color on square attacks"""
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[color][square]
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece_type == BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(square, occupied)
+    if piece_type == QUEEN:
+        return bishop_attacks(square, occupied) | rook_attacks(square, occupied)
+    return KING_ATTACKS[square]
+
+
+# Castling rights kept when a move touches a square (king and rook home squares)
+CASTLING_KEEP = [0xF] * 64
+CASTLING_KEEP[0] &= ~WHITE_QUEENSIDE
+CASTLING_KEEP[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_KEEP[7] &= ~WHITE_KINGSIDE
+CASTLING_KEEP[56] &= ~BLACK_QUEENSIDE
+CASTLING_KEEP[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_KEEP[63] &= ~BLACK_KINGSIDE
+
+# King destination -> (rook from, rook to)
+CASTLING_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+# Zobrist keys from a fixed seed, so hashes agree across processes and restarts
+_zobrist_random = random.Random(0x2B1D5EED)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+# Piece letter, disambiguating file/rank, capture, destination, promotion
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+def encode_move(from_square, to_square, promotion=0, flag=NORMAL):
+    return from_square | to_square << 6 | promotion << 12 | flag << 15
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return (move >> 12) & 7
+
+
+def move_flag(move):
+    return move >> 15
+
+
+def move_to_uci(move):
+    promotion = move_promotion(move)
+    return (square_name(move & 63) + square_name((move >> 6) & 63)
+            + (PIECE_SYMBOLS[promotion] if promotion else ""))
+
+
+class IllegalMoveError(ValueError):
+    """A move that is malformed or not legal in the position"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def squares(bitboard):
+    """Yield the square index of every set bit"""
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+
+class Position:
+    """An immutable chess position"""
+    __slots__ = ("pieces", "occupied", "side", "castling", "ep_square", "halfmove", "fullmove")
+
+    # pieces[color * 6 + piece_type] is that piece set; occupied[color] is the union per color
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Parse a FEN string (the clock fields may be omitted)"""
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError(f"Invalid FEN '{fen}'")
+        placement, side, castling, ep = fields[:4]
+
+        pieces = [0] * 12
+        ranks = placement.split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN '{fen}'")
+        for rank_index, rank in enumerate(ranks):
+            file = 0
+            for char in rank:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in PIECE_SYMBOLS and file < 8:
+                    color = WHITE if char.isupper() else BLACK
+                    pieces[color * 6 + PIECE_SYMBOLS.index(char.lower())] |= 1 << ((7 - rank_index) * 8 + file)
+                    file += 1
+                else:
+                    raise ValueError(f"Invalid FEN '{fen}'")
+            if file != 8:
+                raise ValueError(f"Invalid FEN '{fen}'")
+
+        if side not in ("w", "b"):
+            raise ValueError(f"Invalid FEN '{fen}'")
+        rights = 0
+        if castling != "-":
+            for bit, symbol in CASTLING_SYMBOLS:
+                if symbol in castling:
+                    rights |= bit
+            if len(castling) > 4 or any(char not in "KQkq" for char in castling):
+                raise ValueError(f"Invalid FEN '{fen}'")
+        try:
+            halfmove, fullmove = (int(fields[4]), int(fields[5])) if len(fields) == 6 else (0, 1)
+        except ValueError:
+            raise ValueError(f"Invalid FEN '{fen}'") from None
+
+        return cls._make(pieces,
+                         [pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5],
+                          pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]],
+                         WHITE if side == "w" else BLACK, rights,
+                         None if ep == "-" else parse_square(ep), halfmove, fullmove)
+
+    @classmethod
+    def _make(cls, pieces, occupied, side, castling, ep_square, halfmove, fullmove):
+        position = cls.__new__(cls)
+        position.pieces = pieces
+        position.occupied = occupied
+        position.side = side
+        position.castling = castling
+        position.ep_square = ep_square
+        position.halfmove = halfmove
+        position.fullmove = fullmove
+        return position
+
+    def piece_at(self, square):
+        """Return (color, piece_type) on a square, or None"""
+        bit = 1 << square
+        for index, bitboard in enumerate(self.pieces):
+            if bitboard & bit:
+                return divmod(index, 6)
+        return None
+
+    def fen(self):
+        """Return the FEN string of the position"""
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = "", 0
+            for file in range(8):
+                piece = self.piece_at(rank * 8 + file)
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row, empty = row + str(empty), 0
+                color, piece_type = piece
+                symbol = PIECE_SYMBOLS[piece_type]
+                row += symbol.upper() if color == WHITE else symbol
+            rows.append(row + (str(empty) if empty else ""))
+        castling = "".join(symbol for bit, symbol in CASTLING_SYMBOLS if self.castling & bit) or "-"
+        ep = square_name(self.ep_square) if self.ep_square is not None else "-"
+        return f"{'/'.join(rows)} {'wb'[self.side]} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    def attackers(self, square, by):
+        """Return the set of pieces of color `by` that attack square"""
+        pieces = self.pieces
+        base = by * 6
+        occupied = self.occupied[0] | self.occupied[1]
+        queens = pieces[base + 4]
+        return (PAWN_ATTACKS[by ^ 1][square] & pieces[base]
+                | KNIGHT_ATTACKS[square] & pieces[base + 1]
+                | KING_ATTACKS[square] & pieces[base + 5]
+                | bishop_attacks(square, occupied) & (pieces[base + 2] | queens)
+                | rook_attacks(square, occupied) & (pieces[base + 3] | queens))
+
+    def zobrist(self):
+        """Return the 64-bit Zobrist hash of the position (the move clocks are not included)"""
+        key = 0
+        for index, bitboard in enumerate(self.pieces):
+            keys = ZOBRIST_PIECES[index]
+            for square in squares(bitboard):
+                key ^= keys[square]
+        if self.side == BLACK:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castling]
+        # Only an en passant square that can actually be used makes the position different
+        if self.ep_square is not None \
+                and PAWN_ATTACKS[self.side ^ 1][self.ep_square] & self.pieces[self.side * 6 + PAWN]:
+            key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        return key
+
+    def is_attacked(self, square, by):
+        """Return True if any piece of color `by` attacks square"""
+        pieces = self.pieces
+        base = by * 6
+        if PAWN_ATTACKS[by ^ 1][square] & pieces[base] or KNIGHT_ATTACKS[square] & pieces[base + 1] \
+                or KING_ATTACKS[square] & pieces[base + 5]:
+            return True
+        occupied = self.occupied[0] | self.occupied[1]
+        queens = pieces[base + 4]
+        return bool(bishop_attacks(square, occupied) & (pieces[base + 2] | queens)
+                    or rook_attacks(square, occupied) & (pieces[base + 3] | queens))
+
+    def in_check(self, color=None):
+        """Return True if color's king (default: the side to move) is attacked"""
+        color = self.side if color is None else color
+        king = self.pieces[color * 6 + KING]
+        # Teaching positions may have no king at all, which is never in check
+        return bool(king) and self.is_attacked(king.bit_length() - 1, color ^ 1)
+
+    def pseudo_legal_moves(self):
+        """Yield moves that are legal except possibly for leaving the king in check"""
+        us, them = self.side, self.side ^ 1
+        pieces = self.pieces
+        base = us * 6
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        empty = ~occupied & 0xFFFFFFFFFFFFFFFF
+
+        # Pawns: pushes, double pushes, captures, promotions and en passant
+        pawns = pieces[base]
+        if us == WHITE:
+            forward, last_rank = 8, RANK_8
+            single = (pawns << 8) & empty
+            double = ((single & 0xFF0000) << 8) & empty
+        else:
+            forward, last_rank = -8, RANK_1
+            single = (pawns >> 8) & empty
+            double = ((single & 0xFF0000000000) >> 8) & empty
+        for to in squares(single):
+            if (1 << to) & last_rank:
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    yield encode_move(to - forward, to, promotion)
+            else:
+                yield encode_move(to - forward, to)
+        for to in squares(double):
+            yield encode_move(to - 2 * forward, to, 0, DOUBLE_PUSH)
+        pawn_attacks = PAWN_ATTACKS[us]
+        for frm in squares(pawns):
+            targets = pawn_attacks[frm] & enemy
+            for to in squares(targets):
+                if (1 << to) & last_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        yield encode_move(frm, to, promotion)
+                else:
+                    yield encode_move(frm, to)
+            if self.ep_square is not None and pawn_attacks[frm] & (1 << self.ep_square):
+                yield encode_move(frm, self.ep_square, 0, EN_PASSANT)
+
+        not_own = ~own
+        for frm in squares(pieces[base + KNIGHT]):
+            for to in squares(KNIGHT_ATTACKS[frm] & not_own):
+                yield encode_move(frm, to)
+        queens = pieces[base + QUEEN]
+        for frm in squares(pieces[base + BISHOP] | queens):
+            for to in squares(bishop_attacks(frm, occupied) & not_own):
+                yield encode_move(frm, to)
+        for frm in squares(pieces[base + ROOK] | queens):
+            for to in squares(rook_attacks(frm, occupied) & not_own):
+                yield encode_move(frm, to)
+        for frm in squares(pieces[base + KING]):
+            for to in squares(KING_ATTACKS[frm] & not_own):
+                yield encode_move(frm, to)
+
+        # Castling: rights, empty squares between, and no attacked square on the king's path
+        if self.castling:
+            if us == WHITE:
+                sides = ((WHITE_KINGSIDE, 4, 6, 0x60, (5, 6)), (WHITE_QUEENSIDE, 4, 2, 0x0E, (3, 2)))
+            else:
+                sides = ((BLACK_KINGSIDE, 60, 62, 0x60 << 56, (61, 62)),
+                         (BLACK_QUEENSIDE, 60, 58, 0x0E << 56, (59, 58)))
+            for right, king_from, king_to, between, path in sides:
+                if self.castling & right and not occupied & between \
+                        and pieces[base + KING] & (1 << king_from) \
+                        and pieces[base + ROOK] & (1 << CASTLING_ROOKS[king_to][0]) \
+                        and not self.is_attacked(king_from, them) \
+                        and not any(self.is_attacked(square, them) for square in path):
+                    yield encode_move(king_from, king_to, 0, CASTLE)
+
+    def make_move(self, move):
+        """Return the position after move (which must be pseudo-legal)"""
+        frm, to = move & 63, (move >> 6) & 63
+        promotion, flag = (move >> 12) & 7, move >> 15
+        us, them = self.side, self.side ^ 1
+        pieces = self.pieces[:]
+        occupied = self.occupied[:]
+        base = us * 6
+        from_bit, to_bit = 1 << frm, 1 << to
+        halfmove = self.halfmove + 1
+
+        piece_type = 0
+        while not pieces[base + piece_type] & from_bit:
+            piece_type += 1
+        pieces[base + piece_type] ^= from_bit | to_bit
+        occupied[us] ^= from_bit | to_bit
+        if piece_type == PAWN:
+            halfmove = 0
+
+        if occupied[them] & to_bit:
+            index = them * 6
+            while not pieces[index] & to_bit:
+                index += 1
+            pieces[index] ^= to_bit
+            occupied[them] ^= to_bit
+            halfmove = 0
+        elif flag == EN_PASSANT:
+            captured = 1 << (to - 8 if us == WHITE else to + 8)
+            pieces[them * 6] ^= captured
+            occupied[them] ^= captured
+        elif flag == CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to]
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            pieces[base + ROOK] ^= rook_bits
+            occupied[us] ^= rook_bits
+
+        if promotion:
+            pieces[base] ^= to_bit
+            pieces[base + promotion] ^= to_bit
+
+        return Position._make(pieces, occupied, them,
+                              self.castling & CASTLING_KEEP[frm] & CASTLING_KEEP[to],
+                              (frm + to) >> 1 if flag == DOUBLE_PUSH else None,
+                              halfmove, self.fullmove + us)
+
+    def legal_moves(self):
+        """Return the list of legal moves"""
+        us = self.side
+        king_index = us * 6 + KING
+        them = us ^ 1
+        moves = []
+        for move in self.pseudo_legal_moves():
+            after = self.make_move(move)
+            king = after.pieces[king_index]
+            if not king or not after.is_attacked(king.bit_length() - 1, them):
+                moves.append(move)
+        return moves
+
+    def has_legal_moves(self):
+        """Return True if the side to move has any legal move"""
+        king_index = self.side * 6 + KING
+        them = self.side ^ 1
+        for move in self.pseudo_legal_moves():
+            after = self.make_move(move)
+            king = after.pieces[king_index]
+            if not king or not after.is_attacked(king.bit_length() - 1, them):
+                return True
+        return False
+
+    def san(self, move):
+        """Return the SAN string of a legal move, e.g. 'Nbd7', 'exd5', 'e8=Q+' or 'O-O'"""
+        frm, to = move & 63, (move >> 6) & 63
+        promotion, flag = (move >> 12) & 7, move >> 15
+        us = self.side
+        if flag == CASTLE:
+            text = "O-O" if to & 7 == 6 else "O-O-O"
+        else:
+            piece_type = 0
+            while not self.pieces[us * 6 + piece_type] & (1 << frm):
+                piece_type += 1
+            capture = "x" if self.occupied[us ^ 1] & (1 << to) or flag == EN_PASSANT else ""
+            if piece_type == PAWN:
+                text = (FILE_NAMES[frm & 7] + capture if capture else "") + square_name(to)
+                if promotion:
+                    text += "=" + "PNBRQK"[promotion]
+            else:
+                # Other pieces of the same type that could also legally move there
+                occupied = self.occupied[0] | self.occupied[1]
+                rivals = [square for square in squares(attacks_from(piece_type, to, us, occupied)
+                                                       & self.pieces[us * 6 + piece_type] & ~(1 << frm))
+                          if not self.make_move(encode_move(square, to)).in_check(us)]
+                if not rivals:
+                    disambiguation = ""
+                elif all(square & 7 != frm & 7 for square in rivals):
+                    disambiguation = FILE_NAMES[frm & 7]
+                elif all(square >> 3 != frm >> 3 for square in rivals):
+                    disambiguation = str((frm >> 3) + 1)
+                else:
+                    disambiguation = square_name(frm)
+                text = "PNBRQK"[piece_type] + disambiguation + capture + square_name(to)
+
+        after = self.make_move(move)
+        if after.in_check():
+            text += "+" if after.has_legal_moves() else "#"
+        return text
+
+    def parse_uci(self, uci):
+        """Return the legal move for a UCI string like 'e2e4' or 'e7e8q'"""
+        if not isinstance(uci, str) or len(uci) not in (4, 5):
+            raise IllegalMoveError(f"Invalid move '{uci}'")
+        try:
+            frm, to = parse_square(uci[:2]), parse_square(uci[2:4])
+        except ValueError:
+            raise IllegalMoveError(f"Invalid move '{uci}'") from None
+        promotion = PIECE_SYMBOLS.find(uci[4]) if len(uci) == 5 else 0
+        if promotion not in (0, KNIGHT, BISHOP, ROOK, QUEEN):
+            raise IllegalMoveError(f"Invalid move '{uci}'")
+        # Only the matching move needs the (comparatively expensive) king safety check
+        for move in self.pseudo_legal_moves():
+            if move & 63 == frm and (move >> 6) & 63 == to and (move >> 12) & 7 == promotion:
+                if not self.make_move(move).in_check(self.side):
+                    return move
+                break
+        raise IllegalMoveError(f"Illegal move '{uci}' in {self.fen()}")
+
+    def parse_san(self, san):
+        """Return the legal move for a SAN string like 'Nbd7', 'exd5', 'e8=Q+' or 'O-O'"""
+        text = san.rstrip("+#!?")
+        us = self.side
+        base = us * 6
+        if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            king_to = (6 if len(text) == 3 else 2) + (56 if us == BLACK else 0)
+            for move in self.pseudo_legal_moves():
+                if move >> 15 == CASTLE and (move >> 6) & 63 == king_to:
+                    return move
+            raise IllegalMoveError(f"Illegal move '{san}' in {self.fen()}")
+
+        match = SAN_PATTERN.match(text)
+        if not match:
+            raise IllegalMoveError(f"Invalid move '{san}'")
+        letter, from_file, from_rank, capture, target, promotion_letter = match.groups()
+        to = parse_square(target)
+        promotion = PIECE_SYMBOLS.index(promotion_letter.lower()) if promotion_letter else 0
+        occupied = self.occupied[0] | self.occupied[1]
+
+        if letter is None:
+            # Pawn moves: the origin follows from the destination (and file, for captures)
+            forward = 8 if us == WHITE else -8
+            flag = NORMAL
+            if from_file is not None:
+                frm = FILE_NAMES.index(from_file) + (to & ~7) - forward
+                if to == self.ep_square:
+                    flag = EN_PASSANT
+                elif not self.occupied[us ^ 1] & (1 << to):
+                    frm = -1
+            elif occupied & (1 << to):
+                frm = -1
+            else:
+                frm = to - forward
+                if 0 <= frm < 64 and not self.pieces[base] & (1 << frm) and not occupied & (1 << frm) \
+                        and (to >> 3) == (3 if us == WHITE else 4):
+                    frm, flag = to - 2 * forward, DOUBLE_PUSH
+            is_last_rank = (to >> 3) in (0, 7)
+            if 0 <= frm < 64 and self.pieces[base] & (1 << frm) and is_last_rank == bool(promotion) \
+                    and abs((frm & 7) - (to & 7)) <= 1:
+                move = encode_move(frm, to, promotion, flag)
+                if not self.make_move(move).in_check(us):
+                    return move
+            raise IllegalMoveError(f"Illegal move '{san}' in {self.fen()}")
+
+        piece_type = "PNBRQK".index(letter)
+        if self.occupied[us] & (1 << to) or promotion:
+            raise IllegalMoveError(f"Illegal move '{san}' in {self.fen()}")
+        # Our pieces of that type that reach the destination (attacks are symmetric)
+        candidates = attacks_from(piece_type, to, us, occupied) & self.pieces[base + piece_type]
+        found = None
+        for frm in squares(candidates):
+            if from_file is not None and FILE_NAMES[frm & 7] != from_file:
+                continue
+            if from_rank is not None and str((frm >> 3) + 1) != from_rank:
+                continue
+            move = encode_move(frm, to)
+            if not self.make_move(move).in_check(us):
+                if found is not None:
+                    raise IllegalMoveError(f"Ambiguous move '{san}' in {self.fen()}")
+                found = move
+        if found is None:
+            raise IllegalMoveError(f"Illegal move '{san}' in {self.fen()}")
+        return found
+
+
+def play(fen, uci_moves):
+    """Replay UCI moves from fen and return the final Position
+
+    Raises ValueError for a bad FEN and IllegalMoveError (with the index of
+    the offending move) for the first move that is not legal.
+    """
+    position = Position.from_fen(fen)
+    for index, uci in enumerate(uci_moves):
+        try:
+            position = position.make_move(position.parse_uci(uci))
+        except IllegalMoveError as error:
+            raise IllegalMoveError(str(error), index) from None
+    return position
+
+
+def perft(position, depth):
+    """Count the leaf nodes of the legal move tree to the given depth"""
+    moves = position.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    return sum(perft(position.make_move(move), depth - 1) for move in moves)
@@ -0,0 +1,258 @@
+"""Cohort analytics over the completion event log (see event_log.py).
+
+    python src/event_analytics.py funnel             # learners reaching each stage of every lesson
+    python src/event_analytics.py time-to-complete   # how long learners take to finish each lesson
+    python src/event_analytics.py drop-off           # learners lost at each exercise step
+    python src/event_analytics.py funnel --since 2024-09-01 --json
+    python src/event_analytics.py compact            # merge finished log segments
+
+A learner "starts" a lesson with their first completion in it; time to
+complete runs from then to the lesson's completion. Drop-off counts, for
+each step of a lesson's ``interactive_exercises``, the learners who have
+completed that step and every step before it.
+
+Everything is computed with whole-array numpy operations on the log's
+columns: one sort groups the events by learner and lesson, and reduceat
+takes each group's first event, its lesson completion, and its completed
+exercise steps and objectives as bitmasks. Tens of millions of events take
+seconds, in memory proportional to the columns read.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from catalog import LessonCatalog
+from event_log import (compact, DEFAULT_EVENT_LOG, EXERCISE_COMPLETED, LESSON_COMPLETED,
+                       OBJECTIVE_COMPLETED, read_events)
+
+LESSONS_DIR = os.environ.get(
+    "CHESSEDU_LESSONS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "content", "lessons"))
+
+NEVER = np.iinfo(np.int64).max
+# Steps and objectives are tracked as bits of a 64-bit mask
+MAX_TRACKED_ITEMS = 64
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def lesson_groups(events):
+    """Group events by (learner, lesson) and reduce each group to its lesson,
+    first event time, lesson completion time (NEVER if not completed) and
+    masks of the exercise steps and objectives completed"""
+    if len(events["time"]) == 0:
+        empty = np.empty(0, np.uint64)
+        return {"lesson": np.empty(0, np.int64), "first": np.empty(0, np.int64),
+                "completed": np.empty(0, np.int64), "exercises": empty, "objectives": empty}
+
+    # The lesson id replaces the low 16 bits of the learner hash, so one sort
+    # key covers both; two learners would have to share the other 48 bits to
+    # be counted as one
+    keys = (events["learner"] & np.uint64(0xFFFFFFFFFFFF0000)) | events["lesson"].astype(np.uint64)
+    order = np.argsort(keys)
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    times = events["time"][order]
+    kinds = events["kind"][order]
+    items = events["item"][order]
+    del order
+
+    tracked = (items >= 0) & (items < MAX_TRACKED_ITEMS)
+    bits = np.left_shift(np.uint64(1), np.where(tracked, items, 0).astype(np.uint64))
+    zero = np.uint64(0)
+    return {
+        "lesson": (keys[starts] & np.uint64(0xFFFF)).astype(np.int64),
+        "first": np.minimum.reduceat(times, starts),
+        "completed": np.minimum.reduceat(np.where(kinds == LESSON_COMPLETED, times, NEVER), starts),
+        "exercises": np.bitwise_or.reduceat(
+            np.where(tracked & (kinds == EXERCISE_COMPLETED), bits, zero), starts),
+        "objectives": np.bitwise_or.reduceat(
+            np.where(tracked & (kinds == OBJECTIVE_COMPLETED), bits, zero), starts),
+    }
+
+
+def full_mask(count):
+    return np.uint64((1 << min(count, MAX_TRACKED_ITEMS)) - 1)
+
+
+def funnel(groups, lessons):
+    """Return, per lesson, how many learners started it, completed an exercise,
+    every exercise, every objective, and the lesson itself"""
+    size = max([lesson["id"] for lesson in lessons] + [int(groups["lesson"].max(initial=0))]) + 1
+    exercise_masks = np.zeros(size, np.uint64)
+    objective_masks = np.zeros(size, np.uint64)
+    for lesson in lessons:
+        exercise_masks[lesson["id"]] = full_mask(len(lesson.get("interactive_exercises", [])))
+        objective_masks[lesson["id"]] = full_mask(len(lesson.get("objectives", [])))
+
+    lesson_of = groups["lesson"]
+    wanted = exercise_masks[lesson_of]
+    all_exercises = (groups["exercises"] & wanted) == wanted
+    wanted = objective_masks[lesson_of]
+    all_objectives = (groups["objectives"] & wanted) == wanted
+
+    def count(selected=None):
+        return np.bincount(lesson_of, weights=selected, minlength=size).astype(np.int64)
+
+    started = count()
+    any_exercise = count(groups["exercises"] != 0)
+    every_exercise = count(all_exercises)
+    every_objective = count(all_objectives)
+    completed = count(groups["completed"] != NEVER)
+    rows = []
+    for lesson in lessons:
+        lesson_id = lesson["id"]
+        rows.append({
+            "lesson": lesson_id,
+            "title": lesson.get("title", ""),
+            "started": int(started[lesson_id]),
+            "anyExercise": int(any_exercise[lesson_id]),
+            "allExercises": int(every_exercise[lesson_id]),
+            "allObjectives": int(every_objective[lesson_id]),
+            "completed": int(completed[lesson_id]),
+            "completionRate": float(completed[lesson_id] / started[lesson_id]) if started[lesson_id] else 0.0,
+        })
+    return rows
+
+
+def time_to_complete(groups, lessons, percentiles=PERCENTILES):
+    """Return, per lesson, percentiles and the mean of the seconds from a
+    learner's first completion in it to the lesson's completion"""
+    done = groups["completed"] != NEVER
+    seconds = (groups["completed"][done] - groups["first"][done]) / 1000.0
+    lesson_of = groups["lesson"][done]
+    order = np.argsort(lesson_of, kind="stable")
+    seconds, lesson_of = seconds[order], lesson_of[order]
+
+    rows = []
+    for lesson in lessons:
+        low, high = np.searchsorted(lesson_of, [lesson["id"], lesson["id"] + 1])
+        values = seconds[low:high]
+        row = {"lesson": lesson["id"], "title": lesson.get("title", ""), "learners": int(len(values))}
+        quantiles = np.percentile(values, percentiles) if len(values) else [None] * len(percentiles)
+        for pct, value in zip(percentiles, quantiles):
+            row[f"p{pct}"] = None if value is None else float(value)
+        row["mean"] = float(values.mean()) if len(values) else None
+        rows.append(row)
+    return rows
+
+
+def drop_off(groups, lessons):
+    """Return, per exercise step of every lesson, how many learners completed it
+    and every step before it, and the share lost since the previous step"""
+    rows = []
+    for lesson in lessons:
+        steps = lesson.get("interactive_exercises", [])[:MAX_TRACKED_ITEMS]
+        selected = groups["lesson"] == lesson["id"]
+        exercises = groups["exercises"][selected]
+        previous = int(selected.sum())
+        for step, exercise_id in enumerate(steps):
+            prefix = full_mask(step + 1)
+            reached = int(np.count_nonzero((exercises & prefix) == prefix))
+            rows.append({
+                "lesson": lesson["id"],
+                "step": step + 1,
+                "exercise": exercise_id,
+                "learners": reached,
+                "dropOff": float(1 - reached / previous) if previous else 0.0,
+            })
+            previous = reached
+    return rows
+
+
+def format_seconds(value):
+    """Format a duration as 45s, 12m 5s, 3h 20m or 2d 4h"""
+    if value is None:
+        return "-"
+    value = int(round(value))
+    if value < 60:
+        return f"{value}s"
+    if value < 3600:
+        return f"{value // 60}m {value % 60}s"
+    if value < 86400:
+        return f"{value // 3600}h {value % 3600 // 60}m"
+    return f"{value // 86400}d {value % 86400 // 3600}h"
+
+
+def print_rows(headers, rows):
+    widths = [max([len(header)] + [len(row[i]) for row in rows]) for i, header in enumerate(headers)]
+    print("  ".join(header.ljust(width) for header, width in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def print_report(command, rows):
+    if command == "funnel":
+        print_rows(["lesson", "started", "1+ exercise", "all exercises", "all objectives", "completed", "rate"],
+                   [[f"{row['lesson']} {row['title']}", f"{row['started']:,}", f"{row['anyExercise']:,}",
+                     f"{row['allExercises']:,}", f"{row['allObjectives']:,}", f"{row['completed']:,}",
+                     f"{row['completionRate']:.1%}"] for row in rows])
+    elif command == "time-to-complete":
+        print_rows(["lesson", "learners"] + [f"p{pct}" for pct in PERCENTILES] + ["mean"],
+                   [[f"{row['lesson']} {row['title']}", f"{row['learners']:,}"]
+                    + [format_seconds(row[f"p{pct}"]) for pct in PERCENTILES] + [format_seconds(row["mean"])]
+                    for row in rows])
+    else:
+        print_rows(["lesson", "step", "exercise", "learners", "drop-off"],
+                   [[str(row["lesson"]), str(row["step"]), row["exercise"], f"{row['learners']:,}",
+                     f"{row['dropOff']:.1%}"] for row in rows])
+
+
+def parse_date(value):
+    """Return an ISO date or time (UTC unless it says otherwise) in milliseconds since the epoch"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Funnels, completion times and drop-off from the event log")
+    parser.add_argument("command", choices=("funnel", "time-to-complete", "drop-off", "compact"))
+    parser.add_argument("--log", default=os.environ.get("CHESSEDU_EVENT_LOG") or DEFAULT_EVENT_LOG,
+                        help="event log directory")
+    parser.add_argument("--lessons", default=LESSONS_DIR, help="lesson content directory")
+    parser.add_argument("--since", type=parse_date, help="only events at or after this date")
+    parser.add_argument("--until", type=parse_date, help="only events before this date")
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        merged, rows = compact(args.log)
+        print(f"Merged {merged} segments holding {rows:,} events" if merged else "Nothing to compact")
+        return 0
+
+    start = time.perf_counter()
+    events = read_events(args.log)
+    if args.since is not None or args.until is not None:
+        keep = np.ones(len(events["time"]), bool)
+        if args.since is not None:
+            keep &= events["time"] >= args.since
+        if args.until is not None:
+            keep &= events["time"] < args.until
+        events = {column: values[keep] for column, values in events.items()}
+    groups = lesson_groups(events)
+    lessons = LessonCatalog(args.lessons).load()
+    if args.command == "funnel":
+        rows = funnel(groups, lessons)
+    elif args.command == "time-to-complete":
+        rows = time_to_complete(groups, lessons)
+    else:
+        rows = drop_off(groups, lessons)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(args.command, rows)
+    print(f"{len(events['time']):,} events, {len(groups['lesson']):,} learner-lessons in {elapsed:.2f}s",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Append-only columnar log of learners' completions.
+
+Every lesson, exercise and objective a learner completes for the first time
+becomes one row: when (milliseconds since the epoch), who (a 64-bit hash of
+the learner id), what kind of completion, the lesson, and the item within
+it (the exercise's step in the lesson's ``interactive_exercises``, or the
+objective's index). Each column is a fixed-width numpy array in its own
+memory-mapped ``.npy`` file, so ``event_analytics.py`` reads only the
+columns it needs straight from the page cache and never builds a Python
+object per event.
+
+The log is a directory of segments. Each writing process appends to a
+segment of its own, preallocated to ``SEGMENT_ROWS`` rows (sparse on disk)
+and filled in order, and starts a new one when it is full. Rows are
+stored through shared memory maps, so they outlive a crash of the process
+and readers see them at once. A row's time is written last and times are
+never zero, so readers take a segment's rows up to its first zero time and
+never see half a row. ``compact()`` merges finished segments into one.
+"""
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_EVENT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "events")
+
+LESSON_COMPLETED = 1
+EXERCISE_COMPLETED = 2
+OBJECTIVE_COMPLETED = 3
+KIND_NAMES = {LESSON_COMPLETED: "lesson", EXERCISE_COMPLETED: "exercise",
+              OBJECTIVE_COMPLETED: "objective"}
+
+# Column name -> dtype. "item" is -1 for lessons and for exercises that are
+# not in their lesson's list.
+COLUMNS = {
+    "time": np.dtype("<i8"),
+    "learner": np.dtype("<u8"),
+    "kind": np.dtype("u1"),
+    "lesson": np.dtype("<u2"),
+    "item": np.dtype("<i2"),
+}
+SEGMENT_ROWS = 1 << 16
+MAX_LESSON_ID = np.iinfo(np.uint16).max
+MAX_ITEM = np.iinfo(np.int16).max
+
+
+def learner_key(learner_id):
+    """Return the 64-bit hash a learner id is logged as"""
+    digest = hashlib.blake2b(str(learner_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def lesson_number(value):
+    """Return a lesson id as the integer the log stores, or None if it can't be one"""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= MAX_LESSON_ID:
+        return value
+    return None
+
+
+def completion_events(previous, progress, exercise_steps):
+    """Return (kind, lesson, item) for everything progress completes that previous
+    (None for a new learner) did not; exercise_steps maps exercise ids to steps"""
+    events = []
+    old_lessons = previous.completed_lessons if previous is not None else {}
+    for lesson_id in progress.completed_lessons:
+        lesson = lesson_number(lesson_id)
+        if lesson is not None and lesson_id not in old_lessons:
+            events.append((LESSON_COMPLETED, lesson, -1))
+
+    old_objectives = previous.completed_objectives if previous is not None else {}
+    for key in progress.completed_objectives:
+        if key in old_objectives:
+            continue
+        lesson_id, _, index = str(key).partition("_")
+        lesson = lesson_number(lesson_id)
+        if lesson is not None and index.isdigit() and int(index) <= MAX_ITEM:
+            events.append((OBJECTIVE_COMPLETED, lesson, int(index)))
+
+    for lesson_id, completion in progress.lessons.items():
+        lesson = lesson_number(lesson_id)
+        if lesson is None or not completion.exercises:
+            continue
+        old = previous.lesson(lesson_id) if previous is not None else None
+        for exercise_id, exercise in completion.exercises.items():
+            if exercise.completed and not (old is not None and old.has_completed_exercise(exercise_id)):
+                events.append((EXERCISE_COMPLETED, lesson, exercise_steps.get(exercise_id, -1)))
+    return events
+
+
+def create_segment(directory, name, rows, data=None):
+    """Create a segment of rows rows, filled from data ({column: array}) if
+    given, and return its columns as writable memory maps"""
+    final = os.path.join(directory, name)
+    staging = final + ".tmp"
+    os.makedirs(staging)
+    columns = {}
+    for column, dtype in COLUMNS.items():
+        array = np.lib.format.open_memmap(os.path.join(staging, column + ".npy"), mode="w+",
+                                          dtype=dtype, shape=(rows,))
+        if data is not None:
+            array[:] = data[column]
+            array.flush()
+        columns[column] = array
+    # Readers skip *.tmp, so they never see a segment with columns missing
+    os.rename(staging, final)
+    return columns
+
+
+class EventLogWriter:
+    """Appends completion events to this process's segment of the log"""
+
+    def __init__(self, directory, segment_rows=SEGMENT_ROWS):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self._columns = None
+        self._row = 0
+        self._pid = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        pid = os.getpid()
+        if pid != self._pid:
+            # A forked child must not write into its parent's segment
+            self._pid = pid
+            self._sequence = 0
+        name = f"{int(time.time() * 1000)}-{pid}-{self._sequence}"
+        self._sequence += 1
+        self._columns = create_segment(self.directory, name, self.segment_rows)
+        self._row = 0
+
+    def append(self, learner_id, events):
+        """Log (kind, lesson, item) events of one learner, timestamped now"""
+        if not events:
+            return
+        key = learner_key(learner_id)
+        now = int(time.time() * 1000)
+        with self._lock:
+            for kind, lesson, item in events:
+                if self._columns is None or self._row == self.segment_rows or self._pid != os.getpid():
+                    self._open_segment()
+                columns, row = self._columns, self._row
+                columns["learner"][row] = key
+                columns["kind"][row] = kind
+                columns["lesson"][row] = lesson
+                columns["item"][row] = item
+                columns["time"][row] = now
+                self._row = row + 1
+
+
+def segment_paths(directory):
+    return sorted(path for path in glob.glob(os.path.join(directory, "*"))
+                  if os.path.isdir(path) and not path.endswith(".tmp"))
+
+
+def segment_length(path):
+    """Return how many rows of a segment have been written"""
+    times = np.load(os.path.join(path, "time.npy"), mmap_mode="r")
+    if len(times) == 0 or times[-1] != 0:
+        return len(times)
+    return int(np.argmax(times == 0))
+
+
+def read_events(directory, columns=tuple(COLUMNS)):
+    """Return {column: array} of every logged event, for the given columns"""
+    parts = {column: [] for column in columns}
+    for path in segment_paths(directory):
+        length = segment_length(path)
+        if not length:
+            continue
+        for column in columns:
+            parts[column].append(np.load(os.path.join(path, column + ".npy"), mmap_mode="r")[:length])
+    return {column: np.concatenate(arrays) if arrays else np.empty(0, COLUMNS[column])
+            for column, arrays in parts.items()}
+
+
+def writer_alive(path):
+    pid = int(os.path.basename(path).split("-")[1])
+    if pid == 0:  # written by compact()
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def compact(directory):
+    """Merge every finished segment (full, or its writer has exited) into one;
+    return (segments merged, rows)"""
+    finished = [path for path in segment_paths(directory)
+                if segment_length(path) == len(np.load(os.path.join(path, "time.npy"), mmap_mode="r"))
+                or not writer_alive(path)]
+    if len(finished) < 2:
+        return 0, 0
+    merged = {column: [] for column in COLUMNS}
+    for path in finished:
+        length = segment_length(path)
+        for column in COLUMNS:
+            merged[column].append(np.load(os.path.join(path, column + ".npy"), mmap_mode="r")[:length])
+    merged = {column: np.concatenate(arrays) for column, arrays in merged.items()}
+    rows = len(merged["time"])
+    if rows:
+        # Named after the oldest segment, so it sorts where its rows began
+        name = f"{os.path.basename(finished[0]).split('-')[0]}-0-{int(time.time() * 1000)}"
+        create_segment(directory, name, rows, merged)
+    for path in finished:
+        shutil.rmtree(path)
+    return len(finished), rows
@@ -0,0 +1,321 @@
+"""Leaderboards by streak, lessons completed and achievements.
+
+A ``Leaderboard`` keeps every learner's score in a Fenwick tree of how many
+learners have each score, plus the learners at each score in the order
+they reached it. Changing a score, a learner's rank (1 + the learners
+with a higher score, so ties share a rank) and each step of a top-k
+listing are O(log s) in the highest score, however many learners there
+are; nothing is scanned or sorted per request.
+
+``Leaderboards`` keeps the three boards up to date from learners'
+standings (streak, last active day, lessons completed, achievements) as
+their progress changes. A streak only counts while it is alive, that is
+the learner was active today or yesterday (UTC); learners whose last
+active day falls further behind drop off the streak board as the days
+pass. With a database path, standings are written to a ``standings``
+table with a sequence number and each process catches up on the rows
+written since it last looked (an index range scan over just the changes),
+so every worker's boards include every worker's changes.
+"""
+import hashlib
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+BOARDS = ("streak", "lessons", "achievements")
+# Scores above this count as this: no learner gets near it honestly, and the
+# Fenwick trees grow with the highest score
+MAX_SCORE = 1 << 16
+
+log = logging.getLogger(__name__)
+
+
+def check_score(score):
+    """Return score capped at MAX_SCORE; raise ValueError unless it is a non-negative int"""
+    if not isinstance(score, int) or isinstance(score, bool) or score < 0:
+        raise ValueError(f"Scores must be non-negative integers, not {score!r}")
+    return min(score, MAX_SCORE)
+
+
+class FenwickTree:
+    """Counts per non-negative integer with prefix sums and rank search in O(log n)"""
+
+    def __init__(self, size=64):
+        self._counts = [0] * size
+        self._tree = [0] * (size + 1)
+
+    def _grow(self, index):
+        size = len(self._counts)
+        while size <= index:
+            size *= 2
+        counts = self._counts + [0] * (size - len(self._counts))
+        self._counts = [0] * size
+        self._tree = [0] * (size + 1)
+        for value, count in enumerate(counts):
+            if count:
+                self.add(value, count)
+
+    def add(self, value, delta):
+        if value >= len(self._counts):
+            self._grow(value)
+        self._counts[value] += delta
+        position = value + 1
+        tree = self._tree
+        while position < len(tree):
+            tree[position] += delta
+            position += position & -position
+
+    def count_below(self, value):
+        """Return how many are counted at values below value"""
+        position = min(value, len(self._counts))
+        total = 0
+        tree = self._tree
+        while position > 0:
+            total += tree[position]
+            position -= position & -position
+        return total
+
+    def find(self, rank):
+        """Return the smallest value with at least rank counted at or below it"""
+        position = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        tree = self._tree
+        while step:
+            following = position + step
+            if following < len(tree) and tree[following] < rank:
+                position = following
+                rank -= tree[following]
+            step >>= 1
+        return position
+
+
+class Leaderboard:
+    """Learners ranked by score, highest first; learners with no score are not listed"""
+
+    def __init__(self):
+        self._scores = {}
+        # score -> learners with that score, in the order they reached it
+        self._buckets = {}
+        self._tree = FenwickTree()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, learner_id, score):
+        """Set a learner's score (a non-negative int, capped at MAX_SCORE); 0 removes them"""
+        score = check_score(score)
+        previous = self._scores.get(learner_id)
+        if previous == score or (previous is None and score == 0):
+            return
+        if previous is not None:
+            bucket = self._buckets[previous]
+            del bucket[learner_id]
+            if not bucket:
+                del self._buckets[previous]
+            self._tree.add(previous, -1)
+            del self._scores[learner_id]
+        if score > 0:
+            self._scores[learner_id] = score
+            self._buckets.setdefault(score, {})[learner_id] = None
+            self._tree.add(score, 1)
+
+    def remove(self, learner_id):
+        self.set(learner_id, 0)
+
+    def score(self, learner_id):
+        return self._scores.get(learner_id)
+
+    def rank(self, learner_id):
+        """Return the learner's rank (1 is the top), or None if they are not listed"""
+        score = self._scores.get(learner_id)
+        if score is None:
+            return None
+        return len(self._scores) - self._tree.count_below(score + 1) + 1
+
+    def top(self, count):
+        """Return [(learner id, score, rank)] of the count highest-ranked learners"""
+        entries = []
+        total = len(self._scores)
+        position = 1  # position from the top of the next learner listed
+        while position <= total and len(entries) < count:
+            score = self._tree.find(total - position + 1)
+            rank = position
+            for learner_id in self._buckets[score]:
+                entries.append((learner_id, score, rank))
+                if len(entries) == count:
+                    break
+            position += len(self._buckets[score])
+        return entries
+
+
+def standing(progress, lesson_ids):
+    """Return what the leaderboards rank a learner by: (streak, last active
+    day, lessons completed, achievements)
+
+    Only completed lessons whose ids are in ``lesson_ids`` (the curriculum)
+    count, whatever else a stored document lists.
+    """
+    streak = progress.current_streak
+    if not isinstance(streak, int) or isinstance(streak, bool) or streak < 0:
+        # Only documents saved before streaks were kept server-side can hold these
+        streak = 0
+    lessons = sum(1 for lesson_id in progress.completed_lessons if lesson_id in lesson_ids)
+    return (min(streak, MAX_SCORE), progress.last_active_day or "", lessons, len(progress.achievements))
+
+
+def check_standing(standing):
+    """Raise ValueError unless standing (see ``standing()``) can go on the boards"""
+    streak, active_day, lessons, achievements = standing
+    for score in (streak, lessons, achievements):
+        check_score(score)
+    if active_day and not isinstance(active_day, str):
+        raise ValueError(f"The last active day must be an ISO date, not {active_day!r}")
+    if active_day:
+        date.fromisoformat(active_day)
+
+
+def public_name(learner_id):
+    """Return the name a learner is listed under (learner ids identify sessions and stay private)"""
+    return "Learner " + hashlib.blake2b(learner_id.encode("utf-8"), digest_size=3).hexdigest()
+
+
+class Leaderboards:
+    """The streak, lessons and achievements boards over every learner"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.boards = {board: Leaderboard() for board in BOARDS}
+        self._lock = threading.Lock()
+        # Learners on the streak board by last active day, to drop broken streaks
+        self._active_days = {}
+        self._day_heap = []
+        self._learner_days = {}
+        self._sequence = 0
+        self._local = threading.local()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS standings ("
+                " learner_id TEXT PRIMARY KEY,"
+                " streak INTEGER NOT NULL,"
+                " active_day TEXT NOT NULL,"
+                " lessons INTEGER NOT NULL,"
+                " achievements INTEGER NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " sequence INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS standings_sequence ON standings (sequence)")
+            conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, learner_id, version, standing):
+        """Record a learner's standing (see ``standing()``) as of a progress version"""
+        self.record_many([(learner_id, version, standing)])
+
+    def record_many(self, items):
+        """Record (learner id, version, standing) triples in one go
+
+        Raises ValueError, recording nothing, if a standing has a score that
+        is not a non-negative int or a last active day that is not an ISO date.
+        """
+        for _, _, standing in items:
+            check_standing(standing)
+        if not self.path:
+            with self._lock:
+                for learner_id, _, standing in items:
+                    self._apply(learner_id, *standing)
+            return
+        conn = self._connection()
+        with conn:
+            # A write statement holds SQLite's write lock from its start, so
+            # sequence numbers follow commit order across processes. Workers
+            # record after their edit commits, so an older version can arrive
+            # last; it is ignored.
+            conn.executemany(
+                "INSERT INTO standings VALUES (?, ?, ?, ?, ?, ?,"
+                " (SELECT COALESCE(MAX(sequence), 0) + 1 FROM standings))"
+                " ON CONFLICT (learner_id) DO UPDATE SET streak = excluded.streak,"
+                " active_day = excluded.active_day, lessons = excluded.lessons,"
+                " achievements = excluded.achievements, version = excluded.version,"
+                " sequence = excluded.sequence WHERE excluded.version > standings.version",
+                [(learner_id, *standing, version) for learner_id, version, standing in items])
+
+    def _apply(self, learner_id, streak, active_day, lessons, achievements):
+        self.boards["lessons"].set(learner_id, lessons)
+        self.boards["achievements"].set(learner_id, achievements)
+        self.boards["streak"].set(learner_id, streak if active_day else 0)
+        old_day = self._learner_days.pop(learner_id, None)
+        if old_day is not None:
+            self._active_days[old_day].discard(learner_id)
+        if active_day and streak > 0:
+            self._learner_days[learner_id] = active_day
+            if active_day not in self._active_days:
+                self._active_days[active_day] = set()
+                heapq.heappush(self._day_heap, active_day)
+            self._active_days[active_day].add(learner_id)
+
+    def _catch_up(self):
+        if not self.path:
+            return
+        rows = self._connection().execute(
+            "SELECT learner_id, streak, active_day, lessons, achievements, sequence FROM standings"
+            " WHERE sequence > ? ORDER BY sequence", (self._sequence,)).fetchall()
+        for learner_id, streak, active_day, lessons, achievements, sequence in rows:
+            self._sequence = sequence
+            try:
+                check_standing((streak, active_day, lessons, achievements))
+            except ValueError as error:
+                # Written before standings were checked; skip it rather than stall on it
+                log.warning("Skipping the standing of learner %s: %s", public_name(learner_id), error)
+                continue
+            self._apply(learner_id, streak, active_day, lessons, achievements)
+
+    def _expire(self, today):
+        # Streaks last seen before yesterday are broken
+        cutoff = (date.fromisoformat(today) - timedelta(days=1)).isoformat()
+        while self._day_heap and self._day_heap[0] < cutoff:
+            day = heapq.heappop(self._day_heap)
+            for learner_id in self._active_days.pop(day):
+                self.boards["streak"].remove(learner_id)
+                del self._learner_days[learner_id]
+
+    def top(self, board, today, count):
+        """Bring the boards up to date and return (top count entries, learners listed)"""
+        with self._lock:
+            self._catch_up()
+            self._expire(today)
+            leaderboard = self.boards[board]
+            return leaderboard.top(count), len(leaderboard)
+
+    def place(self, board, learner_id):
+        """Return the learner's (rank, score) on a board as of the last ``top()``, or None"""
+        with self._lock:
+            leaderboard = self.boards[board]
+            rank = leaderboard.rank(learner_id)
+            return (rank, leaderboard.score(learner_id)) if rank is not None else None
+
+    def standings(self, board, learner_id, today, count):
+        """Return (top count entries, the learner's (rank, score) or None, learners listed)"""
+        top, listed = self.top(board, today, count)
+        return top, self.place(board, learner_id), listed
+
+
+def create_leaderboards(location):
+    """Create leaderboards shared through the progress database; an empty
+    location or ':memory:' keeps them in this process only"""
+    if not location or location == ":memory:":
+        return Leaderboards()
+    return Leaderboards(location)
@@ -0,0 +1,402 @@
+"""Request metrics in the Prometheus text format, and a sampling profiler.
+
+``RequestMetrics`` keeps per-endpoint request counters, in-flight gauges and
+fixed-bucket histograms (latency, response size, and the time and size of
+serialized progress documents) that the app's request hooks update, and
+renders them for ``/metrics``. Recording a request is a lock and a few dict
+updates, so the hooks stay on in production.
+
+Under gunicorn every worker process counts its own requests. Give the
+workers a shared directory (CHESSEDU_METRICS_DIR, set by wsgi.py) and a
+thread in each writes its counts there once a second, so whichever worker
+answers a scrape reports the whole server. gunicorn.conf.py folds the counts of
+exited workers into an archive file, so counters don't go backwards when
+workers are replaced.
+
+``RouteProfiler`` runs cProfile on a random sample of the requests to one
+endpoint. It is switched on and off at runtime (see ``/metrics/profile``)
+and, with a shared directory, in every worker at once.
+"""
+import atexit
+import bisect
+import copy
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+
+DEFAULT_METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "metrics")
+
+PREFIX = "chessedu_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+SERIALIZATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025)
+
+# Histograms by name: (bucket upper bounds, help text). All are labelled by endpoint.
+HISTOGRAMS = {
+    "http_request_duration_seconds": (
+        LATENCY_BUCKETS, "Time from the start of a request to its response"),
+    "http_response_size_bytes": (SIZE_BUCKETS, "Size of response bodies"),
+    "progress_serialization_seconds": (
+        SERIALIZATION_BUCKETS, "Time spent serializing progress documents to JSON"),
+    "progress_document_bytes": (SIZE_BUCKETS, "Size of the serialized progress documents sent"),
+}
+
+# Seconds between writes of a worker's counts to the shared directory
+FLUSH_INTERVAL = 1.0
+ARCHIVE_FILE = "archive.json"
+PROFILE_SETTINGS_FILE = "profile.json"
+
+
+def empty_state():
+    """Return empty counts: requests and slow requests keyed by
+    "endpoint method status" and endpoint, in-flight requests by endpoint,
+    and histograms by name and endpoint (bucket counts, then the sum)"""
+    return {"requests": {}, "slow": {}, "in_flight": {},
+            "histograms": {name: {} for name in HISTOGRAMS}}
+
+
+def merge_state(into, state, gauges=True):
+    """Add the counts in state to into; gauges=False leaves in-flight counts out"""
+    for section in ("requests", "slow", "in_flight") if gauges else ("requests", "slow"):
+        target = into[section]
+        for key, count in state.get(section, {}).items():
+            target[key] = target.get(key, 0) + count
+    for name, series in state.get("histograms", {}).items():
+        target = into["histograms"].get(name)
+        if target is None:
+            continue
+        for label, values in series.items():
+            existing = target.get(label)
+            if existing is None:
+                target[label] = list(values)
+            elif len(existing) == len(values):  # different buckets after an upgrade
+                target[label] = [a + b for a, b in zip(existing, values)]
+
+
+def write_json(path, data):
+    """Replace path with data atomically, so readers never see half a file"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def worker_files(directory):
+    """Return {pid: path} of the counts files written by worker processes"""
+    files = {}
+    for path in glob.glob(os.path.join(directory, "[0-9]*.json")):
+        name = os.path.basename(path)[:-len(".json")]
+        if name.isdigit():
+            files[int(name)] = path
+    return files
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def archive_worker(directory, pid):
+    """Fold the counts of an exited worker into the archive (gunicorn's child_exit hook)"""
+    path = os.path.join(directory, f"{pid}.json")
+    state = read_json(path)
+    if state is None:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = empty_state()
+    merge_state(archive, read_json(archive_path) or {})
+    merge_state(archive, state, gauges=False)
+    write_json(archive_path, archive)
+    os.unlink(path)
+
+
+def clear_directory(directory):
+    """Remove the counts and profiles of a previous run (gunicorn's on_starting hook)"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.prof")):
+        os.unlink(path)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def render(state):
+    """Return the counts in state in the Prometheus text exposition format"""
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f"# HELP {PREFIX}{name} {text}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    header("http_requests_total", "counter", "Requests answered, by endpoint, method and status")
+    for key, count in sorted(state["requests"].items()):
+        endpoint, method, status = key.split(" ")
+        lines.append(f'{PREFIX}http_requests_total{{endpoint="{escape_label(endpoint)}",'
+                     f'method="{escape_label(method)}",status="{status}"}} {count}')
+
+    header("http_requests_in_flight", "gauge", "Requests being handled")
+    for endpoint, count in sorted(state["in_flight"].items()):
+        lines.append(f'{PREFIX}http_requests_in_flight{{endpoint="{escape_label(endpoint)}"}} {count}')
+
+    header("slow_requests_total", "counter", "Requests slower than the slow-request threshold")
+    for endpoint, count in sorted(state["slow"].items()):
+        lines.append(f'{PREFIX}slow_requests_total{{endpoint="{escape_label(endpoint)}"}} {count}')
+
+    for name, (buckets, text) in HISTOGRAMS.items():
+        header(name, "histogram", text)
+        for endpoint, values in sorted(state["histograms"][name].items()):
+            label = f'endpoint="{escape_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{{{label},le="{format_bound(bound)}"}} {cumulative}')
+            cumulative += values[len(buckets)]
+            lines.append(f'{PREFIX}{name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{PREFIX}{name}_sum{{{label}}} {values[-1]!r}")
+            lines.append(f"{PREFIX}{name}_count{{{label}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class RouteProfiler:
+    """Profiles a random sample of the requests to one endpoint with cProfile
+
+    One request is profiled at a time per process; requests arriving while
+    another is being profiled are not sampled.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.settings = None
+        self.samples = 0
+        self._stats = None
+        self._unsaved = False
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._settings_mtime = None
+
+    def start(self, endpoint, sample_rate, limit):
+        """Profile up to limit requests to endpoint (per process), each with probability sample_rate"""
+        settings = {"endpoint": endpoint, "sampleRate": sample_rate, "limit": limit,
+                    "started": time.time()}
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, "profile-*.prof")):
+                os.unlink(path)
+            write_json(os.path.join(self.directory, PROFILE_SETTINGS_FILE), settings)
+        self._apply(settings)
+        return settings
+
+    def stop(self):
+        if self.directory:
+            try:
+                os.unlink(os.path.join(self.directory, PROFILE_SETTINGS_FILE))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.settings = None
+
+    def _apply(self, settings):
+        with self._lock:
+            self.settings = settings
+            self.samples = 0
+            self._stats = None
+            self._unsaved = False
+
+    def begin(self, endpoint):
+        """Return a running profiler if this request to endpoint is sampled, else None"""
+        settings = self.settings
+        if (settings is None or settings["endpoint"] != endpoint
+                or self.samples >= settings["limit"] or random.random() >= settings["sampleRate"]):
+            return None
+        if not self._running.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile):
+        profile.disable()
+        self._running.release()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.samples += 1
+            self._unsaved = True
+
+    def sync(self):
+        """Pick up profiling started or stopped by another worker, and save this
+        worker's samples for the others to report"""
+        path = os.path.join(self.directory, PROFILE_SETTINGS_FILE)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._settings_mtime:
+            self._settings_mtime = mtime
+            settings = read_json(path) if mtime is not None else None
+            if settings is None:
+                with self._lock:
+                    self.settings = None
+            elif self.settings is None or settings["started"] != self.settings["started"]:
+                self._apply(settings)
+        with self._lock:
+            if self._unsaved:
+                self._stats.dump_stats(os.path.join(self.directory, f"profile-{os.getpid()}.prof"))
+                self._unsaved = False
+
+    def report(self, sort="cumulative", lines=40):
+        """Return the profiled functions as text, slowest first"""
+        out = io.StringIO()
+        stats = pstats.Stats(stream=out)
+        with self._lock:
+            if self.directory:
+                for path in sorted(glob.glob(os.path.join(self.directory, "profile-*.prof"))):
+                    try:
+                        stats.add(path)
+                    except (OSError, EOFError, ValueError):
+                        continue
+            elif self._stats is not None:
+                stats.add(self._stats)
+        if not stats.stats:
+            return "No requests have been profiled\n"
+        stats.sort_stats(sort).print_stats(lines)
+        return out.getvalue()
+
+
+class RequestMetrics:
+    """Per-endpoint request counts and histograms, optionally shared between workers"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.profiler = RouteProfiler(directory)
+        self._state = empty_state()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._recorded = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def _observe(self, name, endpoint, value):
+        buckets = HISTOGRAMS[name][0]
+        series = self._state["histograms"][name]
+        values = series.get(endpoint)
+        if values is None:
+            values = series[endpoint] = [0] * (len(buckets) + 1) + [0.0]
+        values[bisect.bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    def request_started(self, endpoint):
+        if self.directory and self._flusher is None:
+            self._start_flusher()
+        with self._lock:
+            in_flight = self._state["in_flight"]
+            in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+
+    def request_finished(self, endpoint):
+        with self._lock:
+            self._state["in_flight"][endpoint] -= 1
+
+    def record_response(self, endpoint, method, status, seconds, size, slow=False):
+        """Count a response; size is None for streamed bodies"""
+        key = f"{endpoint} {method} {status}"
+        with self._lock:
+            requests = self._state["requests"]
+            requests[key] = requests.get(key, 0) + 1
+            self._observe("http_request_duration_seconds", endpoint, seconds)
+            if size is not None:
+                self._observe("http_response_size_bytes", endpoint, size)
+            if slow:
+                self._state["slow"][endpoint] = self._state["slow"].get(endpoint, 0) + 1
+            self._recorded = True
+
+    def record_progress(self, endpoint, seconds, size):
+        """Record the serialization of a progress document"""
+        with self._lock:
+            self._observe("progress_serialization_seconds", endpoint, seconds)
+            self._observe("progress_document_bytes", endpoint, size)
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._state)
+
+    def _start_flusher(self):
+        # Started by the first request rather than at import, so the thread
+        # runs in the worker process that serves it
+        with self._flush_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True,
+                                             name="metrics-flusher")
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        """Write this worker's counts to the shared directory"""
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self.profiler.sync()
+            # Processes that never answer a request (sse_server.py) leave no file
+            if self._recorded:
+                state = self.snapshot()
+                state["profileSamples"] = self.profiler.samples
+                write_json(os.path.join(self.directory, f"{os.getpid()}.json"), state)
+
+    def collect(self):
+        """Return the counts of this process, or of every worker with a shared directory"""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        merged = empty_state()
+        merge_state(merged, read_json(os.path.join(self.directory, ARCHIVE_FILE)) or {})
+        for pid, path in worker_files(self.directory).items():
+            state = read_json(path)
+            if state is not None:
+                # A worker that died without child_exit running has nothing in flight
+                merge_state(merged, state, gauges=pid == os.getpid() or process_alive(pid))
+        return merged
+
+    def render(self):
+        return render(self.collect())
+
+    def profile_samples(self):
+        """Return how many requests have been profiled, in every worker with a shared directory"""
+        if not self.directory:
+            return self.profiler.samples
+        self.flush()
+        return sum((read_json(path) or {}).get("profileSamples", 0)
+                   for path in worker_files(self.directory).values())
@@ -0,0 +1,211 @@
+"""Mine fork and pin puzzles from PGN files into the app's puzzle index.
+
+    python src/mine_tactics.py content/pgn/sample_games.pgn
+    python src/mine_tactics.py lichess_db.pgn.bz2 --workers 8 --max-per-bucket 50000
+
+PGN files (plain, .gz or .bz2) are streamed game by game and handed to a
+pool of worker processes in batches. Each worker replays its games and runs
+the motif detectors in tactics.py after every move; the parent collects
+and de-duplicates the puzzles and writes the index read by puzzles.py.
+Progress and throughput are reported on stderr as it goes.
+"""
+import argparse
+import bz2
+import collections
+import gzip
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from chess_core import IllegalMoveError, Position, START_FEN
+from puzzles import pack_puzzle, write_index
+from tactics import find_motifs
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT_DIR, "content", "puzzles", "puzzles.bin")
+
+COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+VARIATION = re.compile(r"\([^()]*\)")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+HEADER = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+
+def open_pgn(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_games(paths, stats):
+    """Yield (starting FEN, movetext) for every standard-chess game in the files"""
+    for path in paths:
+        with open_pgn(path) as f:
+            headers, movetext = {}, []
+            for line in f:
+                stats["bytes"] += len(line)
+                match = HEADER.match(line)
+                if match:
+                    if movetext:
+                        yield from _game(headers, movetext)
+                        headers, movetext = {}, []
+                    headers[match.group(1)] = match.group(2)
+                elif line.strip():
+                    movetext.append(line)
+            if movetext:
+                yield from _game(headers, movetext)
+
+
+def _game(headers, movetext):
+    # Other variants (Chess960, crazyhouse, ...) don't follow these rules
+    if headers.get("Variant", "Standard").lower() not in ("standard", "chess"):
+        return
+    yield headers.get("FEN", START_FEN), "".join(movetext)
+
+
+def san_tokens(movetext):
+    """Return the main-line SAN moves of a movetext (comments, variations and NAGs removed)"""
+    text = COMMENT.sub(" ", movetext)
+    while "(" in text:
+        stripped = VARIATION.sub(" ", text)
+        if stripped == text:
+            break
+        text = stripped
+    tokens = []
+    for token in text.split():
+        token = MOVE_NUMBER.sub("", token)
+        if token and token not in RESULTS and not token.startswith("$"):
+            tokens.append(token)
+    return tokens
+
+
+def mine_games(games, min_ply):
+    """Replay a batch of games; return (games, plies, skipped games, puzzles)"""
+    plies = skipped = 0
+    puzzles = []
+    for fen, movetext in games:
+        try:
+            position = Position.from_fen(fen)
+            for ply, san in enumerate(san_tokens(movetext)):
+                move = position.parse_san(san)
+                after = position.make_move(move)
+                plies += 1
+                if ply >= min_ply:
+                    for theme, piece, level in find_motifs(position, move, after):
+                        puzzles.append((theme, piece, level, pack_puzzle(position, move)))
+                position = after
+        except (IllegalMoveError, ValueError):
+            # Corrupt or unsupported game: keep the puzzles found before the bad move
+            skipped += 1
+    return len(games), plies, skipped, puzzles
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Collector:
+    """De-duplicates puzzles, caps each bucket and keeps the throughput counters"""
+
+    def __init__(self, max_per_bucket):
+        self.max_per_bucket = max_per_bucket
+        self.seen = set()
+        self.puzzles = []
+        self.bucket_sizes = collections.Counter()
+        self.games = self.plies = self.skipped = 0
+
+    def add(self, result):
+        games, plies, skipped, puzzles = result
+        self.games += games
+        self.plies += plies
+        self.skipped += skipped
+        for theme, piece, level, record in puzzles:
+            bucket = (theme, piece, level)
+            # The same position and solution shows up in many games (openings, traps)
+            key = (theme, record[:34], record[35:37])
+            if key in self.seen or self.bucket_sizes[bucket] >= self.max_per_bucket:
+                continue
+            self.seen.add(key)
+            self.bucket_sizes[bucket] += 1
+            self.puzzles.append((theme, piece, level, record))
+
+
+def report(collector, stats, started, final=False):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    line = (f"{collector.games:,} games ({collector.games / elapsed:,.0f}/s), "
+            f"{collector.plies:,} plies ({collector.plies / elapsed:,.0f}/s), "
+            f"{stats['bytes'] / elapsed / 1e6:.1f} MB/s, {len(collector.puzzles):,} puzzles")
+    print(("Done: " if final else "") + line + (f" in {elapsed:.1f}s" if final else ""),
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine fork and pin puzzles from PGN files")
+    parser.add_argument("pgn", nargs="+", help="PGN files (.pgn, .pgn.gz or .pgn.bz2)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="index file to write")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (1 mines in this process)")
+    parser.add_argument("--batch-size", type=int, default=200, help="games per worker task")
+    parser.add_argument("--min-ply", type=int, default=8, help="skip motifs in the first plies")
+    parser.add_argument("--max-games", type=int, default=None, help="stop after this many games")
+    parser.add_argument("--max-per-bucket", type=int, default=20000,
+                        help="puzzles kept per theme/piece/difficulty")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    stats = {"bytes": 0}
+    games = read_games(args.pgn, stats)
+    if args.max_games is not None:
+        games = (game for _, game in zip(range(args.max_games), games))
+    batches = batched(games, args.batch_size)
+
+    collector = Collector(args.max_per_bucket)
+    started = last_report = time.perf_counter()
+
+    def progress():
+        nonlocal last_report
+        if time.perf_counter() - last_report >= args.report_every:
+            report(collector, stats, started)
+            last_report = time.perf_counter()
+
+    if args.workers <= 1:
+        for batch in batches:
+            collector.add(mine_games(batch, args.min_ply))
+            progress()
+    else:
+        with multiprocessing.Pool(args.workers) as pool:
+            # Keep a bounded number of batches in flight so huge files are
+            # streamed instead of being read into the task queue up front
+            pending = collections.deque()
+            for batch in batches:
+                pending.append(pool.apply_async(mine_games, (batch, args.min_ply)))
+                if len(pending) >= args.workers * 4:
+                    collector.add(pending.popleft().get())
+                    progress()
+            while pending:
+                collector.add(pending.popleft().get())
+
+    count = write_index(args.output, collector.puzzles)
+    report(collector, stats, started, final=True)
+    if collector.skipped:
+        print(f"Skipped the rest of {collector.skipped:,} games with illegal or unreadable moves",
+              file=sys.stderr)
+    for (theme, piece, level), size in sorted(collector.bucket_sizes.items()):
+        print(f"  {theme:<5} {piece:<7} difficulty {level}: {size:,}", file=sys.stderr)
+    print(f"Wrote {count:,} puzzles to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Opening book of principled lines, memory-mapped for serving.
+
+The file written by ``build_opening_book.py`` is an open-addressing hash
+table keyed by the position's Zobrist hash (``Position.zobrist()``)::
+
+    header      magic b"CEOB", format version, Zobrist fingerprint, slot and move counts
+    slots       (position hash, first move, move count, opening name) each;
+                hash 0 marks an empty slot
+    moves       (move, weight) each, the book moves of a position contiguous
+    names       "ECO<TAB>name" lines, indexed by the slots
+
+The slot count is a power of two at least twice the number of positions,
+so finding a position is one masked hash and a probe or two of the mapped
+file, however many positions the book holds. Hashing by position rather
+than by move sequence means transpositions find the same entry.
+
+A learner's move is "principled" if the book has it for the position (or
+it transposes into a book position), "dubious" if the position is in the
+book but the move leaves it, and "off-book" if the book does not cover the
+position at all.
+"""
+import mmap
+import os
+import struct
+
+from chess_core import Position, START_FEN
+
+MAGIC = b"CEOB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHxxQII")
+SLOT = struct.Struct("<QIHH")
+# Move (from, to and promotion bits only) and how many lines or games play it
+MOVE = struct.Struct("<HI")
+NO_NAME = 0xFFFF
+MOVE_BITS = 0x7FFF
+
+PRINCIPLED, DUBIOUS, OFF_BOOK = "principled", "dubious", "off-book"
+
+# Changes whenever chess_core's Zobrist keys do, which would make a book unreadable
+ZOBRIST_FINGERPRINT = Position.from_fen(START_FEN).zobrist()
+
+
+def slot_count(positions):
+    """Return the table size for a number of positions (load factor at most 1/2)"""
+    size = 8
+    while size < positions * 2:
+        size <<= 1
+    return size
+
+
+def write_book(path, positions, names):
+    """Write a book file from positions ({hash: {move: weight}}) and names
+    ({hash: (eco, name)}); positions that only have a name get no moves
+
+    The file is written next to path and renamed into place, so a running
+    app that has the old book mapped keeps a consistent view of it.
+    """
+    keys = sorted((set(positions) | set(names)) - {0})
+    name_lines = sorted(set(names.values()))
+    if len(name_lines) >= NO_NAME:
+        raise ValueError(f"A book can hold at most {NO_NAME - 1} opening names")
+    name_index = {entry: index for index, entry in enumerate(name_lines)}
+
+    size = slot_count(len(keys))
+    slots = [None] * size
+    moves = []
+    for key in keys:
+        book_moves = sorted(positions.get(key, {}).items(), key=lambda item: (-item[1], item[0]))
+        name = name_index[names[key]] if key in names else NO_NAME
+        index = key & (size - 1)
+        while slots[index] is not None:
+            index = (index + 1) & (size - 1)
+        slots[index] = (key, len(moves), len(book_moves), name)
+        moves.extend((move & MOVE_BITS, min(weight, 0xFFFFFFFF)) for move, weight in book_moves)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, ZOBRIST_FINGERPRINT, size, len(moves)))
+        empty = SLOT.pack(0, 0, 0, NO_NAME)
+        f.write(b"".join(SLOT.pack(*slot) if slot is not None else empty for slot in slots))
+        f.write(b"".join(MOVE.pack(*move) for move in moves))
+        f.write("".join(f"{eco}\t{name}\n" for eco, name in name_lines).encode("utf-8"))
+    os.replace(temp_path, path)
+    return len(keys), len(moves)
+
+
+class OpeningBook:
+    """A read-only, memory-mapped opening book"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, fingerprint, self.slot_count, self.move_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or fingerprint != ZOBRIST_FINGERPRINT:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book this version can read")
+        self._mask = self.slot_count - 1
+        self._moves_offset = HEADER.size + self.slot_count * SLOT.size
+        names_offset = self._moves_offset + self.move_count * MOVE.size
+        self.names = [tuple(line.split("\t", 1))
+                      for line in self._map[names_offset:].decode("utf-8").splitlines()]
+
+    def lookup(self, key):
+        """Return (book moves as [(move, weight)], name index) for a position
+        hash, or None if the position is not in the book"""
+        index = key & self._mask
+        while True:
+            slot_key, first, count, name = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+            if slot_key == key:
+                offset = self._moves_offset + first * MOVE.size
+                return [MOVE.unpack_from(self._map, offset + i * MOVE.size) for i in range(count)], name
+            if slot_key == 0:
+                return None
+            index = (index + 1) & self._mask
+
+    def opening(self, key):
+        """Return the (ECO code, name) of a position, or None if it has no name"""
+        entry = self.lookup(key)
+        if entry is None or entry[1] == NO_NAME:
+            return None
+        return self.names[entry[1]]
+
+    def classify(self, position, move):
+        """Return (classification, book moves of position as [(move, weight)])
+        for a legal move in position"""
+        entry = self.lookup(position.zobrist())
+        book_moves = entry[0] if entry is not None else []
+        if any(book_move == move & MOVE_BITS for book_move, _ in book_moves):
+            return PRINCIPLED, book_moves
+        after = self.lookup(position.make_move(move).zobrist())
+        if after is not None:
+            return PRINCIPLED, book_moves
+        # A position whose lines all end here says nothing about the next move
+        return (DUBIOUS if book_moves else OFF_BOOK), book_moves
+
+    def close(self):
+        self._map.close()
+
+
+def open_opening_book(path):
+    """Open the book at path, or return None if it has not been built"""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
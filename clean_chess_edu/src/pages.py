@@ -0,0 +1,63 @@
+"""HTML pages rendered once and served from memory.
+
+The index, board and exercise templates render the same HTML for every
+request, so ``PageCache`` renders each whitelisted page once into a
+``PrecompressedPayload`` (identity, gzip and brotli bodies with a strong
+ETag) and serves that: no template work per request, and revalidations
+are answered with 304. Pages missing from the whitelist never reach the
+template loader, so an unknown exercise name is a cheap 404. ``changed()``
+notices edited templates, so the development server can re-render them
+without a restart.
+"""
+import os
+
+from flask import render_template
+
+from precompressed import PrecompressedPayload
+
+# Pages link content-hashed bundles whose names change with every build, so
+# browsers revalidate the HTML on each visit (normally answered with a 304)
+PAGE_CACHE_CONTROL = "no-cache"
+
+
+class PageCache:
+    """Rendered pages by name ("index", "board" or "exercises/<exercise id>")"""
+
+    def __init__(self, app, templates):
+        """templates maps each page name to its template file"""
+        self.app = app
+        self.templates = dict(templates)
+        self.payloads = {}
+        self._signature = None
+
+    def _current_signature(self):
+        # Every template counts, since a page may extend or include others
+        folder = os.path.join(self.app.root_path, self.app.template_folder)
+        signature = []
+        for directory, _, names in os.walk(folder):
+            for name in names:
+                stat = os.stat(os.path.join(directory, name))
+                signature.append((os.path.join(directory, name), stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(signature))
+
+    def render(self):
+        """(Re)render every page"""
+        signature = self._current_signature()
+        # url_for needs a request; pages don't depend on anything else in it. A
+        # fresh app context keeps the real request's g (and its teardown
+        # hooks) apart when this runs during a request in debug mode.
+        with self.app.app_context(), self.app.test_request_context("/"):
+            self.payloads = {
+                page: PrecompressedPayload(render_template(template), "text/html; charset=utf-8",
+                                           cache_control=PAGE_CACHE_CONTROL)
+                for page, template in self.templates.items()
+            }
+        self._signature = signature
+
+    def changed(self):
+        """Return True if the templates differ from what was last rendered"""
+        return self._current_signature() != self._signature
+
+    def payload(self, page):
+        """Return the page's payload, or None if it is not a known page"""
+        return self.payloads.get(page)
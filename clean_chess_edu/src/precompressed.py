@@ -0,0 +1,83 @@
+"""Response bodies serialized and compressed once, served many times.
+
+A ``PrecompressedPayload`` keeps the identity, gzip and (when the optional
+``brotli`` package is installed) brotli encodings of a body together with a
+strong ETag. ``respond()`` picks the best encoding the client accepts and
+answers matching ``If-None-Match`` requests with 304, so serving it costs
+no serialization or compression work per request.
+
+Payloads built once at startup or build time are compressed at the
+smallest (slowest) settings. Payloads built while a request waits, like an
+analysis cache miss, pass ``dynamic=True`` to use fast settings instead:
+a little larger on the wire, but a fraction of the compression time.
+"""
+import gzip
+import hashlib
+
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# (gzip level, brotli quality) for payloads built ahead of time and for
+# payloads built during a request
+STATIC_LEVELS = (9, 11)
+DYNAMIC_LEVELS = (5, 4)
+
+
+def compress_gzip(body, level=STATIC_LEVELS[0]):
+    """Return the gzip encoding of body"""
+    # mtime=0 keeps the gzip bytes identical across restarts and builds
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_brotli(body, quality=STATIC_LEVELS[1]):
+    """Return the brotli encoding of body, or None if brotli is not installed"""
+    return brotli.compress(body, quality=quality) if brotli is not None else None
+
+
+class PrecompressedPayload:
+    """An immutable response body with its compressed variants and ETag"""
+    __slots__ = ("body", "gzip_body", "br_body", "etag", "content_type", "cache_control")
+
+    def __init__(self, body, content_type, cache_control="public, max-age=300",
+                 gzip_body=None, br_body=None, dynamic=False):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        gzip_level, brotli_quality = DYNAMIC_LEVELS if dynamic else STATIC_LEVELS
+        # Bodies compressed ahead of time (e.g. by build_assets.py) are used as given
+        self.gzip_body = gzip_body if gzip_body is not None else compress_gzip(body, gzip_level)
+        if br_body is None and brotli is not None:
+            br_body = compress_brotli(body, brotli_quality)
+        self.br_body = br_body
+
+    def respond(self, status=200, cache_control=None):
+        """Build a response for the current request"""
+        headers = {
+            "Cache-Control": cache_control or self.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+        if request.if_none_match.contains(self.etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(self.etag)
+            return response
+
+        body = self.body
+        accepted = request.accept_encodings
+        if self.br_body is not None and accepted["br"]:
+            body = self.br_body
+            headers["Content-Encoding"] = "br"
+        elif accepted["gzip"]:
+            body = self.gzip_body
+            headers["Content-Encoding"] = "gzip"
+
+        response = Response(body, status=status, content_type=self.content_type, headers=headers)
+        response.set_etag(self.etag)
+        return response
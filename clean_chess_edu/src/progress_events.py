@@ -0,0 +1,267 @@
+"""Live progress updates pushed to open pages as Server-Sent Events.
+
+A stream (``/progress/stream``) starts with a ``snapshot`` event holding the
+learner's whole progress document and then carries one ``progress`` event
+per saved edit, with only the keys that changed, plus an ``achievement``
+event for every achievement the edit unlocked. Events are built once, when
+the progress store saves an edit (see ``ProgressStore.on_change``), and
+handed to whatever serves the streams:
+
+* ``ProgressBroker`` fans them out in-process. Flask's development server
+  uses it directly, one thread per open stream.
+* ``DatagramPublisher`` forwards them over a Unix datagram socket to
+  ``sse_server.py``, an asyncio server that holds any number of idle
+  streams for all the worker processes of a production deployment.
+
+Most edits happen with no page listening, so neither builds the events for
+a learner without open streams. ``sse_server.py`` counts its open streams
+in ``SubscriberPresence``, a small memory-mapped table next to the socket
+that the worker processes read.
+"""
+import errno
+import json
+import logging
+import mmap
+import os
+import socket
+import threading
+import time
+import zlib
+
+# Where sse_server.py listens for events from the app's worker processes
+DEFAULT_EVENTS_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "instance", "progress-events.sock")
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 25
+# Events a stream may fall behind by before it is closed (the browser
+# reconnects and starts over from a snapshot)
+MAX_PENDING_EVENTS = 256
+# Slots in the SubscriberPresence table; learners whose ids hash to the same
+# slot share it, which only costs an occasional event nobody listens to
+PRESENCE_SLOTS = 1 << 16
+# Seconds between looks for the presence table while sse_server.py is not running
+PRESENCE_RETRY_INTERVAL = 5
+
+log = logging.getLogger(__name__)
+
+
+def format_event(event, data, event_id=None):
+    """Return one SSE message"""
+    message = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+
+def snapshot_event(progress):
+    return format_event("snapshot", progress.to_dict(), progress.version)
+
+
+def resync_event(progress):
+    """Return a progress message telling pages to fetch the whole document
+    (for an edit whose changes are too large to forward)"""
+    return format_event("progress", {"version": progress.version, "resync": True}, progress.version)
+
+
+def change_events(previous, progress):
+    """Return the messages describing the edit from previous (None for a new learner) to progress"""
+    before = previous.to_dict() if previous is not None else {}
+    after = progress.to_dict()
+    changes = {key: value for key, value in after.items() if before.get(key) != value}
+    messages = [format_event("progress", {
+        "version": progress.version,
+        "previousVersion": previous.version if previous is not None else 0,
+        "changes": changes
+    }, progress.version)]
+    earned = {achievement["id"] for achievement in before.get("achievements", ())}
+    for achievement in after["achievements"]:
+        if achievement["id"] not in earned:
+            messages.append(format_event("achievement", achievement))
+    return messages
+
+
+def presence_path(events_socket):
+    """Return where sse_server.py keeps the SubscriberPresence table for events_socket"""
+    return events_socket + ".subscribers"
+
+
+class SubscriberPresence:
+    """Counts of open streams per learner, shared with other processes
+
+    The counts live in a memory-mapped file of PRESENCE_SLOTS 32-bit
+    counters indexed by a hash of the learner id. sse_server.py creates it
+    (``create``) and counts streams as they open and close; worker processes
+    map it read-only (``open``) to see whether anyone listens to a learner.
+    """
+
+    def __init__(self, path, writable):
+        self.path = path
+        size = PRESENCE_SLOTS * 4
+        if writable:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        self._counts = memoryview(self._map).cast("I")
+
+    @classmethod
+    def create(cls, path):
+        """Create (or reset) the table at path for counting streams"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        presence = cls(path, writable=True)
+        # Reset in place: workers may still have a previous run's table mapped
+        presence.clear()
+        return presence
+
+    @classmethod
+    def open(cls, path):
+        """Map the table at path for reading, or return None if there is none"""
+        try:
+            return cls(path, writable=False)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _slot(learner_id):
+        return zlib.crc32(learner_id.encode("utf-8")) % PRESENCE_SLOTS
+
+    def add(self, learner_id):
+        self._counts[self._slot(learner_id)] += 1
+
+    def discard(self, learner_id):
+        slot = self._slot(learner_id)
+        if self._counts[slot]:
+            self._counts[slot] -= 1
+
+    def clear(self):
+        self._map[:] = bytes(len(self._map))
+
+    def __contains__(self, learner_id):
+        return self._counts[self._slot(learner_id)] > 0
+
+
+class Subscription:
+    """One open stream: a queue of messages and whether it fell too far behind"""
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.overflowed = False
+
+
+class ProgressBroker:
+    """Fans a learner's events out to every stream the learner has open
+
+    Subscriptions wrap a ``queue.Queue`` (for threads) or an
+    ``asyncio.Queue`` (when publishing from that queue's event loop).
+    """
+
+    def __init__(self, presence=None):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        # SubscriberPresence that other processes read, if any
+        self.presence = presence
+
+    def subscribe(self, learner_id, queue):
+        subscription = Subscription(queue)
+        with self._lock:
+            self._subscriptions.setdefault(learner_id, set()).add(subscription)
+            if self.presence is not None:
+                self.presence.add(learner_id)
+        return subscription
+
+    def unsubscribe(self, learner_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(learner_id)
+            if subscriptions is not None and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[learner_id]
+                if self.presence is not None:
+                    self.presence.discard(learner_id)
+
+    def has_subscribers(self, learner_id):
+        return learner_id in self._subscriptions
+
+    def publish(self, learner_id, messages):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(learner_id, ()))
+        for subscription in subscriptions:
+            for message in messages:
+                if subscription.queue.qsize() >= MAX_PENDING_EVENTS:
+                    subscription.overflowed = True
+                    self.unsubscribe(learner_id, subscription)
+                    break
+                subscription.queue.put_nowait(message)
+
+    def on_change(self, learner_id, previous, progress):
+        """ProgressStore.on_change hook: publish the edit to the learner's open streams"""
+        # Most edits happen with no page listening, so skip building the events
+        if self.has_subscribers(learner_id):
+            self.publish(learner_id, change_events(previous, progress))
+
+
+class DatagramPublisher:
+    """Sends events to sse_server.py over a Unix datagram socket
+
+    Edits of learners without an open stream (by sse_server.py's
+    SubscriberPresence) are not sent, or even serialized. Sending never
+    blocks a request: if no server is listening, or its buffer is full, the
+    events are dropped and open pages pick the change up from the next
+    event's version gap. Events too large for one datagram are replaced by
+    a resync event, after which pages fetch their whole progress. ``dropped``
+    and ``oversized`` count both cases.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._presence = None
+        self._presence_checked = float("-inf")
+        self.dropped = 0
+        self.oversized = 0
+
+    def has_subscribers(self, learner_id):
+        if self._presence is None:
+            now = time.monotonic()
+            if now - self._presence_checked < PRESENCE_RETRY_INTERVAL:
+                return False
+            self._presence_checked = now
+            self._presence = SubscriberPresence.open(presence_path(self.path))
+            if self._presence is None:
+                return False
+        return learner_id in self._presence
+
+    def _send(self, learner_id, messages):
+        try:
+            self._socket.sendto((learner_id + "\n" + "".join(messages)).encode("utf-8"), self.path)
+        except OSError as error:
+            if error.errno == errno.EMSGSIZE:
+                raise
+            self.dropped += 1
+
+    def on_change(self, learner_id, previous, progress):
+        """ProgressStore.on_change hook: forward the edit to the event server"""
+        if not self.has_subscribers(learner_id):
+            return
+        try:
+            self._send(learner_id, change_events(previous, progress))
+        except OSError:
+            self.oversized += 1
+            log.warning("Progress events for version %d are too large for a datagram; sending a resync",
+                        progress.version)
+            try:
+                self._send(learner_id, [resync_event(progress)])
+            except OSError:
+                self.dropped += 1
+
+
+def parse_datagram(data):
+    """Split a datagram from DatagramPublisher into (learner id, messages)"""
+    learner_id, _, body = data.decode("utf-8").partition("\n")
+    return learner_id, [message + "\n\n" for message in body.split("\n\n") if message]
@@ -0,0 +1,236 @@
+"""Indexed in-memory representation of a learner's progress.
+
+Handlers work on ``LearnerProgress`` objects, whose collections are dicts
+keyed by id (insertion-ordered, so they double as ordered sets). Lookups
+and duplicate checks are O(1) regardless of how many lessons, objectives
+or achievements a learner has. The JSON document the frontend expects is
+produced only at the response/storage boundary by ``to_dict()``.
+"""
+from datetime import date, timedelta
+
+
+class ExerciseCompletion:
+    """Completion record for a single exercise"""
+    __slots__ = ("exercise_id", "completed", "timestamp")
+
+    def __init__(self, exercise_id, completed=True, timestamp=""):
+        self.exercise_id = exercise_id
+        self.completed = completed
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {"id": self.exercise_id, "completed": self.completed, "timestamp": self.timestamp}
+
+
+class LessonCompletion:
+    """Completion record for a lesson and the exercises done within it"""
+    __slots__ = ("lesson_id", "completed", "timestamp", "exercises")
+
+    def __init__(self, lesson_id, completed=False, timestamp="", exercises=None):
+        self.lesson_id = lesson_id
+        self.completed = completed
+        self.timestamp = timestamp
+        # None means the record has no "exercises" list at all (lesson-level completion)
+        self.exercises = exercises
+
+    def complete_exercise(self, exercise_id, timestamp=""):
+        """Mark an exercise as completed; return True if it was not completed before"""
+        if self.exercises is None:
+            self.exercises = {}
+        exercise = self.exercises.get(exercise_id)
+        if exercise is None:
+            self.exercises[exercise_id] = ExerciseCompletion(exercise_id, True, timestamp)
+            return True
+        newly_completed = not exercise.completed
+        exercise.completed = True
+        return newly_completed
+
+    def has_completed_exercise(self, exercise_id):
+        exercise = self.exercises.get(exercise_id) if self.exercises else None
+        return exercise is not None and bool(exercise.completed)
+
+    def copy(self):
+        exercises = None
+        if self.exercises is not None:
+            exercises = {ex_id: ExerciseCompletion(ex.exercise_id, ex.completed, ex.timestamp)
+                         for ex_id, ex in self.exercises.items()}
+        return LessonCompletion(self.lesson_id, self.completed, self.timestamp, exercises)
+
+    def to_dict(self):
+        record = {"lessonId": self.lesson_id, "completed": self.completed}
+        if self.exercises is not None:
+            record["exercises"] = [ex.to_dict() for ex in self.exercises.values()]
+        record["timestamp"] = self.timestamp
+        return record
+
+    @classmethod
+    def from_dict(cls, record):
+        exercises = None
+        if "exercises" in record:
+            exercises = {}
+            for ex in record.get("exercises") or []:
+                exercises[ex.get("id")] = ExerciseCompletion(
+                    ex.get("id"), ex.get("completed", False), ex.get("timestamp", ""))
+        return cls(record.get("lessonId"), record.get("completed", False),
+                   record.get("timestamp", ""), exercises)
+
+
+class LearnerProgress:
+    """A learner's progress with dict/set indexes over every collection"""
+    __slots__ = ("lessons", "completed_lessons", "achievements",
+                 "completed_objectives", "current_streak", "last_active_day", "version", "extra")
+
+    def __init__(self):
+        # lessonId -> LessonCompletion, in the order lessons were first touched
+        self.lessons = {}
+        # Ordered sets (dicts with None values) of lesson ids and "lessonId_objectiveIndex" keys
+        self.completed_lessons = {}
+        self.completed_objectives = {}
+        # achievement id -> {"id", "title", "description"}
+        self.achievements = {}
+        # Consecutive UTC days with a completion, up to last_active_day (ISO date, "" if never)
+        self.current_streak = 0
+        self.last_active_day = ""
+        # Bumped by the progress store on every saved change
+        self.version = 0
+        # Unknown top-level keys sent by clients, passed through unchanged
+        self.extra = {}
+
+    def lesson(self, lesson_id):
+        """Return the lesson's completion record, or None"""
+        return self.lessons.get(lesson_id)
+
+    def ensure_lesson(self, lesson_id, timestamp="", with_exercises=False):
+        """Return the lesson's completion record, creating it if needed"""
+        completion = self.lessons.get(lesson_id)
+        if completion is None:
+            completion = LessonCompletion(lesson_id, False, timestamp, {} if with_exercises else None)
+            self.lessons[lesson_id] = completion
+        return completion
+
+    def mark_lesson_completed(self, lesson_id):
+        """Add a lesson to the completed set; return True if it is new"""
+        if lesson_id in self.completed_lessons:
+            return False
+        self.completed_lessons[lesson_id] = None
+        return True
+
+    def complete_objective(self, obj_key):
+        """Add an objective to the completed set; return True if it is new"""
+        if obj_key in self.completed_objectives:
+            return False
+        self.completed_objectives[obj_key] = None
+        return True
+
+    def has_achievement(self, achievement_id):
+        return achievement_id in self.achievements
+
+    def award(self, achievement):
+        """Award an achievement; return True if the learner did not have it yet"""
+        if achievement["id"] in self.achievements:
+            return False
+        self.achievements[achievement["id"]] = {
+            "id": achievement["id"],
+            "title": achievement["title"],
+            "description": achievement["description"]
+        }
+        return True
+
+    def record_activity(self, day):
+        """Count a day of activity (ISO date) towards the streak; return True if it changed
+
+        The day after the last active day extends the streak, a later day
+        starts a new one, and the last active day itself or an earlier one
+        changes nothing.
+        """
+        last = self.last_active_day
+        if last and day <= last:
+            return False
+        if last and date.fromisoformat(day) - date.fromisoformat(last) == timedelta(days=1):
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+        self.last_active_day = day
+        return True
+
+    def apply_patch(self, patch):
+        """Merge a client patch into this progress
+
+        Lesson records in "completedLessons" are upserted by lessonId (their
+        exercises by id), ids in "completed_lessons" and "completedObjectives"
+        are added, and unknown keys replace the stored value. Achievements
+        and streaks are only ever updated by the server.
+        """
+        for record in patch.get("completedLessons") or []:
+            incoming = LessonCompletion.from_dict(record)
+            completion = self.lessons.get(incoming.lesson_id)
+            if completion is None:
+                self.lessons[incoming.lesson_id] = incoming
+                continue
+            completion.completed = completion.completed or incoming.completed
+            if incoming.timestamp:
+                completion.timestamp = incoming.timestamp
+            for exercise_id, exercise in (incoming.exercises or {}).items():
+                if exercise.completed:
+                    completion.complete_exercise(exercise_id, exercise.timestamp)
+        for lesson_id in patch.get("completed_lessons") or []:
+            self.mark_lesson_completed(lesson_id)
+        for obj_key in patch.get("completedObjectives") or []:
+            self.complete_objective(obj_key)
+        for key, value in patch.items():
+            if key not in PROGRESS_KEYS:
+                self.extra[key] = value
+
+    def copy(self):
+        """Return an independent copy (cheaper than copy.deepcopy)"""
+        clone = LearnerProgress()
+        clone.lessons = {lesson_id: completion.copy() for lesson_id, completion in self.lessons.items()}
+        clone.completed_lessons = dict(self.completed_lessons)
+        clone.completed_objectives = dict(self.completed_objectives)
+        clone.achievements = {a_id: dict(a) for a_id, a in self.achievements.items()}
+        clone.current_streak = self.current_streak
+        clone.last_active_day = self.last_active_day
+        clone.version = self.version
+        clone.extra = dict(self.extra)
+        return clone
+
+    def to_dict(self):
+        """Serialize to the JSON document shape used by the frontend"""
+        document = dict(self.extra)
+        document.update({
+            "completedLessons": [completion.to_dict() for completion in self.lessons.values()],
+            "completed_lessons": list(self.completed_lessons),
+            "achievements": list(self.achievements.values()),
+            "completedObjectives": list(self.completed_objectives),
+            "current_streak": self.current_streak,
+            "last_active_day": self.last_active_day,
+            "version": self.version
+        })
+        return document
+
+    @classmethod
+    def from_dict(cls, document):
+        """Build a LearnerProgress from a (possibly partial) JSON document"""
+        progress = cls()
+        for record in document.get("completedLessons") or []:
+            completion = LessonCompletion.from_dict(record)
+            progress.lessons[completion.lesson_id] = completion
+        progress.completed_lessons = dict.fromkeys(document.get("completed_lessons") or [])
+        progress.completed_objectives = dict.fromkeys(document.get("completedObjectives") or [])
+        for achievement in document.get("achievements") or []:
+            if isinstance(achievement, dict) and "id" in achievement:
+                progress.achievements[achievement["id"]] = achievement
+        progress.current_streak = document.get("current_streak", 0)
+        progress.last_active_day = document.get("last_active_day", "")
+        progress.version = document.get("version", 0)
+        progress.extra = {key: value for key, value in document.items() if key not in PROGRESS_KEYS}
+        return progress
+
+
+# Top-level keys of the progress document that LearnerProgress models explicitly
+PROGRESS_KEYS = frozenset(["completedLessons", "completed_lessons", "achievements",
+                           "completedObjectives", "current_streak", "last_active_day", "version"])
+
+# Patch keys that only ever add to a collection, so they merge cleanly even when
+# the patch was made against an older version
+MERGEABLE_PATCH_KEYS = frozenset(["completedLessons", "completed_lessons", "completedObjectives"])
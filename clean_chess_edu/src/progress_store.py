@@ -0,0 +1,355 @@
+"""Per-learner progress storage for the ChessEdu app.
+
+Every learner (identified by the id kept in their session cookie) gets their
+own ``LearnerProgress`` (see progress_model.py). Stores hand progress out
+copy-on-write: ``edit()`` yields a private copy under a per-learner lock and
+only publishes it (to the cache and to disk) when the block finishes without
+raising, so concurrent writers never see or corrupt a half-updated list.
+
+When several worker processes serve the app (see wsgi.py), open the SQLite
+store with ``shared=True``: edits then run inside an immediate SQLite
+transaction, which serializes writers across processes, and cached
+documents are checked against the version stored in the database before
+use, so one worker never serves progress that another has since changed.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+
+from progress_model import LearnerProgress
+
+
+def new_progress():
+    """Return empty progress for a new learner"""
+    return LearnerProgress()
+
+
+def encode_progress(progress):
+    return json.dumps(progress.to_dict(), separators=(",", ":"))
+
+
+def decode_progress(data):
+    return LearnerProgress.from_dict(json.loads(data))
+
+
+class ProgressConflict(Exception):
+    """Raised inside ``edit()`` to abandon a change made against a stale version"""
+
+    def __init__(self, progress):
+        super().__init__(f"progress is at version {progress.version}")
+        self.progress = progress
+
+
+class ProgressStore:
+    """Base class for progress stores keyed by learner id"""
+
+    def __init__(self, lock_stripes=256):
+        # Striped locks keep memory bounded no matter how many learners exist
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        # Called as on_change(learner_id, previous, progress) after each edit is
+        # saved, still under the learner's lock so calls arrive in version order
+        self.on_change = None
+
+    def _lock_for(self, learner_id):
+        return self._locks[hash(learner_id) % len(self._locks)]
+
+    @contextmanager
+    def _locks_for(self, learner_ids):
+        """Hold the locks of every learner in learner_ids"""
+        # Taken in stripe order, so two batches never wait on each other's locks
+        stripes = sorted({hash(learner_id) % len(self._locks) for learner_id in learner_ids})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._locks[stripe])
+            yield
+
+    def get(self, learner_id):
+        """Return the learner's progress (treat it as read-only)"""
+        progress = self._read(learner_id)
+        return progress if progress is not None else new_progress()
+
+    @contextmanager
+    def edit(self, learner_id):
+        """Yield a private copy of the learner's progress and save it as a new version"""
+        with self._lock_for(learner_id):
+            current = self._read(learner_id)
+            progress = current.copy() if current is not None else new_progress()
+            yield progress
+            progress.version = (current.version if current is not None else 0) + 1
+            self._write(learner_id, progress)
+            if self.on_change is not None:
+                self.on_change(learner_id, current, progress)
+
+    def put_many(self, items):
+        """Store many (learner_id, progress) pairs at once"""
+        for learner_id, progress in items:
+            with self._lock_for(learner_id):
+                self._write(learner_id, progress)
+
+    def replace_many(self, items):
+        """Store (learner_id, progress) pairs in place of the learners' progress,
+        each as a new version (set on the progress objects)"""
+        for learner_id, progress in items:
+            with self._lock_for(learner_id):
+                current = self._read(learner_id)
+                progress.version = (current.version if current is not None else 0) + 1
+                self._write(learner_id, progress)
+
+    def scan(self, batch_size=1000):
+        """Yield (learner_id, progress) for every learner, reading batch_size at a time"""
+        raise NotImplementedError
+
+    def count(self):
+        """Return the number of learners with stored progress"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _read(self, learner_id):
+        raise NotImplementedError
+
+    def _write(self, learner_id, progress):
+        raise NotImplementedError
+
+
+class MemoryProgressStore(ProgressStore):
+    """Process-local store, useful for development and benchmarks"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._documents = {}
+
+    def scan(self, batch_size=1000):
+        # Iterating the dict itself would fail once an edit adds a learner, so
+        # only the ids are snapshotted (list() of a dict is atomic under the
+        # GIL); each document is read as it is yielded, as the latest version
+        for learner_id in list(self._documents):
+            progress = self._documents.get(learner_id)
+            if progress is not None:
+                yield learner_id, progress
+
+    def count(self):
+        return len(self._documents)
+
+    def _read(self, learner_id):
+        return self._documents.get(learner_id)
+
+    def _write(self, learner_id, progress):
+        self._documents[learner_id] = progress
+
+
+class SQLiteProgressStore(ProgressStore):
+    """Durable store backed by SQLite with an in-memory write-through cache"""
+
+    def __init__(self, path, cache_size=10000, shared=False, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.cache_size = cache_size
+        self.shared = shared
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            " learner_id TEXT PRIMARY KEY,"
+            " document TEXT NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Databases created before the version column existed
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(progress)")]
+        if "version" not in columns:
+            conn.execute("ALTER TABLE progress ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE progress SET version = json_extract(document, '$.version')"
+                         " WHERE json_extract(document, '$.version') IS NOT NULL")
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _cache_get(self, learner_id):
+        with self._cache_lock:
+            progress = self._cache.get(learner_id)
+            if progress is not None:
+                self._cache.move_to_end(learner_id)
+            return progress
+
+    def _cache_put(self, learner_id, progress):
+        with self._cache_lock:
+            self._cache[learner_id] = progress
+            self._cache.move_to_end(learner_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _read(self, learner_id):
+        progress = self._cache_get(learner_id)
+        if progress is not None and not self.shared:
+            return progress
+
+        conn = self._connection()
+        if progress is not None:
+            # Another process may have written since this one cached the document;
+            # comparing versions is much cheaper than decoding it again
+            row = conn.execute(
+                "SELECT version FROM progress WHERE learner_id = ?", (learner_id,)
+            ).fetchone()
+            if row is not None and row[0] == progress.version:
+                return progress
+
+        row = conn.execute(
+            "SELECT document FROM progress WHERE learner_id = ?", (learner_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        progress = decode_progress(row[0])
+        self._cache_put(learner_id, progress)
+        return progress
+
+    def _write(self, learner_id, progress):
+        conn = self._connection()
+        with conn:
+            self._insert(conn, learner_id, progress)
+        self._cache_put(learner_id, progress)
+
+    @staticmethod
+    def _insert(conn, learner_id, progress):
+        conn.execute(
+            "INSERT OR REPLACE INTO progress (learner_id, document, version) VALUES (?, ?, ?)",
+            (learner_id, encode_progress(progress), progress.version)
+        )
+
+    def edit(self, learner_id):
+        if not self.shared:
+            return super().edit(learner_id)
+        return self._edit_shared(learner_id)
+
+    @contextmanager
+    def _edit_shared(self, learner_id):
+        # The thread lock orders writers within this process; BEGIN IMMEDIATE
+        # takes SQLite's write lock, so writers in other processes wait for
+        # this read-modify-write to commit before they read
+        with self._lock_for(learner_id):
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._read(learner_id)
+                progress = current.copy() if current is not None else new_progress()
+                yield progress
+                progress.version = (current.version if current is not None else 0) + 1
+                self._insert(conn, learner_id, progress)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self._cache_put(learner_id, progress)
+            if self.on_change is not None:
+                self.on_change(learner_id, current, progress)
+
+    def put_many(self, items, batch_size=5000):
+        conn = self._connection()
+        batch = []
+        for learner_id, progress in items:
+            batch.append((learner_id, encode_progress(progress), progress.version))
+            if len(batch) >= batch_size:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO progress (learner_id, document, version)"
+                        " VALUES (?, ?, ?)", batch)
+                batch = []
+        if batch:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO progress (learner_id, document, version)"
+                    " VALUES (?, ?, ?)", batch)
+        # Bulk writes bypass the cache, so drop anything that may now be stale
+        with self._cache_lock:
+            self._cache.clear()
+
+    def replace_many(self, items):
+        items = dict(items)
+        # The learners' locks keep this process's edits out until the cache no
+        # longer holds the replaced documents (unshared edits trust the cache);
+        # one write transaction keeps other processes' edits out from reading
+        # the current versions to committing the replacements
+        with self._locks_for(items):
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                versions = dict(conn.execute(
+                    "SELECT learner_id, version FROM progress"
+                    " WHERE learner_id IN (SELECT value FROM json_each(?))", (json.dumps(list(items)),)))
+                for learner_id, progress in items.items():
+                    progress.version = versions.get(learner_id, 0) + 1
+                conn.executemany(
+                    "INSERT OR REPLACE INTO progress (learner_id, document, version) VALUES (?, ?, ?)",
+                    [(learner_id, encode_progress(progress), progress.version)
+                     for learner_id, progress in items.items()])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            with self._cache_lock:
+                for learner_id in items:
+                    self._cache.pop(learner_id, None)
+
+    def scan(self, batch_size=1000):
+        # Pages by learner id rather than one long-running SELECT, so no read
+        # transaction stays open while the caller streams the batch out, and
+        # documents bypass the cache so a full scan does not evict it
+        conn = self._connection()
+        after = ""
+        while True:
+            rows = conn.execute(
+                "SELECT learner_id, document FROM progress WHERE learner_id > ?"
+                " ORDER BY learner_id LIMIT ?", (after, batch_size)).fetchall()
+            for learner_id, document in rows:
+                yield learner_id, decode_progress(document)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM progress").fetchone()[0]
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Connection belongs to another (possibly finished) thread
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_progress_store(location, shared=False):
+    """Create a progress store; an empty location or ':memory:' keeps it in memory
+
+    shared=True is for stores used by several processes at once, which
+    needs a database file.
+    """
+    if not location or location == ":memory:":
+        if shared:
+            raise ValueError("Worker processes can't share an in-memory progress store; "
+                             "set CHESSEDU_PROGRESS_DB to a database file")
+        return MemoryProgressStore()
+    return SQLiteProgressStore(location, shared=shared)
@@ -0,0 +1,259 @@
+"""Bulk export and import of learner progress, for moving classes between
+instances and into gradebooks.
+
+    python src/progress_transfer.py export class.ndjson
+    python src/progress_transfer.py export grades.csv --format csv
+    python src/progress_transfer.py import class.ndjson
+
+NDJSON exports hold one ``{"learnerId", "progress"}`` record per line, with
+progress in the document shape of ``/progress``, and are what imports
+read. CSV exports are for gradebooks: one row per learner and lesson with
+the lesson's completion, exercise and objective counts. Both are generated
+lazily from ``ProgressStore.scan()`` in chunks, and imports validate and
+write records in batches, so memory stays bounded however many learners
+there are. The command line works on the database in CHESSEDU_PROGRESS_DB
+(or --db) with the app's curriculum, and reports throughput on stderr.
+
+Imported progress replaces the learner's progress as a new version.
+Records whose lessons, exercises or objectives are not in the curriculum
+are rejected; objectives implied by completed exercises are filled in.
+Review schedules are not part of the export.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import resource
+import sys
+import time
+from datetime import date
+
+from progress_model import LearnerProgress
+
+CSV_COLUMNS = ["learner_id", "lesson_id", "lesson_title", "completed", "completed_at",
+               "exercises_completed", "exercises_total", "objectives_completed", "objectives_total",
+               "current_streak", "last_active_day", "achievements"]
+CHUNK_SIZE = 64 * 1024
+MAX_LEARNER_ID_LENGTH = 128
+MAX_REPORTED_ERRORS = 100
+
+
+class RecordError(ValueError):
+    """An import record that is malformed or does not match the curriculum"""
+
+
+def chunked(pieces, size=CHUNK_SIZE):
+    """Join small strings into chunks of about size characters"""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def export_ndjson(store):
+    """Yield the NDJSON export of every learner's progress in chunks"""
+    return chunked(json.dumps({"learnerId": learner_id, "progress": progress.to_dict()},
+                              separators=(",", ":")) + "\n"
+                   for learner_id, progress in store.scan())
+
+
+def csv_rows(store, lessons):
+    yield CSV_COLUMNS
+    for learner_id, progress in store.scan():
+        for lesson in lessons:
+            lesson_id = lesson["id"]
+            completion = progress.lesson(lesson_id)
+            exercises = lesson.get("interactive_exercises", [])
+            objectives = lesson.get("objectives", [])
+            completed = lesson_id in progress.completed_lessons
+            yield [learner_id, lesson_id, lesson.get("title", ""), int(completed),
+                   completion.timestamp if completed and completion else "",
+                   sum(1 for exercise_id in exercises
+                       if completion and completion.has_completed_exercise(exercise_id)),
+                   len(exercises),
+                   sum(1 for index in range(len(objectives))
+                       if f"{lesson_id}_{index}" in progress.completed_objectives),
+                   len(objectives), progress.current_streak, progress.last_active_day,
+                   len(progress.achievements)]
+
+
+def export_csv(store, lessons):
+    """Yield the CSV gradebook export (one row per learner and lesson) in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def lines():
+        for row in csv_rows(store, lessons):
+            writer.writerow(row)
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            yield line
+
+    return chunked(lines())
+
+
+class ProgressValidator:
+    """Turns imported progress documents into LearnerProgress, checked against the curriculum"""
+
+    def __init__(self, lessons, exercise_to_lesson, exercise_to_objective):
+        self.lesson_ids = {lesson["id"] for lesson in lessons}
+        self.objective_keys = {f"{lesson['id']}_{index}" for lesson in lessons
+                               for index in range(len(lesson.get("objectives", [])))}
+        self.exercise_to_lesson = exercise_to_lesson
+        self.exercise_objectives = {exercise_id: f"{info['lesson_id']}_{info['objective_index']}"
+                                    for exercise_id, info in exercise_to_objective.items()}
+
+    def __call__(self, document):
+        if not isinstance(document, dict):
+            raise RecordError("progress must be an object")
+        try:
+            progress = LearnerProgress.from_dict(document)
+        except (AttributeError, TypeError) as error:
+            raise RecordError(f"malformed progress: {error}")
+
+        for lesson_id, completion in progress.lessons.items():
+            if lesson_id not in self.lesson_ids:
+                raise RecordError(f"unknown lesson {lesson_id!r}")
+            for exercise_id, exercise in (completion.exercises or {}).items():
+                if exercise_id not in self.exercise_to_lesson:
+                    raise RecordError(f"unknown exercise {exercise_id!r}")
+                if self.exercise_to_lesson[exercise_id] != lesson_id:
+                    raise RecordError(f"exercise {exercise_id!r} is not part of lesson {lesson_id!r}")
+                if exercise.completed and exercise_id in self.exercise_objectives:
+                    progress.complete_objective(self.exercise_objectives[exercise_id])
+        unknown = [lesson_id for lesson_id in progress.completed_lessons if lesson_id not in self.lesson_ids]
+        if unknown:
+            raise RecordError(f"unknown completed lesson {unknown[0]!r}")
+        unknown = [key for key in progress.completed_objectives if key not in self.objective_keys]
+        if unknown:
+            raise RecordError(f"unknown objective {unknown[0]!r}")
+
+        streak = progress.current_streak
+        if not isinstance(streak, int) or isinstance(streak, bool) or streak < 0:
+            raise RecordError("current_streak must be a non-negative integer")
+        if progress.last_active_day:
+            try:
+                date.fromisoformat(progress.last_active_day)
+            except (TypeError, ValueError):
+                raise RecordError("last_active_day must be an ISO date")
+        return progress
+
+
+def read_records(lines, validate):
+    """Yield (line number, learner id, progress or RecordError) for each non-blank NDJSON line"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        learner_id = None
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise RecordError("record must be an object")
+            learner_id = record.get("learnerId")
+            if not isinstance(learner_id, str) or not 0 < len(learner_id) <= MAX_LEARNER_ID_LENGTH:
+                raise RecordError(f"learnerId must be a string of 1 to {MAX_LEARNER_ID_LENGTH} characters")
+            yield number, learner_id, validate(record.get("progress"))
+        except (RecordError, ValueError) as error:
+            yield number, learner_id, RecordError(str(error))
+
+
+def import_records(store, lines, validate, batch_size=1000, on_batch=None):
+    """Validate NDJSON lines and write the valid records in batches
+
+    on_batch(items) is called with each batch of (learner id, progress)
+    written. Returns a report of the learners imported, the records
+    rejected (the first few with their line and error) and the time taken.
+    """
+    started = time.perf_counter()
+    imported = rejected = 0
+    errors = []
+    batch = []
+
+    def flush():
+        store.replace_many(batch)
+        if on_batch is not None:
+            on_batch(batch)
+
+    for number, learner_id, result in read_records(lines, validate):
+        if isinstance(result, RecordError):
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": number, "learnerId": learner_id, "error": str(result)})
+            continue
+        batch.append((learner_id, result))
+        if len(batch) >= batch_size:
+            flush()
+            imported += len(batch)
+            batch = []
+    if batch:
+        flush()
+        imported += len(batch)
+    return {"imported": imported, "rejected": rejected, "errors": errors,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import every learner's progress")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="file to write (export) or read (import); - for stdout/stdin")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson", help="export format")
+    parser.add_argument("--db", help="progress database (default: CHESSEDU_PROGRESS_DB or the app's)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="records written per transaction")
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["CHESSEDU_PROGRESS_DB"] = args.db
+    # Other processes may be serving the same database
+    os.environ.setdefault("CHESSEDU_SHARED_STORE", "1")
+    # The app holds the curriculum and the stores; import it once the environment is set
+    import app
+
+    started = time.perf_counter()
+    if args.command == "export":
+        chunks = (export_csv(app.progress_store, app.LESSONS) if args.format == "csv"
+                  else export_ndjson(app.progress_store))
+        output = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        learners = app.progress_store.count()
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - started
+        print(f"Exported {learners:,} learners ({written / 1e6:.1f} MB of {args.format}) in {elapsed:.1f}s: "
+              f"{learners / max(elapsed, 1e-9):,.0f} learners/s, peak memory {peak_memory_mb():.0f} MB",
+              file=sys.stderr)
+        return 0
+
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        report = import_records(app.progress_store, source, app.validate_progress, args.batch_size,
+                                app.record_imported_progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    for error in report["errors"]:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(f"Imported {report['imported']:,} learners ({report['rejected']:,} records rejected) in "
+          f"{report['seconds']:.1f}s: {report['imported'] / max(report['seconds'], 1e-9):,.0f} learners/s, "
+          f"peak memory {peak_memory_mb():.0f} MB", file=sys.stderr)
+    return 1 if report["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
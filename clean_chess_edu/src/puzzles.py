@@ -0,0 +1,180 @@
+"""Compact on-disk puzzle index, memory-mapped for serving.
+
+The file written by ``mine_tactics.py`` is laid out as::
+
+    header      magic b"CEPZ", format version, record size, bucket count
+    buckets     (theme, piece, difficulty, first record, record count) each
+    records     fixed-width puzzles, sorted so every bucket is contiguous
+
+A record packs the position before the solution (4 bits per square, side
+to move, castling rights, en passant square, clocks) and the solution move.
+Because records are fixed-width and buckets contiguous, a random puzzle for
+any theme/piece/difficulty filter is one bucket lookup and one slice of the
+mapped file, however many puzzles the index holds.
+"""
+import mmap
+import os
+import random
+import struct
+
+from chess_core import CASTLING_SYMBOLS, move_to_uci, PIECE_SYMBOLS, square_name
+from tactics import DIFFICULTIES, PIECE_NAMES, THEMES
+
+MAGIC = b"CEPZ"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+BUCKET = struct.Struct("<BBBxII")
+# Board nibbles, side | castling << 1, en passant square (64 = none), halfmove clock,
+# move (from, to and promotion bits only) and fullmove number
+RECORD = struct.Struct("<32sBBBHH")
+NO_EP_SQUARE = 64
+
+
+def pack_puzzle(position, move):
+    """Pack the position before the solution and the solution move into a record"""
+    nibbles = bytearray(32)
+    for index, bitboard in enumerate(position.pieces):
+        remaining = bitboard
+        while remaining:
+            low = remaining & -remaining
+            square = low.bit_length() - 1
+            # 0 is an empty square, 1-12 are the pieces in Position.pieces order
+            nibbles[square >> 1] |= (index + 1) << (4 * (square & 1))
+            remaining ^= low
+    ep = NO_EP_SQUARE if position.ep_square is None else position.ep_square
+    return RECORD.pack(bytes(nibbles), position.side | position.castling << 1, ep,
+                       min(position.halfmove, 255), move & 0x7FFF, min(position.fullmove, 0xFFFF))
+
+
+def unpack_fen(record):
+    """Return (FEN, solution move) for a packed record"""
+    nibbles, flags, ep, halfmove, move, fullmove = RECORD.unpack(record)
+    rows = []
+    for rank in range(7, -1, -1):
+        row, empty = "", 0
+        for file in range(8):
+            square = rank * 8 + file
+            code = (nibbles[square >> 1] >> (4 * (square & 1))) & 0xF
+            if not code:
+                empty += 1
+                continue
+            if empty:
+                row, empty = row + str(empty), 0
+            color, piece_type = divmod(code - 1, 6)
+            symbol = PIECE_SYMBOLS[piece_type]
+            row += symbol.upper() if color == 0 else symbol
+        rows.append(row + (str(empty) if empty else ""))
+    castling = "".join(symbol for bit, symbol in CASTLING_SYMBOLS if (flags >> 1) & bit) or "-"
+    ep_name = square_name(ep) if ep != NO_EP_SQUARE else "-"
+    fen = f"{'/'.join(rows)} {'wb'[flags & 1]} {castling} {ep_name} {halfmove} {fullmove}"
+    return fen, move
+
+
+def bucket_key(theme, piece, level):
+    """Return the (theme, piece, difficulty) codes stored in the index"""
+    return THEMES.index(theme), PIECE_NAMES.index(piece), level
+
+
+def write_index(path, puzzles):
+    """Write (theme, piece, difficulty, record) tuples as an index file
+
+    The file is written next to path and renamed into place, so a running
+    app that has the old index mapped keeps a consistent view of it.
+    """
+    grouped = {}
+    for theme, piece, level, record in puzzles:
+        grouped.setdefault(bucket_key(theme, piece, level), []).append(record)
+
+    buckets = []
+    start = 0
+    for key in sorted(grouped):
+        buckets.append((*key, start, len(grouped[key])))
+        start += len(grouped[key])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, len(buckets)))
+        for bucket in buckets:
+            f.write(BUCKET.pack(*bucket))
+        for key in sorted(grouped):
+            f.write(b"".join(grouped[key]))
+    os.replace(temp_path, path)
+    return start
+
+
+class PuzzleIndex:
+    """A read-only, memory-mapped puzzle index"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, bucket_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a puzzle index this version can read")
+        self.buckets = [BUCKET.unpack_from(self._map, HEADER.size + i * BUCKET.size)
+                        for i in range(bucket_count)]
+        self._records_offset = HEADER.size + bucket_count * BUCKET.size
+        self.count = sum(bucket[4] for bucket in self.buckets)
+
+    def _matching(self, theme=None, piece=None, level=None):
+        theme_code = THEMES.index(theme) if theme is not None else None
+        piece_code = PIECE_NAMES.index(piece) if piece is not None else None
+        return [bucket for bucket in self.buckets
+                if (theme_code is None or bucket[0] == theme_code)
+                and (piece_code is None or bucket[1] == piece_code)
+                and (level is None or bucket[2] == level)]
+
+    def puzzle(self, puzzle_id):
+        """Return puzzle puzzle_id as a dict, or None if there is no such puzzle"""
+        if not 0 <= puzzle_id < self.count:
+            return None
+        theme, piece, level = next((bucket[0], bucket[1], bucket[2]) for bucket in self.buckets
+                                   if bucket[3] <= puzzle_id < bucket[3] + bucket[4])
+        offset = self._records_offset + puzzle_id * RECORD.size
+        fen, move = unpack_fen(self._map[offset:offset + RECORD.size])
+        return {
+            "id": puzzle_id,
+            "fen": fen,
+            "solution": [move_to_uci(move)],
+            "theme": THEMES[theme],
+            "piece": PIECE_NAMES[piece],
+            "difficulty": level
+        }
+
+    def sample(self, theme=None, piece=None, level=None, count=1, rng=random):
+        """Return up to count distinct random puzzles matching the filters"""
+        buckets = self._matching(theme, piece, level)
+        total = sum(bucket[4] for bucket in buckets)
+        puzzles = []
+        for position in rng.sample(range(total), min(count, total)):
+            # Map the position within the filtered puzzles onto a record id
+            for bucket in buckets:
+                if position < bucket[4]:
+                    puzzles.append(self.puzzle(bucket[3] + position))
+                    break
+                position -= bucket[4]
+        return puzzles
+
+    def close(self):
+        self._map.close()
+
+
+def open_puzzle_index(path):
+    """Open the index at path, or return None if it has not been built"""
+    if not os.path.exists(path):
+        return None
+    return PuzzleIndex(path)
+
+
+def filter_error(theme, piece, level):
+    """Return an error message for unknown filter values, or None"""
+    if theme is not None and theme not in THEMES:
+        return f"Unknown theme '{theme}' (expected one of {', '.join(THEMES)})"
+    if piece is not None and piece not in PIECE_NAMES:
+        return f"Unknown piece '{piece}' (expected one of {', '.join(PIECE_NAMES)})"
+    if level is not None and level not in DIFFICULTIES:
+        return f"Unknown difficulty '{level}' (expected one of {', '.join(map(str, DIFFICULTIES))})"
+    return None
@@ -0,0 +1,263 @@
+"""Spaced-repetition review schedule for completed exercises.
+
+Every exercise a learner completes becomes a review item scheduled with
+SM-2: each completion is graded 0-5 ("quality", 4 unless the client says
+otherwise); a grade of 3 or more stretches the interval (1 day, 6 days, then
+the previous interval times the item's easiness factor) and a lower grade
+starts the item over at one day. Easiness moves with every grade and never
+drops below 1.3. Completing an exercise again before it is due only
+counts if it fails, so repeating it right away does not stretch the
+interval.
+
+Stores keep each learner's items together with the learner's next due
+time, and order learners by that time: ``due()`` reads one learner's items
+(a handful, one per exercise in the curriculum), and ``due_learners()``
+walks learners in due order, so both stay O(log n) in the number of
+learners however many items are scheduled. ``MemoryReviewStore`` orders
+learners with a heap; ``SQLiteReviewStore`` keeps the schedule next to the
+progress table with an index on the next due time, so every worker process
+sees the same queue.
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+DAY_MS = 86400 * 1000
+DEFAULT_QUALITY = 4
+MIN_EASINESS = 1.3
+INITIAL_EASINESS = 2.5
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class ReviewItem:
+    """SM-2 state of one exercise for one learner"""
+    __slots__ = ("exercise_id", "easiness", "interval", "repetitions", "due")
+
+    def __init__(self, exercise_id, easiness=INITIAL_EASINESS, interval=0.0, repetitions=0, due=0):
+        self.exercise_id = exercise_id
+        self.easiness = easiness
+        # Days between the last review and the next one
+        self.interval = interval
+        self.repetitions = repetitions
+        # Milliseconds since the epoch
+        self.due = due
+
+
+def review(item, quality, now):
+    """Apply a completion graded quality (0-5) at now to item, in place"""
+    if item.repetitions and now < item.due and quality >= 3:
+        return item
+    if quality >= 3:
+        if item.repetitions == 0:
+            item.interval = 1.0
+        elif item.repetitions == 1:
+            item.interval = 6.0
+        else:
+            item.interval = round(item.interval * item.easiness, 2)
+        item.repetitions += 1
+    else:
+        item.repetitions = 0
+        item.interval = 1.0
+    item.easiness = max(MIN_EASINESS, item.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    item.due = now + int(item.interval * DAY_MS)
+    return item
+
+
+class MemoryReviewStore:
+    """Review schedule kept in memory (lost on restart)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # learner id -> {exercise id: ReviewItem}
+        self._items = {}
+        # learner id -> due time of their earliest item
+        self._next_due = {}
+        # (next due, learner id); entries whose time no longer matches
+        # _next_due are stale and skipped
+        self._queue = []
+
+    def record(self, learner_id, exercise_id, quality=DEFAULT_QUALITY, now=None):
+        """Schedule the next review after a completion; return the item"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            items = self._items.setdefault(learner_id, {})
+            item = items.get(exercise_id)
+            if item is None:
+                item = items[exercise_id] = ReviewItem(exercise_id)
+            review(item, quality, now)
+            next_due = min(other.due for other in items.values())
+            if self._next_due.get(learner_id) != next_due:
+                self._next_due[learner_id] = next_due
+                heapq.heappush(self._queue, (next_due, learner_id))
+                # Rebuild once stale entries outnumber live ones
+                if len(self._queue) > 2 * len(self._next_due) + 64:
+                    self._queue = [(due, learner) for learner, due in self._next_due.items()]
+                    heapq.heapify(self._queue)
+            return item
+
+    def due(self, learner_id, now=None):
+        """Return the learner's items due at now, earliest first"""
+        now = now_ms() if now is None else now
+        with self._lock:
+            if self._next_due.get(learner_id, now + 1) > now:
+                return []
+            return sorted((item for item in self._items[learner_id].values() if item.due <= now),
+                          key=lambda item: item.due)
+
+    def next_due(self, learner_id):
+        """Return when the learner's earliest review is due, or None"""
+        with self._lock:
+            return self._next_due.get(learner_id)
+
+    def due_learners(self, now=None, limit=100):
+        """Return (learner id, earliest due time) of up to limit learners with
+        reviews due at now, most overdue first"""
+        now = now_ms() if now is None else now
+        learners = []
+        with self._lock:
+            queue = self._queue
+            # Visit the heap in order without popping it: a frontier of heap
+            # positions ordered by their entries
+            frontier = [(queue[0], 0)] if queue else []
+            seen = set()
+            while frontier and len(learners) < limit:
+                (due, learner_id), position = heapq.heappop(frontier)
+                if due > now:
+                    break
+                if self._next_due.get(learner_id) == due and learner_id not in seen:
+                    seen.add(learner_id)
+                    learners.append((learner_id, due))
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(queue):
+                        heapq.heappush(frontier, (queue[child], child))
+        return learners
+
+    def count(self):
+        """Return (learners, items) scheduled"""
+        with self._lock:
+            return len(self._items), sum(len(items) for items in self._items.values())
+
+    def close(self):
+        pass
+
+
+class SQLiteReviewStore:
+    """Review schedule in SQLite, safe to share between worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS review_items ("
+            " learner_id TEXT NOT NULL,"
+            " exercise_id TEXT NOT NULL,"
+            " easiness REAL NOT NULL,"
+            " interval REAL NOT NULL,"
+            " repetitions INTEGER NOT NULL,"
+            " due INTEGER NOT NULL,"
+            " PRIMARY KEY (learner_id, exercise_id)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS review_queue ("
+            " learner_id TEXT PRIMARY KEY,"
+            " next_due INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS review_queue_next_due ON review_queue (next_due)")
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def record(self, learner_id, exercise_id, quality=DEFAULT_QUALITY, now=None):
+        """Schedule the next review after a completion; return the item"""
+        now = now_ms() if now is None else now
+        conn = self._connection()
+        # Take the write lock first, so concurrent completions apply in turn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT easiness, interval, repetitions, due FROM review_items"
+                " WHERE learner_id = ? AND exercise_id = ?", (learner_id, exercise_id)).fetchone()
+            item = review(ReviewItem(exercise_id, *row) if row else ReviewItem(exercise_id), quality, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO review_items VALUES (?, ?, ?, ?, ?, ?)",
+                (learner_id, exercise_id, item.easiness, item.interval, item.repetitions, item.due))
+            conn.execute(
+                "INSERT OR REPLACE INTO review_queue"
+                " SELECT learner_id, MIN(due) FROM review_items WHERE learner_id = ?", (learner_id,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return item
+
+    def _select_items(self, learner_id, due_by=None):
+        query = ("SELECT exercise_id, easiness, interval, repetitions, due FROM review_items"
+                 " WHERE learner_id = ?")
+        parameters = (learner_id,)
+        if due_by is not None:
+            query += " AND due <= ?"
+            parameters += (due_by,)
+        rows = self._connection().execute(query + " ORDER BY due", parameters).fetchall()
+        return [ReviewItem(*row) for row in rows]
+
+    def due(self, learner_id, now=None):
+        """Return the learner's items due at now, earliest first"""
+        return self._select_items(learner_id, now_ms() if now is None else now)
+
+    def next_due(self, learner_id):
+        """Return when the learner's earliest review is due, or None"""
+        row = self._connection().execute(
+            "SELECT next_due FROM review_queue WHERE learner_id = ?", (learner_id,)).fetchone()
+        return row[0] if row else None
+
+    def due_learners(self, now=None, limit=100):
+        """Return (learner id, earliest due time) of up to limit learners with
+        reviews due at now, most overdue first"""
+        rows = self._connection().execute(
+            "SELECT learner_id, next_due FROM review_queue WHERE next_due <= ?"
+            " ORDER BY next_due LIMIT ?", (now_ms() if now is None else now, limit)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def count(self):
+        """Return (learners, items) scheduled"""
+        conn = self._connection()
+        return (conn.execute("SELECT COUNT(*) FROM review_queue").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM review_items").fetchone()[0])
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Connection belongs to another (possibly finished) thread
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_review_store(location):
+    """Create a review store next to the progress store; an empty location or
+    ':memory:' keeps it in memory"""
+    if not location or location == ":memory:":
+        return MemoryReviewStore()
+    return SQLiteReviewStore(location)
@@ -0,0 +1,213 @@
+"""Asyncio server for /progress/stream in production.
+
+    python src/sse_server.py --bind 127.0.0.1:5002
+
+Under gunicorn every open stream would hold a worker thread for as long as
+the page stays open. This server keeps all of them in one event loop
+instead, so thousands of idle streams cost a socket and a queue each. The
+app's worker processes send it every saved edit of a learner with a stream
+open here over a Unix datagram socket (CHESSEDU_EVENTS_SOCKET, see
+progress_events.py), and it fans the events out to the learner's open
+streams.
+
+Put it behind the same reverse proxy as gunicorn and route /progress/stream
+to it; learners are identified by the app's session cookie.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from itsdangerous import BadSignature
+
+os.environ.setdefault("CHESSEDU_SHARED_STORE", "1")
+
+from app import app, DEVELOPMENT_SECRET_KEY, progress_store  # noqa: E402  (the environment must be set first)
+from progress_events import (DEFAULT_EVENTS_SOCKET, HEARTBEAT_INTERVAL, parse_datagram,  # noqa: E402
+                             presence_path, ProgressBroker, snapshot_event, SubscriberPresence)
+
+STREAM_PATH = "/progress/stream"
+# A client gets this long to send its request headers
+REQUEST_TIMEOUT = 10
+MAX_HEADER_BYTES = 16384
+
+STREAM_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream; charset=utf-8\r\n"
+    "Cache-Control: no-cache\r\n"
+    "X-Accel-Buffering: no\r\n"
+    "Connection: close\r\n\r\n"
+)
+
+
+class EventDatagrams(asyncio.DatagramProtocol):
+    """Receives events from the app's worker processes"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def datagram_received(self, data, addr):
+        try:
+            learner_id, messages = parse_datagram(data)
+        except UnicodeDecodeError:
+            return
+        self.broker.publish(learner_id, messages)
+
+
+def learner_from_cookie(header):
+    """Return the learner id in the app's session cookie, or None"""
+    cookie = SimpleCookie()
+    try:
+        cookie.load(header or "")
+    except Exception:
+        return None
+    morsel = cookie.get(app.config["SESSION_COOKIE_NAME"])
+    if morsel is None:
+        return None
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        session = serializer.loads(
+            morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return session.get("learner_id")
+
+
+async def read_request(reader):
+    """Return (method, path, headers) of the request, or None if it is malformed"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    if len(head) > MAX_HEADER_BYTES:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, separator, value = line.partition(":")
+        if separator:
+            headers[name.strip().lower()] = value.strip()
+    return parts[0], urlsplit(parts[1]).path, headers
+
+
+def error_response(status, message):
+    body = f'{{"error": "{message}"}}'
+    return (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}").encode("utf-8")
+
+
+class StreamServer:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def handle(self, reader, writer):
+        try:
+            await self.respond(reader, writer)
+        except asyncio.CancelledError:
+            # The server is shutting down. Ending quietly keeps asyncio from
+            # logging every open stream as a failed connection handler.
+            writer.close()
+
+    async def respond(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(read_request(reader), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            writer.close()
+            return
+
+        try:
+            if request is None:
+                writer.write(error_response("400 Bad Request", "Malformed request"))
+            elif request[0] != "GET" or request[1] != STREAM_PATH:
+                writer.write(error_response("404 Not Found", "Not found"))
+            else:
+                learner_id = learner_from_cookie(request[2].get("cookie"))
+                if learner_id is None:
+                    # The app assigns learner ids; any request to it sets the cookie
+                    writer.write(error_response("401 Unauthorized", "No learner session"))
+                else:
+                    await self.stream(learner_id, request[2].get("last-event-id"), writer)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, learner_id, last_event_id, writer):
+        queue = asyncio.Queue()
+        subscription = self.broker.subscribe(learner_id, queue)
+        try:
+            # Subscribe before reading, so no edit falls between the snapshot and the stream
+            progress = await asyncio.get_running_loop().run_in_executor(
+                None, progress_store.get, learner_id)
+            writer.write(STREAM_HEADERS.encode("ascii"))
+            if last_event_id != str(progress.version):
+                writer.write(snapshot_event(progress).encode("utf-8"))
+            await writer.drain()
+            while not subscription.overflowed:
+                try:
+                    message = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    message = ": ping\n\n"
+                writer.write(message.encode("utf-8"))
+                await writer.drain()
+        finally:
+            self.broker.unsubscribe(learner_id, subscription)
+
+
+def bind_datagram_socket(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # A socket file left behind by a previous run would make bind fail
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    return sock
+
+
+async def serve(host, port, events_socket):
+    loop = asyncio.get_running_loop()
+    # Workers only send events for learners with a stream open here
+    presence = SubscriberPresence.create(presence_path(events_socket))
+    broker = ProgressBroker(presence)
+    sock = bind_datagram_socket(events_socket)
+    transport, _ = await loop.create_datagram_endpoint(lambda: EventDatagrams(broker), sock=sock)
+    server = await asyncio.start_server(StreamServer(broker).handle, host, port, backlog=1024)
+    stopping = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    print(f"Serving {STREAM_PATH} on http://{host}:{port}, events from {events_socket}",
+          file=sys.stderr)
+    try:
+        await stopping.wait()
+    finally:
+        # Open streams are cancelled when the loop shuts down; browsers reconnect
+        server.close()
+        transport.close()
+        os.unlink(events_socket)
+        presence.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve /progress/stream for the app's worker processes")
+    parser.add_argument("--bind", default=os.environ.get("CHESSEDU_SSE_BIND", "127.0.0.1:5002"),
+                        help="host:port to listen on")
+    parser.add_argument("--events-socket",
+                        default=os.environ.get("CHESSEDU_EVENTS_SOCKET", DEFAULT_EVENTS_SOCKET),
+                        help="Unix socket the app's workers send events to")
+    args = parser.parse_args()
+    if app.secret_key == DEVELOPMENT_SECRET_KEY:
+        print("Set CHESSEDU_SECRET_KEY to the key gunicorn's workers use", file=sys.stderr)
+        return 1
+    host, _, port = args.bind.rpartition(":")
+    asyncio.run(serve(host or "127.0.0.1", int(port), args.events_socket))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
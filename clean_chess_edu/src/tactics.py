@@ -0,0 +1,133 @@
+"""Fork and pin detection on chess_core positions.
+
+``find_motifs(before, move)`` looks at the position after ``move`` and
+reports the forks and pins that the moved piece creates. A motif only
+counts when the piece that creates it cannot simply be taken for less than
+it is worth, so the results are usable as puzzles: "from ``before``, find
+``move``".
+"""
+from chess_core import (attacks_from, BISHOP, BISHOP_DIRECTIONS, KING, PAWN, QUEEN, ROOK,
+                        ROOK_DIRECTIONS, squares)
+
+THEMES = ("fork", "pin")
+PIECE_NAMES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+PIECE_VALUES = (1, 3, 3, 5, 9, 100)
+
+# Difficulty levels: forcing moves (checks and captures) are the easiest to
+# spot, quiet moves in positions with many options the hardest
+DIFFICULTIES = (1, 2, 3)
+BUSY_POSITION_MOVES = 35
+
+SLIDER_DIRECTIONS = {
+    BISHOP: BISHOP_DIRECTIONS,
+    ROOK: ROOK_DIRECTIONS,
+    QUEEN: BISHOP_DIRECTIONS + ROOK_DIRECTIONS,
+}
+
+
+def piece_type_at(position, square, color):
+    """Return the type of color's piece on square, or None"""
+    bit = 1 << square
+    base = color * 6
+    for piece_type in range(6):
+        if position.pieces[base + piece_type] & bit:
+            return piece_type
+    return None
+
+
+def cheapest_attacker_value(position, square, by):
+    """Return the value of by's least valuable piece attacking square, or None"""
+    attackers = position.attackers(square, by)
+    if not attackers:
+        return None
+    base = by * 6
+    for piece_type in range(6):
+        if attackers & position.pieces[base + piece_type]:
+            return PIECE_VALUES[piece_type]
+    return None
+
+
+def is_safe(position, square, color, value):
+    """Return True if color's piece of the given value on square can't be won by the opponent"""
+    attacker_value = cheapest_attacker_value(position, square, color ^ 1)
+    if attacker_value is None:
+        return True
+    return attacker_value >= value and position.is_attacked(square, color)
+
+
+def fork_targets(position, square, piece_type, color):
+    """Return the enemy squares worth attacking that the piece on square attacks"""
+    them = color ^ 1
+    occupied = position.occupied[0] | position.occupied[1]
+    attacked = attacks_from(piece_type, square, color, occupied) & position.occupied[them]
+    value = PIECE_VALUES[piece_type]
+    targets = []
+    for target in squares(attacked):
+        target_type = piece_type_at(position, target, them)
+        # A target matters if it is the king, worth more than the attacker, or undefended
+        if target_type == KING or PIECE_VALUES[target_type] > value \
+                or not position.is_attacked(target, them):
+            targets.append(target)
+    return targets
+
+
+def pinned_pieces(position, square, piece_type, color):
+    """Return (pinned square, square behind) pairs for the slider on square"""
+    them = color ^ 1
+    occupied = position.occupied[0] | position.occupied[1]
+    pins = []
+    for df, dr in SLIDER_DIRECTIONS.get(piece_type, ()):
+        file, rank = (square & 7) + df, (square >> 3) + dr
+        first = None
+        while 0 <= file < 8 and 0 <= rank < 8:
+            target = file + 8 * rank
+            bit = 1 << target
+            if position.occupied[color] & bit:
+                break
+            if position.occupied[them] & bit:
+                if first is None:
+                    first = target
+                else:
+                    front = piece_type_at(position, first, them)
+                    behind = piece_type_at(position, target, them)
+                    # Pinned to the king (absolute) or to something worth more
+                    # (relative), and unable to break the pin by taking the pinner
+                    if front != KING and PIECE_VALUES[behind] > PIECE_VALUES[front] > 1 \
+                            and not attacks_from(front, first, them, occupied) & (1 << square):
+                        pins.append((first, target))
+                    break
+            file, rank = file + df, rank + dr
+    return pins
+
+
+def difficulty(before, move, after):
+    """Rate a puzzle 1 (forcing move) to 3 (quiet move among many options)"""
+    to = (move >> 6) & 63
+    if after.in_check() or before.occupied[before.side ^ 1] & (1 << to):
+        return 1
+    return 3 if len(before.legal_moves()) > BUSY_POSITION_MOVES else 2
+
+
+def find_motifs(before, move, after=None):
+    """Return a list of (theme, piece name, difficulty) for motifs created by move"""
+    if after is None:
+        after = before.make_move(move)
+    color = before.side
+    to = (move >> 6) & 63
+    piece_type = piece_type_at(after, to, color)
+    if not is_safe(after, to, color, PIECE_VALUES[piece_type]):
+        return []
+
+    motifs = []
+    targets = fork_targets(after, to, piece_type, color)
+    # Pawns forking pawns and the like are not worth a puzzle
+    if len(targets) >= 2 and (piece_type != PAWN or any(
+            piece_type_at(after, target, color ^ 1) != PAWN for target in targets)):
+        motifs.append("fork")
+    if piece_type in SLIDER_DIRECTIONS and pinned_pieces(after, to, piece_type, color):
+        motifs.append("pin")
+    if not motifs:
+        return []
+
+    level = difficulty(before, move, after)
+    return [(theme, PIECE_NAMES[piece_type], level) for theme in motifs]
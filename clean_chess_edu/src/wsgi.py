@@ -0,0 +1,35 @@
+"""WSGI entry point for serving ChessEdu with several worker processes.
+
+    gunicorn -c gunicorn.conf.py        # from the clean_chess_edu directory
+
+``python src/app.py`` runs Flask's single-process development server.
+Production servers import ``app`` from here instead, which switches the
+progress store to its shared mode (see progress_store.py) so every worker
+sees every other worker's writes. Set CHESSEDU_PROGRESS_DB to a database
+file; an in-memory store can't be shared and is refused.
+
+Live progress streams are left to sse_server.py: workers forward every
+saved edit to it over CHESSEDU_EVENTS_SOCKET instead of holding a thread
+per open stream.
+
+Request metrics are pooled in CHESSEDU_METRICS_DIR, so /metrics reports
+every worker whichever one answers it.
+
+CHESSEDU_SECRET_KEY must be set: the session cookie it signs is the
+learner's identity, and the development key is public.
+"""
+import os
+
+from metrics import DEFAULT_METRICS_DIR
+from progress_events import DEFAULT_EVENTS_SOCKET
+
+os.environ.setdefault("CHESSEDU_SHARED_STORE", "1")
+os.environ.setdefault("CHESSEDU_EVENTS_SOCKET", DEFAULT_EVENTS_SOCKET)
+os.environ.setdefault("CHESSEDU_METRICS_DIR", DEFAULT_METRICS_DIR)
+
+from app import app, DEVELOPMENT_SECRET_KEY  # noqa: E402  (the environment must be set first)
+
+if app.secret_key == DEVELOPMENT_SECRET_KEY:
+    raise RuntimeError("Set CHESSEDU_SECRET_KEY to a long random string before serving the app")
+
+__all__ = ["app"]
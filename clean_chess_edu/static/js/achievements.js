@@ -7,8 +7,17 @@ document.addEventListener('DOMContentLoaded', function() {
     if (achievementsContainer) {
         loadAchievements();
     }
+    
+    // Celebrate achievements unlocked anywhere (this tab, another tab or device)
+    onAchievementUnlocked(achievement => {
+        const known = achievementsList.find(a => a.id === achievement.id);
+        celebrateAchievement(Object.assign({ icon: '🏆' }, achievement, known ? { icon: known.icon } : {}));
+    });
 });
 
+// Achievement ids already celebrated on this page
+const celebratedAchievements = new Set();
+
 // Map lessons to achievements - each lesson completion unlocks a specific achievement
 const lessonAchievements = [
     {
@@ -102,18 +111,14 @@ function loadAchievements() {
     // Show loading state
     achievementsContainer.innerHTML = '<div class="loading">Loading achievements...</div>';
     
-    // Fetch user progress from the server
-    fetch('/progress')
-        .then(response => response.json())
-        .then(progress => {
-            // Generate achievements based on completed lessons
-            const unlockedAchievements = generateAchievementsFromProgress(progress);
-            displayAchievements(unlockedAchievements, progress);
-        })
-        .catch(error => {
-            console.error('Error fetching achievements:', error);
-            achievementsContainer.innerHTML = '<div class="error">Failed to load achievements. Please try again later.</div>';
-        });
+    // Follow user progress on the server, redrawing as achievements are unlocked
+    onProgressUpdate(progress => {
+        // Generate achievements based on completed lessons
+        const unlockedAchievements = generateAchievementsFromProgress(progress);
+        displayAchievements(unlockedAchievements, progress);
+    }, error => {
+        achievementsContainer.innerHTML = '<div class="error">Failed to load achievements. Please try again later.</div>';
+    });
 }
 
 // Generate achievements based on user progress
@@ -265,49 +270,48 @@ function addAchievement(achievement) {
     // Use the achievement data from our list
     const achievementData = validAchievement;
     
-    // Get current user progress
-    fetch('/progress')
+    // Check if achievement is already earned (progress is kept current by the stream)
+    const alreadyEarned = streamedProgress && streamedProgress.achievements.some(a => a.id === achievement.id);
+    if (alreadyEarned) {
+        console.log('Achievement already earned:', achievement.id);
+        return;
+    }
+    
+    // Add the achievement to user progress
+    fetch('/progress/add-achievement', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ achievement_id: achievement.id })
+    })
         .then(response => response.json())
-        .then(progress => {
-            // Check if achievement is already earned
-            const alreadyEarned = progress.achievements.some(a => a.id === achievement.id);
-            if (alreadyEarned) {
-                console.log('Achievement already earned:', achievement.id);
-                return;
-            }
+        .then(updatedProgress => {
+            console.log('Achievement added:', achievement.id);
             
-            // Add the achievement to user progress
-            fetch('/progress/add-achievement', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ achievement_id: achievement.id })
-            })
-                .then(response => response.json())
-                .then(updatedProgress => {
-                    console.log('Achievement added:', achievement.id);
-                    
-                    // Show achievement celebration
-                    showAchievementCelebration(achievementData);
-                    
-                    // Update achievements display if on the achievements page
-                    const achievementsContainer = document.getElementById('achievementsContainer');
-                    if (achievementsContainer) {
-                        // Generate new achievements based on progress
-                        const unlockedAchievements = generateAchievementsFromProgress(updatedProgress);
-                        displayAchievements(unlockedAchievements, updatedProgress);
-                    }
-                })
-                .catch(error => {
-                    console.error('Error adding achievement:', error);
-                });
+            // Show achievement celebration (the stream's unlock event won't show it twice)
+            celebrateAchievement(achievementData);
+            
+            // Update achievements display if on the achievements page
+            const achievementsContainer = document.getElementById('achievementsContainer');
+            if (achievementsContainer) {
+                // Generate new achievements based on progress
+                const unlockedAchievements = generateAchievementsFromProgress(updatedProgress);
+                displayAchievements(unlockedAchievements, updatedProgress);
+            }
         })
         .catch(error => {
-            console.error('Error fetching user progress:', error);
+            console.error('Error adding achievement:', error);
         });
 }
 
+// Show the celebration for an achievement once per page
+function celebrateAchievement(achievement) {
+    if (celebratedAchievements.has(achievement.id)) return;
+    celebratedAchievements.add(achievement.id);
+    showAchievementCelebration(achievement);
+}
+
 // Show achievement celebration
 function showAchievementCelebration(achievement) {
     // Create modal element
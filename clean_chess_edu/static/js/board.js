@@ -403,30 +403,77 @@ function showHint() {
     const hintElement = document.getElementById('hint');
     if (!hintElement) return;
     
-    let hintText = '';
-    
-    // If it's a starting position
-    if (game.fen() === 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1') {
-        hintText = 'Opening tip: Try controlling the center with e4 or d4.';
-    } 
-    // If the board is empty
-    else if (game.fen().split(' ')[0] === '8/8/8/8/8/8/8/8') {
-        hintText = 'Try setting up a specific position to practice.';
+    // An empty board has nothing to analyze
+    if (game.fen().split(' ')[0] === '8/8/8/8/8/8/8/8') {
+        displayHint(hintElement, 'Try setting up a specific position to practice.');
+        return;
+    }
+    
+    analyzePosition(game.fen()).then(analysis => {
+        displayHint(hintElement, analysis ? hintFromAnalysis(analysis) : fallbackHint());
+    });
+}
+
+// Pick the most useful hint from the server's analysis and highlight the squares it is about
+function hintFromAnalysis(analysis) {
+    const side = analysis.sideToMove;
+    const opponent = side === 'white' ? 'black' : 'white';
+    const sideName = side === 'white' ? 'White' : 'Black';
+    clearHighlights();
+    
+    if (analysis.checkmate) {
+        return `Checkmate! ${sideName} has no legal moves left.`;
+    }
+    if (analysis.stalemate) {
+        return `Stalemate: ${sideName} has no legal moves but is not in check, so the game is drawn.`;
+    }
+    if (analysis.inCheck) {
+        return `${sideName} is in check: move the king, block the check or capture the attacking piece.`;
+    }
+    
+    const ownHanging = analysis.hanging[side];
+    if (ownHanging.length > 0) {
+        ownHanging.forEach(square => highlightSquare(square, 'check'));
+        return `Your piece on ${ownHanging[0]} is attacked and undefended. Protect it or move it to safety.`;
+    }
+    
+    if (analysis.tactics.length > 0) {
+        const tactic = analysis.tactics[0];
+        highlightSquare(tactic.uci.slice(0, 2), 'possible-move');
+        return `There is a ${tactic.theme} available for your ${tactic.piece}. Can you find it?`;
     }
-    // If it's white's turn
-    else if (game.turn() === 'w') {
-        // Check if white has any pieces in danger
-        hintText = 'Look for any pieces under attack and consider developing your pieces.';
+    
+    const targets = analysis.hanging[opponent];
+    if (targets.length > 0) {
+        targets.forEach(square => highlightSquare(square, 'possible-move'));
+        return `The piece on ${targets[0]} is undefended. Can you attack it?`;
     }
-    // If it's black's turn
-    else {
-        hintText = 'Respond to White\'s move and watch for attacking opportunities.';
+    
+    const pin = analysis.pins.find(pin => pin.color === side);
+    if (pin) {
+        highlightSquare(pin.pinned, 'possible-move');
+        return `The piece on ${pin.pinned} is pinned by your piece on ${pin.by}. Can you attack it again?`;
     }
     
-    // Display the hint with animation
+    if (centerControlTotal(analysis, side) <= centerControlTotal(analysis, opponent)) {
+        ['d4', 'e4', 'd5', 'e5'].forEach(square => highlightSquare(square, 'possible-move'));
+        return 'Fight for the center: aim your pawns and pieces at d4, e4, d5 and e5.';
+    }
+    return 'You control the center. Keep developing your pieces and get your king to safety.';
+}
+
+// Hint used when the position could not be analyzed
+function fallbackHint() {
+    if (game.turn() === 'w') {
+        return 'Look for any pieces under attack and consider developing your pieces.';
+    }
+    return 'Respond to White\'s move and watch for attacking opportunities.';
+}
+
+// Display a hint with animation
+function displayHint(hintElement, hintText) {
     hintElement.textContent = hintText;
     
-    // Animate the hint
     anime({
         targets: hintElement,
         opacity: [0, 1],
@@ -0,0 +1,188 @@
+// Completion event queue for ChessEdu
+//
+// Exercise, objective and lesson completions are queued in localStorage and
+// sent to /api/events in batches. If the network is down or the server is busy
+// the events stay queued and are sent when the browser comes back online or the
+// next page loads.
+
+const EVENT_QUEUE_KEY = 'chessEduEventQueue';
+const REJECTED_EVENTS_KEY = 'chessEduRejectedEvents';
+// The most events /api/events takes in one request (MAX_EVENT_BATCH in app.py)
+const MAX_EVENT_BATCH = 500;
+// How many rejected events are kept in localStorage
+const MAX_REJECTED_EVENTS = 100;
+
+// Promise for the batch currently being sent, so flushes never overlap
+let pendingFlush = null;
+// Server verdicts ({ok, error}) for events queued in this page, by event id
+const eventResults = new Map();
+
+// Give an event an id that tells it apart from events queued by other tabs
+function newEventId() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Read the queued events from localStorage
+function loadQueuedEvents() {
+    try {
+        return JSON.parse(localStorage.getItem(EVENT_QUEUE_KEY)) || [];
+    } catch (e) {
+        console.error('Error reading queued events:', e);
+        return [];
+    }
+}
+
+// Write the queued events back to localStorage
+function storeQueuedEvents(events) {
+    localStorage.setItem(EVENT_QUEUE_KEY, JSON.stringify(events));
+}
+
+// Drop sent events from the queue by id; other tabs may have queued or sent events meanwhile
+function removeQueuedEvents(sent) {
+    const sentIds = new Set(sent.map(event => event.id));
+    storeQueuedEvents(loadQueuedEvents().filter(event => !sentIds.has(event.id)));
+}
+
+// Keep the server's verdict on an event for the queueCompletionEvent call waiting for it
+function recordEventResult(event, result) {
+    if (eventResults.has(event.id)) {
+        eventResults.set(event.id, result);
+    }
+}
+
+// Queue a completion event and try to send it right away.
+// Resolves with the updated progress once the server has accepted the event,
+// and rejects with the server's error if it refused it.
+function queueCompletionEvent(event) {
+    const id = newEventId();
+    const events = loadQueuedEvents();
+    events.push(Object.assign({ queuedAt: new Date().toISOString() }, event, { id }));
+    storeQueuedEvents(events);
+    eventResults.set(id, null);
+
+    // No verdict means another tab sent the event
+    return flushCompletionEvents().then(progress => {
+        const result = eventResults.get(id);
+        eventResults.delete(id);
+        if (result && !result.ok) {
+            throw new Error(result.error);
+        }
+        return progress;
+    }, error => {
+        eventResults.delete(id);
+        throw error;
+    });
+}
+
+// Send the queued events, at most MAX_EVENT_BATCH per request.
+// Events the server could not take for now (no connection, 5xx, 429) stay
+// queued; a batch it rejected outright (any other 4xx) would be rejected again
+// on every retry, so it is parked under REJECTED_EVENTS_KEY instead of holding
+// up the completions queued after it.
+function flushCompletionEvents() {
+    if (pendingFlush) {
+        // Send whatever was queued meanwhile once the current batch is done
+        return pendingFlush.then(() => flushCompletionEvents());
+    }
+
+    const queued = loadQueuedEvents();
+    if (queued.length === 0) {
+        return Promise.resolve(null);
+    }
+    if (queued.some(event => !event.id)) {
+        // Events queued before they had ids
+        queued.forEach(event => { event.id = event.id || newEventId(); });
+        storeQueuedEvents(queued);
+    }
+    const batch = queued.slice(0, MAX_EVENT_BATCH);
+
+    pendingFlush = fetch('/api/events', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ events: batch })
+    })
+        .then(response => {
+            if (response.ok) {
+                return response.json();
+            }
+            if (response.status >= 500 || response.status === 429) {
+                throw new Error(`Server responded with ${response.status}`);
+            }
+            return response.text().then(body => {
+                console.error(`Completion events rejected with ${response.status}:`, body);
+                parkRejectedEvents(batch, response.status);
+                let error = `Server responded with ${response.status}`;
+                try {
+                    error = JSON.parse(body).error || error;
+                } catch (e) {
+                    // Not a JSON error body
+                }
+                batch.forEach(event => recordEventResult(event, { ok: false, error }));
+                return null;
+            });
+        })
+        .then(data => {
+            // Drop the events we sent; anything queued meanwhile stays for the next batch
+            removeQueuedEvents(batch);
+            if (!data) {
+                return null;
+            }
+
+            data.results.forEach((result, index) => {
+                recordEventResult(batch[index], result);
+                if (!result.ok) {
+                    console.error('Completion event rejected:', batch[index], result.error);
+                }
+            });
+
+            // Keep the cached progress in sync with the server
+            localStorage.setItem('chessEduProgress', JSON.stringify(data.progress));
+            if (window.userProgress) {
+                window.userProgress = data.progress;
+            }
+            return data.progress;
+        })
+        .finally(() => {
+            pendingFlush = null;
+        });
+
+    // Carry on with the rest of the queue; resolve with the latest progress
+    return pendingFlush.then(progress => {
+        if (loadQueuedEvents().length === 0) {
+            return progress;
+        }
+        return flushCompletionEvents().then(later => later || progress);
+    });
+}
+
+// Keep the most recent rejected events for inspection, without letting them grow without bound
+function parkRejectedEvents(events, status) {
+    let parked = [];
+    try {
+        parked = JSON.parse(localStorage.getItem(REJECTED_EVENTS_KEY)) || [];
+    } catch (e) {
+        console.error('Error reading rejected events:', e);
+    }
+    const rejectedAt = new Date().toISOString();
+    parked = parked.concat(events.map(event => Object.assign({ status, rejectedAt }, event)));
+    localStorage.setItem(REJECTED_EVENTS_KEY, JSON.stringify(parked.slice(-MAX_REJECTED_EVENTS)));
+}
+
+// Retry queued events when the connection comes back and on every page load
+window.addEventListener('online', () => {
+    flushCompletionEvents().catch(error => console.error('Error sending queued events:', error));
+});
+document.addEventListener('DOMContentLoaded', () => {
+    if (loadQueuedEvents().length > 0) {
+        flushCompletionEvents().catch(error => console.error('Error sending queued events:', error));
+    }
+});
+
+// Export functions for use in other modules
+window.queueCompletionEvent = queueCompletionEvent;
+window.flushCompletionEvents = flushCompletionEvents;
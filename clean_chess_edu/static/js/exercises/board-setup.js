@@ -417,17 +417,10 @@ function showCompletionAnimation() {
     if (nextStepBtn) nextStepBtn.disabled = true;
     
     // Call the API to record exercise completion
-    fetch('/api/complete-exercise', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            exerciseId: 'board_setup',
-            completed: true
-        })
+    queueCompletionEvent({
+        type: 'exercise',
+        exerciseId: 'board_setup'
     })
-    .then(response => response.json())
     .then(data => {
         console.log('Exercise completion recorded:', data);
         
@@ -41,25 +41,16 @@ const centerSteps = {
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         targetPosition: 'rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: ['d2', 'e2', 'd4', 'e4'],
+        targetPieces: { d4: 'wp', e4: 'wp' },
         verification: function() {
-            const position = centerGame.fen().split(' ')[0];
-            
-            // Check for partially completed tasks (either d4 or e4 pawn moved)
-            const dPawnMoved = position.includes('3P') && position.charAt(position.indexOf('3P') + 2) === '3';
-            const ePawnMoved = position.includes('4P') || position.includes('P3');
-            
             // For step completion, both pawns must be moved
-            return position === 'rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR';
+            return countTargetPieces(this.targetPieces) === Object.keys(this.targetPieces).length;
         },
         // Add a function to check partial progress
         checkProgress: function() {
-            const position = centerGame.fen().split(' ')[0];
-            
             // Check if at least d4 or e4 pawn is moved but not both yet
-            const dPawnMoved = position.includes('/8/8/3P') || position.includes('/8/8/4P');
-            const ePawnMoved = position.includes('/8/8/P3') || position.includes('/8/8/2P1');
-            
-            return (dPawnMoved || ePawnMoved) && position !== 'rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR';
+            const placed = countTargetPieces(this.targetPieces);
+            return placed > 0 && placed < Object.keys(this.targetPieces).length;
         }
     },
     3: {
@@ -73,22 +64,15 @@ const centerSteps = {
         position: 'rnbqkbnr/pppppppp/8/8/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 1',
         targetPosition: 'rnbqkbnr/pppppppp/8/8/3PP3/2NB1N2/PPP2PPP/R1BQK2R w KQkq - 0 1',
         highlightSquares: ['c3', 'f3', 'd3', 'g1', 'b1', 'f1'],
+        targetPieces: { c3: 'wn', f3: 'wn', d3: 'wb' },
         verification: function() {
-            const position = centerGame.fen().split(' ')[0];
-            return position === 'rnbqkbnr/pppppppp/8/8/3PP3/2NB1N2/PPP2PPP/R1BQK2R';
+            return countTargetPieces(this.targetPieces) === Object.keys(this.targetPieces).length;
         },
         // Add a function to check partial progress
         checkProgress: function() {
-            const position = centerGame.fen().split(' ')[0];
-            
             // Check if at least one piece is developed but not all yet
-            const knightF3Moved = position.includes('3/8/5N2') || position.includes('3/8/5N');
-            const knightC3Moved = position.includes('3/8/2N') || position.includes('3/8/1N1');
-            const bishopD3Moved = position.includes('3/8/3B') || position.includes('3/8/2B1');
-            
-            const pieceMoved = knightF3Moved || knightC3Moved || bishopD3Moved;
-            
-            return pieceMoved && position !== 'rnbqkbnr/pppppppp/8/8/3PP3/2NB1N2/PPP2PPP/R1BQK2R';
+            const placed = countTargetPieces(this.targetPieces);
+            return placed > 0 && placed < Object.keys(this.targetPieces).length;
         }
     },
     4: {
@@ -100,7 +84,9 @@ const centerSteps = {
             'This is a strong foundation for the middlegame'
         ],
         position: 'rnbqkbnr/pppppppp/8/8/3PP3/2NB1N2/PPP2PPP/R1BQK2R w KQkq - 0 1',
-        controlledSquares: ['c5', 'd4', 'e4', 'f5', 'c4', 'd5', 'e5', 'f4'],
+        // Filled in from the server's analysis of the position when the step is shown
+        controlledBy: 'white',
+        controlledSquares: [],
         verification: function() {
             // This step is more about observation and understanding, so return true
             return true;
@@ -179,6 +165,38 @@ function setupExerciseEventListeners() {
     }
 }
 
+// The center and the squares around it (c3-f6)
+const EXTENDED_CENTER = ['c3', 'd3', 'e3', 'f3', 'c4', 'd4', 'e4', 'f4',
+                         'c5', 'd5', 'e5', 'f5', 'c6', 'd6', 'e6', 'f6'];
+
+// Count the squares of a { square: 'wp' } map that hold the expected piece
+function countTargetPieces(targetPieces) {
+    return Object.entries(targetPieces).filter(([square, expected]) => {
+        const piece = centerGame.get(square);
+        return piece && piece.color + piece.type === expected;
+    }).length;
+}
+
+// Highlight the central squares a color controls, as analyzed by the server
+function highlightControlledSquares(step) {
+    const stepData = centerSteps[step];
+    analyzePosition(stepData.position).then(analysis => {
+        // The learner may have moved on while the analysis was loading
+        if (!analysis || currentStep !== step) return;
+        
+        stepData.controlledSquares = analysis.attacked[stepData.controlledBy]
+            .filter(square => EXTENDED_CENTER.includes(square));
+        stepData.controlledSquares.forEach(square => {
+            highlightSquare(square, 'controlled-square');
+        });
+        
+        const attacks = Object.entries(analysis.centerControl)
+            .map(([square, counts]) => `${square} ${counts[stepData.controlledBy]}x`)
+            .join(', ');
+        updateExerciseMessage(`Step ${step}: ${stepData.title}. Your pawns and pieces attack the center squares ${attacks}.`);
+    });
+}
+
 // Load a position on the board
 function loadPosition(fen) {
     centerGame.load(fen);
@@ -212,6 +230,10 @@ function goToStep(step) {
     // Update message
     updateExerciseMessage(`Step ${step}: ${centerSteps[step].title}. ${centerSteps[step].tasks[0]}`);
     
+    if (centerSteps[step].controlledBy) {
+        highlightControlledSquares(step);
+    }
+    
     // Update progress bar
     updateProgressBar();
     
@@ -8,6 +8,7 @@ let forkBoard = null;
 let forkGame = null;
 let currentStep = 1;
 let completedSteps = [];
+let currentPuzzle = null; // Puzzle from /api/puzzles for the current step, if any
 
 // Step information
 const forkSteps = {
@@ -20,10 +21,8 @@ const forkSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'fork', piece: 'knight' },
+        verification: puzzleSolved
     },
     2: {
         title: 'Pawn Forks',
@@ -34,10 +33,8 @@ const forkSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'fork', piece: 'pawn' },
+        verification: puzzleSolved
     },
     3: {
         title: 'Queen Forks',
@@ -48,10 +45,8 @@ const forkSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'fork', piece: 'queen' },
+        verification: puzzleSolved
     },
     4: {
         title: 'Practice Positions',
@@ -62,10 +57,8 @@ const forkSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'fork' },
+        verification: puzzleSolved
     }
 };
 
@@ -107,9 +100,6 @@ function initForkExercise() {
     
     // Start with the first step
     goToStep(1);
-    
-    // Show development message
-    showFeedback('Exercise Under Development', 'The Fork Practice exercise is currently under development. Please check back later.', 'info');
 }
 
 // Set up event listeners for exercise controls
@@ -133,7 +123,7 @@ function setupExerciseEventListeners() {
         resetBoardBtn.addEventListener('click', function() {
             // Reset to the current step's starting position
             if (currentStep > 0 && forkSteps[currentStep]) {
-                loadPosition(forkSteps[currentStep].position);
+                loadPosition(currentPuzzle ? currentPuzzle.fen : forkSteps[currentStep].position);
                 updateExerciseMessage(`Step ${currentStep}: ${forkSteps[currentStep].title}. ${forkSteps[currentStep].tasks[0]}`);
             }
         });
@@ -165,8 +155,10 @@ function goToStep(step) {
     // Update UI for this step
     updateStepInfo(forkSteps[step]);
     
-    // Load the step's position
+    // Load the step's position, then replace it with a real puzzle if one is available
+    currentPuzzle = null;
     loadPosition(forkSteps[step].position);
+    loadStepPuzzle(step);
     
     // Update message
     updateExerciseMessage(`Step ${step}: ${forkSteps[step].title}. ${forkSteps[step].tasks[0]}`);
@@ -308,13 +300,54 @@ function showFeedback(title, message, type) {
     }
 }
 
-// Placeholder chess board callbacks
+// Fetch a mined puzzle for a step and set it up on the board
+function loadStepPuzzle(step) {
+    const params = new URLSearchParams(forkSteps[step].puzzle);
+    fetch(`/api/puzzles?${params}`)
+        .then(response => response.ok ? response.json() : { puzzles: [] })
+        .then(data => {
+            // Ignore answers for a step the learner has already left
+            if (step !== currentStep) return;
+
+            if (data.puzzles.length === 0) {
+                showFeedback('No Puzzles Yet', 'No fork puzzles are available for this step yet. Study the position and continue when ready.', 'info');
+                return;
+            }
+
+            currentPuzzle = data.puzzles[0];
+            loadPosition(currentPuzzle.fen);
+            const sideToMove = currentPuzzle.fen.split(' ')[1] === 'w' ? 'white' : 'black';
+            forkBoard.orientation(sideToMove);
+            updateExerciseMessage(`Step ${step}: ${forkSteps[step].title}. Find the ${currentPuzzle.piece} fork (${sideToMove} to move).`);
+        })
+        .catch(error => console.error('Error loading puzzle:', error));
+}
+
+// Step verification: solved when there is no puzzle to solve or the puzzle was solved
+function puzzleSolved() {
+    return !currentPuzzle || currentPuzzle.solved === true;
+}
+
+// Chess board callbacks
 function onDragStart(source, piece, position, orientation) {
-    return false; // Disable dragging for now as this is a placeholder
+    // Only the side to move in an unsolved puzzle may move
+    if (!currentPuzzle || currentPuzzle.solved) return false;
+    return piece.charAt(0) === forkGame.turn();
 }
 
 function onDrop(source, target, piece, newPos, oldPos, orientation) {
-    return 'snapback'; // Always return pieces as this is a placeholder
+    const move = forkGame.move({ from: source, to: target, promotion: 'q' });
+    if (move === null) return 'snapback';
+
+    if (move.from + move.to === currentPuzzle.solution[0].slice(0, 4)) {
+        currentPuzzle.solved = true;
+        showFeedback('Correct!', `${move.san} creates the fork.`, 'success');
+        verifyCurrentPosition();
+    } else {
+        forkGame.undo();
+        showFeedback('Not Quite', 'That move does not create the fork. Try again.', 'warning');
+        return 'snapback';
+    }
 }
 
 function onSnapEnd() {
@@ -9,9 +9,12 @@ let game = new Chess();
 let currentStep = 1;
 let totalSteps = 5;
 let userMoves = [];
+let completedStepMoves = []; // Moves of each solved step, which the server replays from its own copy of the step's position
 let stepCompleted = false;
 
-// Step data contains title, description, tasks, starting position, and correct moves for each step
+// Step data contains title, description, tasks, starting position, the piece to move and the
+// correct moves for each step. Moves from positions the server's opening book covers are judged
+// by the book; correctMoves is used for the other positions and when no book is available.
 const stepData = [
     {
         id: 1,
@@ -22,6 +25,7 @@ const stepData = [
         tasks: [
             "Move one of your knights to either f3 or c3"
         ],
+        piece: "n",
         correctMoves: ["Nf3", "Nc3"],
         hint: "Knights on f3 or c3 control important center squares and prepare for castling."
     },
@@ -34,6 +38,7 @@ const stepData = [
         tasks: [
             "Move your e-pawn or d-pawn forward by one or two squares"
         ],
+        piece: "p",
         correctMoves: ["e4", "d4", "e5", "d5"],
         hint: "The e4 and d4 pawns control important center squares and open lines for your bishop and queen."
     },
@@ -46,6 +51,7 @@ const stepData = [
         tasks: [
             "Move your light-squared bishop to an active square (like c4 or b5)"
         ],
+        piece: "b",
         correctMoves: ["Bc4", "Bb5"],
         hint: "The bishop on c4 controls the important d5 square and puts pressure on the f7 pawn."
     },
@@ -58,6 +64,7 @@ const stepData = [
         tasks: [
             "Castle kingside (O-O)"
         ],
+        piece: "k",
         correctMoves: ["O-O"],
         hint: "Castling kingside moves your king to g1 and your rook to f1, improving king safety and connecting your rooks."
     },
@@ -71,6 +78,7 @@ const stepData = [
             "Castle kingside (O-O)",
             "Notice how both sides have completed basic development"
         ],
+        piece: "k",
         correctMoves: ["O-O"],
         hint: "After castling, both sides have completed the basic opening principles: developed knights and bishops, controlled the center, and castled for king safety."
     }
@@ -133,6 +141,8 @@ function onDragStart(source, piece) {
 }
 
 function onDrop(source, target) {
+    const fen = game.fen();
+
     // See if the move is legal
     const move = game.move({
         from: source,
@@ -147,7 +157,7 @@ function onDrop(source, target) {
     userMoves.push(move);
     
     // Check if the move is correct for the current step
-    checkMove(move);
+    checkMove(move, fen);
 }
 
 function onSnapEnd() {
@@ -155,40 +165,82 @@ function onSnapEnd() {
     board.position(game.fen());
 }
 
-function checkMove(move) {
+function checkMove(move, fen) {
     const currentStepData = stepData[currentStep - 1];
+
+    // Moving another piece never completes the step
+    if (currentStepData.piece && move.piece !== currentStepData.piece) {
+        rejectMove(null);
+        return;
+    }
+
+    classifyOpeningMove(fen, move.from + move.to + (move.promotion || '')).then(result => {
+        // The learner may have reset the board or played on while the book was asked
+        if (stepData[currentStep - 1] !== currentStepData || userMoves[userMoves.length - 1] !== move) return;
+
+        if (result && result.classification === 'principled') {
+            acceptMove(currentStepData);
+        } else if (result && result.classification === 'dubious') {
+            rejectMove(result);
+        } else if (currentStepData.correctMoves.includes(move.san)) {
+            acceptMove(currentStepData);
+        } else {
+            rejectMove(null);
+        }
+    });
+}
+
+function acceptMove(currentStepData) {
+    stepCompleted = true;
+    completedStepMoves[currentStep - 1] = {
+        moves: userMoves.map(m => m.from + m.to + (m.promotion || ''))
+    };
+    showFeedback('Correct Move!', 'That\'s the right move. You\'ve completed this step.', 'success');
+    document.getElementById('nextBtn').disabled = false;
     
-    // Check if the move is one of the correct moves for this step
-    if (currentStepData.correctMoves.includes(move.san)) {
-        stepCompleted = true;
-        showFeedback('Correct Move!', 'That\'s the right move. You\'ve completed this step.', 'success');
-        document.getElementById('nextBtn').disabled = false;
-        
-        // Update the progress indicator
-        updateProgressIndicator();
-        
-        // If it's the last step, enable the complete button
-        if (currentStep === totalSteps) {
-            // Add the complete button to the exercise controls if it doesn't exist
-            const completeBtn = document.getElementById('completeBtn');
-            if (!completeBtn) {
-                const exerciseControls = document.querySelector('.exercise-controls');
-                if (exerciseControls) {
-                    const completeButton = document.createElement('button');
-                    completeButton.id = 'completeBtn';
-                    completeButton.className = 'btn success';
-                    completeButton.textContent = 'Complete Exercise';
-                    completeButton.addEventListener('click', completeExercise);
-                    exerciseControls.appendChild(completeButton);
-                }
-            } else {
-                completeBtn.classList.remove('hidden');
+    // Update the progress indicator
+    updateProgressIndicator();
+    
+    // If it's the last step, enable the complete button
+    if (currentStep === totalSteps) {
+        // Add the complete button to the exercise controls if it doesn't exist
+        const completeBtn = document.getElementById('completeBtn');
+        if (!completeBtn) {
+            const exerciseControls = document.querySelector('.exercise-controls');
+            if (exerciseControls) {
+                const completeButton = document.createElement('button');
+                completeButton.id = 'completeBtn';
+                completeButton.className = 'btn success';
+                completeButton.textContent = 'Complete Exercise';
+                completeButton.addEventListener('click', completeExercise);
+                exerciseControls.appendChild(completeButton);
             }
+        } else {
+            completeBtn.classList.remove('hidden');
         }
+    }
+
+    updateNavigationButtons();
+}
+
+// The chess.js piece letter of the piece a SAN move moves
+function sanPiece(san) {
+    if (san.startsWith('O-O')) return 'k';
+    return /^[NBRQK]/.test(san) ? san.charAt(0).toLowerCase() : 'p';
+}
+
+// Explain why a move doesn't complete the step, naming the book's moves if it left the book
+function rejectMove(result) {
+    const piece = stepData[currentStep - 1].piece;
+    const bookMoves = result ? result.bookMoves
+        .filter(bookMove => !piece || sanPiece(bookMove.san) === piece)
+        .map(bookMove => bookMove.san) : [];
+    if (bookMoves.length) {
+        showFeedback('Try Again', `That move leaves the principled opening lines. Players here choose ${bookMoves.join(', ')}.`, 'warning');
     } else {
         showFeedback('Try Again', 'That move doesn\'t accomplish the task for this step. Try again or check the hint.', 'warning');
     }
-    
+
     updateNavigationButtons();
 }
 
@@ -240,6 +292,7 @@ function setupStepUI(stepNumber) {
     
     // Reset step completion status
     stepCompleted = false;
+    userMoves = [];
     
     // Reset the board for this step
     board.position(step.startingPosition);
@@ -332,17 +385,11 @@ function updateNavigationButtons() {
 // Complete exercise function
 function completeExercise() {
     // Send completion to server
-    fetch('/api/complete-exercise', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            exerciseId: 'piece_development',
-            completed: true
-        })
+    queueCompletionEvent({
+        type: 'exercise',
+        exerciseId: 'piece_development',
+        steps: completedStepMoves.filter(Boolean)
     })
-    .then(response => response.json())
     .then(data => {
         showFeedback('Congratulations!', 'You have completed the Piece Development exercise! You can now move on to the next lesson.', 'success');
         
@@ -377,7 +424,8 @@ function completeExercise() {
         }
     })
     .catch(error => {
+        // The server's reason when it refused the completion (queueCompletionEvent rejects with it)
         console.error('Error completing exercise:', error);
-        showFeedback('Error', 'There was an error saving your progress. Please try again.', 'error');
+        showFeedback('Error', error.message || 'There was an error saving your progress. Please try again.', 'error');
     });
 } 
\ No newline at end of file
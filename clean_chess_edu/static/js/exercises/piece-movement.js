@@ -413,17 +413,10 @@ function showFinalCompletion() {
     }
     
     // Call the API to record exercise completion
-    fetch('/api/complete-exercise', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            exerciseId: 'piece_movement',
-            completed: true
-        })
+    queueCompletionEvent({
+        type: 'exercise',
+        exerciseId: 'piece_movement'
     })
-    .then(response => response.json())
     .then(data => {
         console.log('Exercise completion recorded:', data);
         
@@ -8,6 +8,7 @@ let pinBoard = null;
 let pinGame = null;
 let currentStep = 1;
 let completedSteps = [];
+let currentPuzzle = null; // Puzzle from /api/puzzles for the current step, if any
 
 // Step information
 const pinSteps = {
@@ -20,10 +21,8 @@ const pinSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'pin' },
+        verification: puzzleSolved
     },
     2: {
         title: 'Relative Pins',
@@ -34,10 +33,8 @@ const pinSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'pin' },
+        verification: puzzleSolved
     },
     3: {
         title: 'Creating Pins',
@@ -48,10 +45,8 @@ const pinSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'pin', piece: 'bishop' },
+        verification: puzzleSolved
     },
     4: {
         title: 'Practice Positions',
@@ -62,10 +57,8 @@ const pinSteps = {
         ],
         position: 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
         highlightSquares: [],
-        verification: function() {
-            // This step is informational for now
-            return true;
-        }
+        puzzle: { theme: 'pin' },
+        verification: puzzleSolved
     }
 };
 
@@ -107,9 +100,6 @@ function initPinExercise() {
     
     // Start with the first step
     goToStep(1);
-    
-    // Show development message
-    showFeedback('Exercise Under Development', 'The Pin Practice exercise is currently under development. Please check back later.', 'info');
 }
 
 // Set up event listeners for exercise controls
@@ -133,7 +123,7 @@ function setupExerciseEventListeners() {
         resetBoardBtn.addEventListener('click', function() {
             // Reset to the current step's starting position
             if (currentStep > 0 && pinSteps[currentStep]) {
-                loadPosition(pinSteps[currentStep].position);
+                loadPosition(currentPuzzle ? currentPuzzle.fen : pinSteps[currentStep].position);
                 updateExerciseMessage(`Step ${currentStep}: ${pinSteps[currentStep].title}. ${pinSteps[currentStep].tasks[0]}`);
             }
         });
@@ -165,8 +155,10 @@ function goToStep(step) {
     // Update UI for this step
     updateStepInfo(pinSteps[step]);
     
-    // Load the step's position
+    // Load the step's position, then replace it with a real puzzle if one is available
+    currentPuzzle = null;
     loadPosition(pinSteps[step].position);
+    loadStepPuzzle(step);
     
     // Update message
     updateExerciseMessage(`Step ${step}: ${pinSteps[step].title}. ${pinSteps[step].tasks[0]}`);
@@ -308,13 +300,54 @@ function showFeedback(title, message, type) {
     }
 }
 
-// Placeholder chess board callbacks
+// Fetch a mined puzzle for a step and set it up on the board
+function loadStepPuzzle(step) {
+    const params = new URLSearchParams(pinSteps[step].puzzle);
+    fetch(`/api/puzzles?${params}`)
+        .then(response => response.ok ? response.json() : { puzzles: [] })
+        .then(data => {
+            // Ignore answers for a step the learner has already left
+            if (step !== currentStep) return;
+
+            if (data.puzzles.length === 0) {
+                showFeedback('No Puzzles Yet', 'No pin puzzles are available for this step yet. Study the position and continue when ready.', 'info');
+                return;
+            }
+
+            currentPuzzle = data.puzzles[0];
+            loadPosition(currentPuzzle.fen);
+            const sideToMove = currentPuzzle.fen.split(' ')[1] === 'w' ? 'white' : 'black';
+            pinBoard.orientation(sideToMove);
+            updateExerciseMessage(`Step ${step}: ${pinSteps[step].title}. Find the ${currentPuzzle.piece} pin (${sideToMove} to move).`);
+        })
+        .catch(error => console.error('Error loading puzzle:', error));
+}
+
+// Step verification: solved when there is no puzzle to solve or the puzzle was solved
+function puzzleSolved() {
+    return !currentPuzzle || currentPuzzle.solved === true;
+}
+
+// Chess board callbacks
 function onDragStart(source, piece, position, orientation) {
-    return false; // Disable dragging for now as this is a placeholder
+    // Only the side to move in an unsolved puzzle may move
+    if (!currentPuzzle || currentPuzzle.solved) return false;
+    return piece.charAt(0) === pinGame.turn();
 }
 
 function onDrop(source, target, piece, newPos, oldPos, orientation) {
-    return 'snapback'; // Always return pieces as this is a placeholder
+    const move = pinGame.move({ from: source, to: target, promotion: 'q' });
+    if (move === null) return 'snapback';
+
+    if (move.from + move.to === currentPuzzle.solution[0].slice(0, 4)) {
+        currentPuzzle.solved = true;
+        showFeedback('Correct!', `${move.san} creates the pin.`, 'success');
+        verifyCurrentPosition();
+    } else {
+        pinGame.undo();
+        showFeedback('Not Quite', 'That move does not create the pin. Try again.', 'warning');
+        return 'snapback';
+    }
 }
 
 function onSnapEnd() {
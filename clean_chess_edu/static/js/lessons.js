@@ -30,41 +30,39 @@ function loadLessons() {
 
 // Display lessons in the UI
 function displayLessons(lessons) {
+    // Sort lessons by ID
+    lessons.sort((a, b) => a.id - b.id);
+    
+    // Redraw the cards whenever progress changes (e.g. a lesson completed in
+    // another tab), animating them only the first time
+    let animated = false;
+    onProgressUpdate(progress => {
+        renderLessonCards(lessons, progress, !animated);
+        animated = true;
+    }, () => {
+        // Display lessons without progress information
+        renderLessonCards(lessons, { completed_lessons: [] }, !animated);
+        animated = true;
+    });
+}
+
+// Replace the lesson cards with ones reflecting the given progress
+function renderLessonCards(lessons, progress, animate) {
     const lessonsContainer = document.getElementById('lessonsContainer');
     
-    // Clear loading state
+    // Clear loading state or previous cards
     lessonsContainer.innerHTML = '';
     
-    // Get user progress
-    fetch('/progress')
-        .then(response => response.json())
-        .then(progress => {
-            // Sort lessons by ID
-            lessons.sort((a, b) => a.id - b.id);
-            
-            // Generate HTML for each lesson
-            lessons.forEach(lesson => {
-                const lessonCard = createLessonCard(lesson, progress);
-                lessonsContainer.appendChild(lessonCard);
-                
-                // Add animations with anime.js
-                animateLessonCard(lessonCard);
-            });
-        })
-        .catch(error => {
-            console.error('Error fetching user progress:', error);
-            
-            // Display lessons without progress information
-            lessons.sort((a, b) => a.id - b.id);
-            
-            lessons.forEach(lesson => {
-                const lessonCard = createLessonCard(lesson, { completed_lessons: [] });
-                lessonsContainer.appendChild(lessonCard);
-                
-                // Add animations with anime.js
-                animateLessonCard(lessonCard);
-            });
-        });
+    // Generate HTML for each lesson
+    lessons.forEach(lesson => {
+        const lessonCard = createLessonCard(lesson, progress);
+        lessonsContainer.appendChild(lessonCard);
+        
+        // Add animations with anime.js
+        if (animate) {
+            animateLessonCard(lessonCard);
+        }
+    });
 }
 
 // Create a lesson card element
@@ -408,22 +406,65 @@ function updateUI() {
     });
 }
 
+// Build a patch with only what changed since the last server sync
+function buildProgressPatch(current, synced) {
+    const patch = {};
+    
+    // Lesson records that are new or differ from the synced copy
+    const syncedLessons = {};
+    ((synced && synced.completedLessons) || []).forEach(lesson => {
+        syncedLessons[lesson.lessonId] = JSON.stringify(lesson);
+    });
+    const changedLessons = (current.completedLessons || []).filter(
+        lesson => syncedLessons[lesson.lessonId] !== JSON.stringify(lesson)
+    );
+    if (changedLessons.length > 0) {
+        patch.completedLessons = changedLessons;
+    }
+    
+    // Newly completed lesson ids and objectives
+    ['completed_lessons', 'completedObjectives'].forEach(key => {
+        const known = new Set((synced && synced[key]) || []);
+        const added = (current[key] || []).filter(item => !known.has(item));
+        if (added.length > 0) {
+            patch[key] = added;
+        }
+    });
+    
+    return Object.keys(patch).length > 0 ? patch : null;
+}
+
 // Save user progress to localStorage and server
-function saveUserProgress() {
+function saveUserProgress(isRetry = false) {
     // Save to localStorage for immediate use
     localStorage.setItem('chessEduProgress', JSON.stringify(userProgress));
     
-    // Also send to server if available
-    if (typeof fetch !== 'undefined') {
+    // Also send what changed to the server if available
+    const patch = buildProgressPatch(userProgress, syncedProgress);
+    if (typeof fetch !== 'undefined' && patch) {
         fetch('/save-progress', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify(userProgress)
+            body: JSON.stringify({
+                baseVersion: userProgress.version,
+                patch: patch
+            })
         })
-        .then(response => response.json())
-        .then(data => {
+        .then(response => response.json().then(data => ({ status: response.status, data })))
+        .then(({ status, data }) => {
+            if (status === 409 && !isRetry) {
+                // Another tab saved first: rebase on the server copy and resend our changes
+                syncedProgress = data.progress;
+                userProgress.version = data.version;
+                saveUserProgress(true);
+                return;
+            }
+            if (data.version !== undefined) {
+                userProgress.version = data.version;
+                syncedProgress = JSON.parse(JSON.stringify(userProgress));
+            }
             console.log('Progress saved to server:', data);
         })
         .catch(error => {
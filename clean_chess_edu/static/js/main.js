@@ -13,24 +13,14 @@ let userProgress = {
     achievements: [],
     current_streak: 0
 };
+// Last progress document acknowledged by the server (see saveUserProgress)
+let syncedProgress = null;
 
-// Try to load progress from localStorage
+// Try to load progress from localStorage until the server's copy arrives
 try {
     const savedProgress = localStorage.getItem('chessEduProgress');
     if (savedProgress) {
         userProgress = JSON.parse(savedProgress);
-    } else {
-        // Fetch progress from server if available
-        fetch('/progress')
-            .then(response => response.json())
-            .then(data => {
-                userProgress = data;
-                // Also save to localStorage
-                localStorage.setItem('chessEduProgress', JSON.stringify(userProgress));
-            })
-            .catch(error => {
-                console.error('Error fetching progress:', error);
-            });
     }
 } catch (e) {
     console.error('Error loading progress:', e);
@@ -48,17 +38,14 @@ function initApp() {
     setupEventListeners();
 }
 
-// Fetch user progress from server
+// Follow the user's progress on the server (see progress-stream.js)
 function fetchUserProgress() {
-    fetch('/progress')
-        .then(response => response.json())
-        .then(data => {
-            userProgress = data;
-            updateUI();
-        })
-        .catch(error => {
-            console.error('Error fetching user progress:', error);
-        });
+    onProgressUpdate(data => {
+        userProgress = data;
+        syncedProgress = JSON.parse(JSON.stringify(data));
+        localStorage.setItem('chessEduProgress', JSON.stringify(userProgress));
+        updateUI();
+    });
 }
 
 // Update UI based on user progress
@@ -0,0 +1,28 @@
+// Opening book client for ChessEdu
+//
+// Asks /api/openings/classify whether a move is principled, dubious or
+// off-book according to the server's book of opening lines. Answers are
+// remembered per position and move for the life of the page.
+
+const openingRequests = new Map();
+
+// Resolve with the classification of a UCI move played from a FEN, or null
+// if the server has no book or could not classify it
+function classifyOpeningMove(fen, uci) {
+    const key = fen.split(' ').slice(0, 4).join(' ') + ' ' + uci;
+    if (!openingRequests.has(key)) {
+        const request = fetch(`/api/openings/classify?fen=${encodeURIComponent(fen)}&move=${uci}`)
+            .then(response => response.ok ? response.json() : null)
+            .catch(error => {
+                console.error('Error classifying move:', error);
+                return null;
+            })
+            .then(result => {
+                // Let a failed request be retried later
+                if (!result) openingRequests.delete(key);
+                return result;
+            });
+        openingRequests.set(key, request);
+    }
+    return openingRequests.get(key);
+}
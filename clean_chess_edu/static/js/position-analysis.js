@@ -0,0 +1,33 @@
+// Position analysis client for ChessEdu
+//
+// Asks /api/analyze for legal moves, attacked squares, center control and
+// forks/pins of a position. Requests are remembered per position for the
+// life of the page, and the server caches analyses across learners.
+
+const analysisRequests = new Map();
+
+// Resolve with the analysis of a FEN, or null if it could not be analyzed
+function analyzePosition(fen) {
+    // Move clocks don't change the analysis
+    const key = fen.split(' ').slice(0, 4).join(' ');
+    if (!analysisRequests.has(key)) {
+        const request = fetch(`/api/analyze?fen=${encodeURIComponent(fen)}`)
+            .then(response => response.ok ? response.json() : null)
+            .catch(error => {
+                console.error('Error analyzing position:', error);
+                return null;
+            })
+            .then(analysis => {
+                // Let a failed request be retried later
+                if (!analysis) analysisRequests.delete(key);
+                return analysis;
+            });
+        analysisRequests.set(key, request);
+    }
+    return analysisRequests.get(key);
+}
+
+// Total attacks a color has on the four center squares
+function centerControlTotal(analysis, color) {
+    return Object.values(analysis.centerControl).reduce((total, counts) => total + counts[color], 0);
+}
@@ -0,0 +1,109 @@
+// Live progress updates for ChessEdu
+//
+// Opens one EventSource on /progress/stream per page. The server sends the
+// learner's whole progress once ("snapshot") and then only what each saved
+// change touched ("progress" deltas and "achievement" unlocks), so open tabs
+// stay in sync without refetching /progress. Without a stream (old browser,
+// server not offering one) progress is fetched once instead.
+
+// Latest progress document, kept up to date by the stream
+let streamedProgress = null;
+let progressStream = null;
+let fetchingProgress = null;
+// Streams refused in a row before any event arrived
+let refusedStreams = 0;
+const progressListeners = [];
+const achievementListeners = [];
+
+// Call callback with the learner's progress now (if known) and on every change.
+// onError is called if the progress could not be loaded at all.
+function onProgressUpdate(callback, onError) {
+    progressListeners.push({ callback, onError });
+    if (streamedProgress) {
+        callback(streamedProgress);
+    }
+    openProgressStream();
+}
+
+// Call callback with each achievement the learner unlocks while the page is open
+function onAchievementUnlocked(callback) {
+    achievementListeners.push(callback);
+    openProgressStream();
+}
+
+// Replace the known progress and tell the listeners
+function setStreamedProgress(progress) {
+    streamedProgress = progress;
+    progressListeners.forEach(listener => listener.callback(progress));
+}
+
+function openProgressStream() {
+    if (progressStream) return;
+    if (typeof EventSource === 'undefined') {
+        fetchProgress();
+        return;
+    }
+    
+    progressStream = new EventSource('/progress/stream');
+    let received = false;
+    
+    progressStream.addEventListener('snapshot', event => {
+        received = true;
+        refusedStreams = 0;
+        setStreamedProgress(JSON.parse(event.data));
+    });
+    
+    progressStream.addEventListener('progress', event => {
+        received = true;
+        refusedStreams = 0;
+        const delta = JSON.parse(event.data);
+        if (streamedProgress && delta.version <= streamedProgress.version) {
+            // Already part of the snapshot
+            return;
+        }
+        if (!streamedProgress || delta.resync || delta.previousVersion !== streamedProgress.version) {
+            // A change was missed or too large to send; start over from the full document
+            fetchProgress();
+            return;
+        }
+        setStreamedProgress(Object.assign({}, streamedProgress, delta.changes));
+    });
+    
+    progressStream.addEventListener('achievement', event => {
+        const achievement = JSON.parse(event.data);
+        achievementListeners.forEach(callback => callback(achievement));
+    });
+    
+    progressStream.onerror = () => {
+        // The browser reconnects by itself unless the server refused the stream
+        if (progressStream.readyState !== EventSource.CLOSED) return;
+        progressStream = null;
+        if (!received) {
+            refusedStreams++;
+        }
+        // A first visit has no learner session yet: fetching progress creates one,
+        // so try once more. A stream that worked before is retried until it is back.
+        fetchProgress().then(() => {
+            if (refusedStreams < 2) {
+                setTimeout(openProgressStream, received ? 5000 : 0);
+            }
+        });
+    };
+}
+
+// Fetch the whole progress document (shared by concurrent callers)
+function fetchProgress() {
+    if (!fetchingProgress) {
+        fetchingProgress = fetch('/progress')
+            .then(response => response.json())
+            .then(progress => setStreamedProgress(progress))
+            .catch(error => {
+                console.error('Error fetching user progress:', error);
+                progressListeners.forEach(listener => listener.onError && listener.onError(error));
+            })
+            .finally(() => {
+                fetchingProgress = null;
+            });
+    }
+    return fetchingProgress;
+}
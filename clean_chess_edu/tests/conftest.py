@@ -0,0 +1,35 @@
+"""Shared fixtures for the ChessEdu tests.
+
+The tests import the app the way ``python src/app.py`` does, so ``src`` is
+put on ``sys.path`` here. The app reads its settings when it is imported:
+it gets an in-memory progress store, no event log and no admission
+control, and the tests that need a limiter or gate swap one in.
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ["CHESSEDU_PROGRESS_DB"] = ":memory:"
+os.environ["CHESSEDU_EVENT_LOG"] = ""
+os.environ["CHESSEDU_RATE_LIMIT"] = "0"
+os.environ["CHESSEDU_MAX_ACTIVE"] = "0"
+os.environ.pop("CHESSEDU_EVENTS_SOCKET", None)
+os.environ.pop("CHESSEDU_SHARED_STORE", None)
+
+
+@pytest.fixture(scope="session")
+def chess_app():
+    import app as chess_app
+    chess_app.app.config["TESTING"] = True
+    return chess_app
+
+
+@pytest.fixture
+def client(chess_app):
+    """A test client with a session (and so a learner) of its own"""
+    return chess_app.app.test_client()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionGate, RateLimiter, SingleFlight
+
+
+def test_rate_limiter_allows_bursts_then_asks_to_wait():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a", now=0) == pytest.approx(0.5)
+    # Other clients have buckets of their own
+    assert limiter.acquire("b", now=0) == 0
+    # Tokens come back at the rate
+    assert limiter.acquire("a", now=0.5) == 0
+    assert limiter.acquire("a", now=0.5) > 0
+
+
+def test_rate_limiter_forgets_least_recent_clients():
+    limiter = RateLimiter(rate=1, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.acquire(client, now=0)
+    # "a" was forgotten, so it starts over with a full bucket
+    assert limiter.acquire("a", now=0) == 0
+    assert limiter.acquire("c", now=0) > 0
+
+
+def test_gate_queues_then_turns_away():
+    gate = AdmissionGate(max_active=1, max_queued=1, timeout=5)
+    assert gate.enter()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(gate.enter()))
+    waiter.start()
+    while gate.queued == 0:
+        time.sleep(0.001)
+    # The queue is full
+    assert not gate.enter()
+    gate.leave()
+    waiter.join()
+    assert admitted == [True] and gate.active == 1
+    gate.leave()
+    assert gate.active == 0
+
+
+def test_gate_times_out_waiters():
+    gate = AdmissionGate(max_active=1, max_queued=4, timeout=0.01)
+    assert gate.enter()
+    assert not gate.enter()
+    assert gate.queued == 0
+    assert gate.retry_after() == 1
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while flight.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert results == ["result"] * 4 and len(calls) == 1
+    # Once the call is over the next caller runs it again
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_app_answers_429_past_the_rate(chess_app, client, monkeypatch):
+    monkeypatch.setattr(chess_app, "rate_limiter", RateLimiter(rate=0.001, burst=2))
+    monkeypatch.setattr(chess_app, "new_session_limiter", RateLimiter(rate=0.001, burst=1))
+    # The first request starts a session from the address's bucket, then the learner has their own
+    assert [client.get("/lessons").status_code for _ in range(4)] == [200, 200, 200, 429]
+    response = client.get("/lessons")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Another client from the same address without a session shares the spent bucket
+    assert chess_app.app.test_client().get("/lessons").status_code == 429
+
+
+def test_app_answers_503_when_the_gate_is_full(chess_app, client, monkeypatch):
+    gate = AdmissionGate(max_active=1, max_queued=0, timeout=0.01)
+    monkeypatch.setattr(chess_app, "admission_gate", gate)
+    assert gate.enter()
+    response = client.get("/lessons")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # Static files are exempt
+    assert client.get("/static/js/event-queue.js").status_code == 200
+    gate.leave()
+    assert client.get("/lessons").status_code == 200
+    assert gate.active == 0
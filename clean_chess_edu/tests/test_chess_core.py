@@ -0,0 +1,38 @@
+import pytest
+
+from chess_core import IllegalMoveError, perft, play, Position, START_FEN
+
+# (FEN, node counts for depth 1, 2, ...) from the Chess Programming Wiki
+PERFT_POSITIONS = {
+    "start": (START_FEN, [20, 400, 8902]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862]),
+    "position 3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    "position 4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                   [6, 264, 9467]),
+    "position 5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+    "position 6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                   [46, 2079, 89890]),
+}
+
+
+@pytest.mark.parametrize("fen, counts", PERFT_POSITIONS.values(), ids=PERFT_POSITIONS.keys())
+def test_perft_matches_published_counts(fen, counts):
+    position = Position.from_fen(fen)
+    assert [perft(position, depth) for depth in range(1, len(counts) + 1)] == counts
+
+
+def test_play_returns_final_position():
+    position = play(START_FEN, ["e2e4", "e7e5", "g1f3"])
+    assert position.fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+
+
+def test_play_reports_index_of_illegal_move():
+    with pytest.raises(IllegalMoveError) as error:
+        play(START_FEN, ["e2e4", "e7e5", "e4e5"])
+    assert error.value.index == 2
+
+
+def test_fen_round_trips():
+    fen = PERFT_POSITIONS["kiwipete"][0]
+    assert Position.from_fen(fen).fen() == fen
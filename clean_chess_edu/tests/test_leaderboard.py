@@ -0,0 +1,96 @@
+import pytest
+
+from leaderboard import FenwickTree, Leaderboard, Leaderboards, MAX_SCORE, standing
+from progress_model import LearnerProgress
+
+TODAY = "2026-03-10"
+
+
+def test_fenwick_counts_and_finds():
+    tree = FenwickTree(size=4)
+    for value in (1, 3, 3, 200):
+        tree.add(value, 1)
+    assert tree.count_below(3) == 1
+    assert tree.count_below(4) == 3
+    assert tree.count_below(1000) == 4
+    assert [tree.find(rank) for rank in (1, 2, 3, 4)] == [1, 3, 3, 200]
+
+
+def test_rank_and_top_follow_updates():
+    board = Leaderboard()
+    for learner_id, score in (("a", 5), ("b", 9), ("c", 5), ("d", 1)):
+        board.set(learner_id, score)
+    assert board.top(3) == [("b", 9, 1), ("a", 5, 2), ("c", 5, 2)]
+    assert [board.rank(learner_id) for learner_id in "abcd"] == [2, 1, 2, 4]
+
+    board.set("d", 12)
+    board.set("b", 4)
+    assert board.top(10) == [("d", 12, 1), ("a", 5, 2), ("c", 5, 2), ("b", 4, 4)]
+    assert board.rank("b") == 4
+
+    board.remove("a")
+    assert board.rank("a") is None
+    assert board.top(2) == [("d", 12, 1), ("c", 5, 2)]
+    assert len(board) == 3
+
+
+def test_zero_scores_are_not_listed():
+    board = Leaderboard()
+    board.set("a", 0)
+    assert board.rank("a") is None and len(board) == 0
+
+
+@pytest.mark.parametrize("score", ["abc", -1, 2.5, True, None])
+def test_invalid_scores_are_rejected(score):
+    with pytest.raises(ValueError):
+        Leaderboard().set("a", score)
+
+
+def test_scores_are_capped():
+    board = Leaderboard()
+    board.set("a", 10 ** 12)
+    assert board.score("a") == MAX_SCORE
+
+
+def test_boards_rank_standings():
+    boards = Leaderboards()
+    boards.record("a", 1, (3, TODAY, 2, 1))
+    boards.record("b", 1, (5, TODAY, 1, 0))
+    top, own, listed = boards.standings("streak", "a", TODAY, 10)
+    assert top == [("b", 5, 1), ("a", 3, 2)]
+    assert own == (2, 3) and listed == 2
+    top, own, _ = boards.standings("lessons", "b", TODAY, 10)
+    assert top == [("a", 2, 1), ("b", 1, 2)] and own == (2, 1)
+
+
+def test_broken_streaks_drop_off():
+    boards = Leaderboards()
+    boards.record("a", 1, (3, "2026-03-08", 1, 0))
+    boards.record("b", 1, (2, "2026-03-09", 1, 0))
+    top, own, _ = boards.standings("streak", "a", TODAY, 10)
+    assert top == [("b", 2, 1)] and own is None
+
+
+def test_shared_boards_catch_up_and_skip_bad_rows(tmp_path):
+    path = str(tmp_path / "progress.sqlite3")
+    writer, reader = Leaderboards(path), Leaderboards(path)
+    writer.record("a", 1, (1, TODAY, 4, 0))
+    with writer._connection() as conn:
+        conn.execute("INSERT INTO standings VALUES ('bad', 'abc', ?, 1, 0, 1,"
+                     " (SELECT MAX(sequence) + 1 FROM standings))", (TODAY,))
+    writer.record("b", 1, (1, TODAY, 6, 0))
+    top, _, _ = reader.standings("lessons", "a", TODAY, 10)
+    assert top == [("b", 6, 1), ("a", 4, 2)]
+    # Older versions arriving late are ignored
+    writer.record("b", 0, (1, TODAY, 1, 0))
+    assert reader.standings("lessons", "b", TODAY, 1)[1] == (1, 6)
+
+
+def test_record_rejects_invalid_standings():
+    with pytest.raises(ValueError):
+        Leaderboards().record("a", 1, ("abc", TODAY, 0, 0))
+
+
+def test_standing_counts_only_curriculum_lessons():
+    progress = LearnerProgress.from_dict({"completed_lessons": [1, 2, 3, 4, None], "last_active_day": TODAY})
+    assert standing(progress, {1: {}, 2: {}, 3: {}}) == (0, TODAY, 3, 0)
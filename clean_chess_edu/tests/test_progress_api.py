@@ -0,0 +1,199 @@
+import pytest
+
+from achievements import compile_rules, LESSON_COMPLETED
+from progress_model import LearnerProgress
+
+PIECE_DEVELOPMENT_STEPS = [{"moves": ["g1f3"]}, {"moves": ["e7e5"]}, {"moves": ["f1c4"]},
+                           {"moves": ["e1g1"]}, {"moves": ["e8g8"]}]
+
+
+def save(client, patch, base_version=None):
+    body = {"patch": patch}
+    if base_version is not None:
+        body["baseVersion"] = base_version
+    return client.post("/save-progress", json=body)
+
+
+def test_apply_patch_upserts_lessons_and_adds_ids():
+    progress = LearnerProgress.from_dict({
+        "completedLessons": [{"lessonId": 1, "completed": False,
+                              "exercises": [{"id": "board_setup", "completed": True, "timestamp": "t1"}],
+                              "timestamp": "t1"}],
+        "completed_lessons": [],
+    })
+    progress.apply_patch({
+        "completedLessons": [{"lessonId": 1, "completed": True,
+                              "exercises": [{"id": "piece_movement", "completed": True, "timestamp": "t2"}],
+                              "timestamp": "t2"},
+                             {"lessonId": 2, "completed": False, "timestamp": "t2"}],
+        "completed_lessons": [1],
+        "completedObjectives": ["1_0"],
+        "theme": "dark",
+    })
+    document = progress.to_dict()
+    first = document["completedLessons"][0]
+    assert first["completed"] and first["timestamp"] == "t2"
+    assert [exercise["id"] for exercise in first["exercises"]] == ["board_setup", "piece_movement"]
+    assert [record["lessonId"] for record in document["completedLessons"]] == [1, 2]
+    assert document["completed_lessons"] == [1]
+    assert document["completedObjectives"] == ["1_0"]
+    assert document["theme"] == "dark"
+
+
+def test_apply_patch_leaves_streak_to_the_server():
+    progress = LearnerProgress()
+    progress.apply_patch({"current_streak": 99})
+    assert progress.current_streak == 0
+
+
+def test_all_lessons_needs_every_curriculum_lesson():
+    graduate = {"id": "all_lessons", "title": "t", "description": "d",
+                "trigger": {"event": LESSON_COMPLETED, "all_lessons": True}}
+    engine = compile_rules([{"id": 1}, {"id": 2}, {"id": 3}], {}, [graduate])
+    progress = LearnerProgress.from_dict({"completed_lessons": [1, 3, 4, 5]})
+    assert engine.award_by_id(progress, "all_lessons") is False
+    progress.mark_lesson_completed(2)
+    assert engine.award_by_id(progress, "all_lessons") is True
+
+
+def test_save_progress_creates_versions(client):
+    response = save(client, {"completed_lessons": [1]}, 0)
+    assert response.status_code == 200
+    assert response.get_json() == {"success": True, "version": 1}
+    assert client.get("/progress").get_json()["completed_lessons"] == [1]
+
+
+def test_stale_additions_merge(client):
+    save(client, {"completed_lessons": [1]}, 0)
+    response = save(client, {"completedObjectives": ["2_0"]}, 0)
+    assert response.status_code == 200
+    assert response.get_json()["version"] == 2
+    document = client.get("/progress").get_json()
+    assert document["completed_lessons"] == [1]
+    assert document["completedObjectives"] == ["2_0"]
+
+
+def test_stale_overwrite_is_a_conflict(client):
+    save(client, {"theme": "light"}, 0)
+    response = save(client, {"theme": "dark"}, 0)
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body["version"] == 1
+    assert body["progress"]["theme"] == "light"
+    # Rebased on the version the conflict reported, the same patch goes through
+    assert save(client, {"theme": "dark"}, body["version"]).status_code == 200
+    assert client.get("/progress").get_json()["theme"] == "dark"
+
+
+@pytest.mark.parametrize("body", [
+    [1],
+    {"patch": [1]},
+    {"patch": "completed"},
+    {"patch": {"completedLessons": ["lesson"]}},
+    {"patch": {"completedLessons": [{"lessonId": 1, "exercises": "all"}]}},
+    {"patch": {"completed_lessons": 1}},
+    {"patch": {"completedLessons": [{"lessonId": [1]}]}},
+    {"patch": {"completedLessons": [{"lessonId": 1, "exercises": [{"id": {}}]}]}},
+    {"patch": {"completed_lessons": [[1]]}},
+    {"patch": {"completed_lessons": [4]}},
+    {"patch": {"completedLessons": [{"lessonId": None}]}},
+    {"patch": {"completedLessons": [{"lessonId": "1"}]}},
+    {"patch": {"completedObjectives": [{}]}},
+    {"patch": {}, "baseVersion": "1"},
+    {"patch": {"current_streak": "abc"}},
+    {"patch": {"last_active_day": "2026-01-01"}},
+])
+def test_malformed_saves_are_rejected(client, body):
+    response = client.post("/save-progress", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_whole_document_saves_keep_the_server_streak(client):
+    response = client.post("/save-progress", json={"completed_lessons": [1], "current_streak": 500})
+    assert response.status_code == 200
+    document = client.get("/progress").get_json()
+    assert document["completed_lessons"] == [1]
+    assert document["current_streak"] == 0
+
+
+def test_exercise_with_goals_needs_solving_moves(client):
+    response = client.post("/api/complete-exercise", json={"exerciseId": "piece_development"})
+    assert response.status_code == 400
+
+    wrong_piece = [{"moves": ["e2e4"]}] + PIECE_DEVELOPMENT_STEPS[1:]
+    response = client.post("/api/complete-exercise",
+                           json={"exerciseId": "piece_development", "steps": wrong_piece})
+    assert response.status_code == 400
+
+    response = client.post("/api/complete-exercise",
+                           json={"exerciseId": "piece_development", "steps": PIECE_DEVELOPMENT_STEPS})
+    assert response.status_code == 200
+    lessons = response.get_json()["completedLessons"]
+    assert any(exercise["id"] == "piece_development"
+               for record in lessons for exercise in record.get("exercises", []))
+
+
+def test_exercise_steps_replay_from_server_positions(client):
+    # Legal from the position the client names, but not from the step's own
+    steps = [{"fen": "8/8/8/8/8/8/8/N6K w - - 0 1", "moves": ["a1b3"]}] + PIECE_DEVELOPMENT_STEPS[1:]
+    response = client.post("/api/complete-exercise", json={"exerciseId": "piece_development", "steps": steps})
+    assert response.status_code == 400
+
+
+def test_saves_cannot_claim_exercises_with_goals(client):
+    solved = {"lessonId": 2, "exercises": [{"id": "piece_development", "completed": True}]}
+    for patch in ({"completedLessons": [solved]},
+                  {"completed_lessons": [1, 2, 3]},
+                  {"completedObjectives": ["2_1"]}):
+        assert save(client, patch).status_code == 400
+    for achievement_id in ("all_lessons", "opening_principles", "piece_development"):
+        response = client.post("/progress/add-achievement", json={"achievement_id": achievement_id})
+        assert response.status_code == 400
+    assert client.get("/progress").get_json()["achievements"] == []
+
+    client.post("/api/complete-exercise",
+                json={"exerciseId": "piece_development", "steps": PIECE_DEVELOPMENT_STEPS})
+    # Repeating a completion the server verified is fine
+    assert save(client, {"completedLessons": [solved], "completedObjectives": ["2_1"]}).status_code == 200
+
+
+def test_objectives_of_exercises_with_goals_need_the_exercise(client):
+    response = client.post("/api/complete-objective", json={"lessonId": 2, "objectiveIndex": 1})
+    assert response.status_code == 400
+    assert client.get("/progress").get_json()["achievements"] == []
+    response = client.post("/progress/complete-lesson", json={"lesson_id": 2})
+    assert response.status_code == 400
+
+    for body in ({"lessonId": 2, "objectiveIndex": 3}, {"lessonId": 9, "objectiveIndex": 0},
+                 {"lessonId": 2, "objectiveIndex": "0"}):
+        assert client.post("/api/complete-objective", json=body).status_code == 404
+    response = client.post("/api/complete-objective", json={"lessonId": 2, "objectiveIndex": 0})
+    assert response.status_code == 200
+    assert response.get_json()["completedObjectives"] == ["2_0"]
+
+
+@pytest.mark.parametrize("url, body, status", [
+    ("/progress/complete-lesson", {}, 400),
+    ("/progress/complete-lesson", {"lesson_id": [1]}, 400),
+    ("/progress/complete-lesson", {"lesson_id": 99}, 404),
+    ("/api/complete-exercise", {"exerciseId": ["x"]}, 400),
+    ("/progress/add-achievement", {"achievement_id": ["x"]}, 400),
+])
+def test_completions_with_invalid_ids_are_rejected(client, url, body, status):
+    response = client.post(url, json=body)
+    assert response.status_code == status
+    assert "error" in response.get_json()
+    assert client.get("/progress").get_json()["completed_lessons"] == []
+
+
+def test_events_with_invalid_ids_are_reported(client):
+    response = client.post("/api/events", json={"events": [
+        {"type": "lesson", "lessonId": [1]},
+        {"type": "exercise", "exerciseId": ["x"]},
+        {"type": "lesson", "lessonId": 1},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [result["ok"] for result in data["results"]] == [False, False, True]
+    assert data["progress"]["completed_lessons"] == [1]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from progress_store import MemoryProgressStore
+from progress_transfer import export_ndjson, import_records, ProgressValidator, RecordError
+
+LESSONS = [{"id": 1, "objectives": ["a", "b"], "interactive_exercises": ["board_setup"]},
+           {"id": 2, "objectives": ["c"], "interactive_exercises": ["center_control"]}]
+EXERCISE_TO_LESSON = {"board_setup": 1, "center_control": 2}
+EXERCISE_TO_OBJECTIVE = {"center_control": {"lesson_id": 2, "objective_index": 0}}
+
+
+@pytest.fixture
+def validate():
+    return ProgressValidator(LESSONS, EXERCISE_TO_LESSON, EXERCISE_TO_OBJECTIVE)
+
+
+def lesson_record(lesson_id, *exercise_ids):
+    return {"lessonId": lesson_id, "completed": False, "timestamp": "",
+            "exercises": [{"id": exercise_id, "completed": True, "timestamp": ""} for exercise_id in exercise_ids]}
+
+
+def test_valid_progress_fills_in_implied_objectives(validate):
+    progress = validate({"completedLessons": [lesson_record(2, "center_control")],
+                         "completed_lessons": [1], "completedObjectives": ["1_1"],
+                         "current_streak": 3, "last_active_day": "2026-03-01"})
+    assert list(progress.completed_objectives) == ["1_1", "2_0"]
+    assert progress.current_streak == 3
+
+
+@pytest.mark.parametrize("document, message", [
+    ([], "must be an object"),
+    ({"completedLessons": [lesson_record(9)]}, "unknown lesson"),
+    ({"completedLessons": [lesson_record(1, "fork_practice")]}, "unknown exercise"),
+    ({"completedLessons": [lesson_record(1, "center_control")]}, "not part of lesson"),
+    ({"completed_lessons": [7]}, "unknown completed lesson"),
+    ({"completedObjectives": ["1_5"]}, "unknown objective"),
+    ({"current_streak": -1}, "current_streak"),
+    ({"current_streak": "3"}, "current_streak"),
+    ({"current_streak": True}, "current_streak"),
+    ({"last_active_day": "yesterday"}, "last_active_day"),
+    ({"completedLessons": ["lesson"]}, "malformed progress"),
+])
+def test_invalid_progress_is_rejected(validate, document, message):
+    with pytest.raises(RecordError, match=message):
+        validate(document)
+
+
+def test_import_reports_rejected_lines_and_round_trips(validate):
+    store = MemoryProgressStore()
+    lines = [json.dumps({"learnerId": "a", "progress": {"completed_lessons": [1]}}),
+             "",
+             "not json",
+             json.dumps({"learnerId": "", "progress": {}}),
+             json.dumps({"learnerId": "b", "progress": {"completed_lessons": [3]}}),
+             json.dumps({"learnerId": "c", "progress": {"completedObjectives": ["2_0"]}})]
+    report = import_records(store, lines, validate, batch_size=1)
+    assert report["imported"] == 2 and report["rejected"] == 3
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+
+    store.replace_many([("a", validate({"completed_lessons": [2]}))])
+    assert store.get("a").version == 2
+    exported = [json.loads(line) for line in "".join(export_ndjson(store)).splitlines()]
+    assert {record["learnerId"]: record["progress"]["completed_lessons"] for record in exported} == \
+        {"a": [2], "c": []}
+
+
+def test_memory_scan_survives_edits_while_streaming():
+    store = MemoryProgressStore()
+    for learner_id in ("a", "b"):
+        with store.edit(learner_id):
+            pass
+    scanned = []
+    for learner_id, progress in store.scan():
+        scanned.append((learner_id, progress.version))
+        with store.edit("c"):
+            pass
+        with store.edit("b"):
+            pass
+    # Learners added during the scan are left out; documents are read as they are yielded
+    assert scanned == [("a", 1), ("b", 2)]
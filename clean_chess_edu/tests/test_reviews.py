@@ -0,0 +1,53 @@
+import pytest
+
+from reviews import DAY_MS, INITIAL_EASINESS, MemoryReviewStore, MIN_EASINESS, review, ReviewItem
+
+
+def test_intervals_grow_by_easiness():
+    item = ReviewItem("fork_practice")
+    now = 0
+    intervals = []
+    for _ in range(4):
+        review(item, 5, now)
+        intervals.append(item.interval)
+        now = item.due
+    assert intervals[:2] == [1.0, 6.0]
+    # Each perfect grade adds 0.1 to the easiness before the interval uses it
+    assert intervals[2] == pytest.approx(6.0 * (INITIAL_EASINESS + 0.2), abs=0.01)
+    assert intervals[3] == pytest.approx(intervals[2] * (INITIAL_EASINESS + 0.3), abs=0.01)
+    assert item.repetitions == 4
+    assert item.due == now
+
+
+def test_failure_starts_over():
+    item = ReviewItem("fork_practice")
+    review(item, 4, 0)
+    review(item, 4, item.due)
+    review(item, 1, item.due)
+    assert item.repetitions == 0
+    assert item.interval == 1.0
+
+
+def test_easiness_never_drops_below_minimum():
+    item = ReviewItem("fork_practice")
+    now = 0
+    for _ in range(10):
+        review(item, 0, now)
+        now = item.due
+    assert item.easiness == MIN_EASINESS
+
+
+def test_early_success_does_not_stretch_interval():
+    item = ReviewItem("fork_practice")
+    review(item, 4, 0)
+    review(item, 5, DAY_MS // 2)
+    assert (item.repetitions, item.interval, item.due) == (1, 1.0, DAY_MS)
+
+
+def test_store_lists_due_items_and_learners():
+    store = MemoryReviewStore()
+    store.record("a", "fork_practice", 4, now=0)
+    store.record("b", "pin_practice", 4, now=DAY_MS)
+    assert [item.exercise_id for item in store.due("a", now=DAY_MS)] == ["fork_practice"]
+    assert store.due("b", now=DAY_MS) == []
+    assert [learner_id for learner_id, _ in store.due_learners(now=DAY_MS)] == ["a"]